@@ -1,15 +1,11 @@
 #!/bin/bash
 
 # restore_chroma.sh
-# Usage: ./restore_chroma.sh <backup_filename>
+# Usage: ./restore_chroma.sh [backup_name]
+# Example: ./restore_chroma.sh chroma_backup_20240101_020000
+# Without a backup name, the latest backup is restored.
 
-if [ -z "$1" ]; then
-  echo "Usage: ./restore_chroma.sh <backup_filename>"
-  echo "Example: ./restore_chroma.sh chroma_backup_20240101.tar.gz"
-  exit 1
-fi
-
-BACKUP_FILE=$1
+BACKUP_FILE=${1:-latest}
 COMPOSE_FILE="docker-compose.prod.yml"
 
 # Load version if exists, otherwise default to latest
@@ -14,18 +14,15 @@ parser.add_argument("filename", help="The exact filename to delete (as stored in
 args = parser.parse_args()
 apply_tenant(args.tenant)
 
-from src.db.chroma import get_collection
+from src.db.chroma import delete_documents_by_filename
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def delete_file(filename: str):
     try:
-        collection = get_collection()
-        # ChromaDB allows deleting by metadata filter
-        collection.delete(
-            where={"filename": filename}
-        )
+        # Goes through src.db.chroma so caches keyed on the collection version are invalidated
+        delete_documents_by_filename(filename)
         logger.info(f"Successfully sent delete command for file: {filename}")
         
     except Exception as e:
@@ -1,44 +1,35 @@
 import sys
 import os
-import glob
+import logging
+import argparse
 
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+# Ensure scripts/ is on path for tenant_config
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from tenant_config import apply_tenant, add_tenant_argument
 
-from src.ingest.parser import parse_pdf
-from src.db.chroma import add_document
-from src.config import config
-import logging
+# Parse args BEFORE importing src.config
+parser = argparse.ArgumentParser(description="Re-index every PDF in the tenant's storage into ChromaDB. Unchanged files are skipped.")
+add_tenant_argument(parser)
+parser.add_argument("--force", action="store_true", help="Re-index every file, ignoring the manifest.")
+parser.add_argument("--prune", action="store_true", help="Remove files that are no longer in storage from the index.")
+parser.add_argument("--workers", type=int, default=None, help="Parse processes (default: REINDEX_WORKERS, or one per CPU).")
+args = parser.parse_args()
+apply_tenant(args.tenant)
+
+from src.ingest.reindex import Reindexer
+from src.storage.factory import StorageFactory
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def reindex_all():
-    docs_dir = config.DOCUMENT_DIR
-    logger.info(f"Scanning directory: {docs_dir}")
-    
-    pdf_files = glob.glob(os.path.join(docs_dir, "*.pdf"))
-    
-    if not pdf_files:
-        logger.warning("No PDF files found.")
-        return
-
-    logger.info(f"Found {len(pdf_files)} PDFs. Starting re-indexing...")
-    
-    success_count = 0
-    for filepath in pdf_files:
-        try:
-            logger.info(f"Processing: {filepath}")
-            chunks = parse_pdf(filepath)
-            if chunks:
-                add_document(chunks)
-                success_count += 1
-            else:
-                logger.warning(f"Failed to parse or empty: {filepath}")
-        except Exception as e:
-            logger.error(f"Error indexing {filepath}: {e}")
-
-    logger.info(f"Re-indexing complete. Successfully indexed {success_count}/{len(pdf_files)} files.")
+    # One-off bulk read: bypass the local storage cache
+    storage = StorageFactory.get_storage_provider(cached=False)
+    stats = Reindexer(storage, workers=args.workers).run(force=args.force, prune=args.prune)
+    logger.info(f"Re-indexing complete. Indexed {stats['indexed']}, unchanged {stats['skipped']}, "
+                f"empty {stats['empty']}, failed {stats['failed']} of {stats['total']} files.")
 
 if __name__ == "__main__":
     reindex_all()
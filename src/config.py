@@ -19,6 +19,62 @@ class Config:
         self.DOCUMENT_DIR = os.getenv("DOCUMENT_DIR", "./data/documents")
         self.TENANT_NAME = os.getenv("TENANT_NAME", "moshavkb")
         self.COLLECTION_NAME = os.getenv("COLLECTION_NAME", "moshav_protocols")
+
+        # Local caches (shared between bots through the mounted data dir)
+        self.CACHE_DIR = os.getenv("CACHE_DIR", "./data/cache")
+        self.EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+        self.OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+
+        # Retrieval
+        self.CONTEXT_WINDOW_RADIUS = int(os.getenv("CONTEXT_WINDOW_RADIUS", 1)) # Neighbor chunks on each side of a hit
+        self.HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true" # Fuse BM25 with vector results
+        self.RRF_K = int(os.getenv("RRF_K", 60))
+        self.LEXICAL_SYNC_INTERVAL = int(os.getenv("LEXICAL_SYNC_INTERVAL", 60)) # Seconds between checks for external writes
+        self.QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 1024))
+        self.QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+        self.QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", 3600)) # Seconds
+        self.ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+        self.ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95)) # Min cosine similarity of queries
+        self.ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 512))
+        self.ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 86400)) # Seconds
+
+        # Ingestion / chunking
+        self.CHUNKING_MODE = os.getenv("CHUNKING_MODE", "chars") # "chars" or "tokens"
+        self.CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1000)) # Characters, chars mode
+        self.CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 200))
+        self.CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", 400)) # Tokens, tokens mode
+        self.CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 80))
+        self.CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "cl100k_base") # Encoding of the embedding model (text-embedding-3-*)
+        self.INGEST_BUFFER_CHARS = int(os.getenv("INGEST_BUFFER_CHARS", 200000)) # Page text buffered before chunking
+        self.INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 64)) # Chunks per add_document call
+        self.INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2)) # Ingest bot jobs processed in parallel
+        self.INGEST_QUEUE_MAX_PENDING = int(os.getenv("INGEST_QUEUE_MAX_PENDING", 200)) # Uploads refused beyond this, 0 = unbounded
+        self.INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", 3))
+        self.INGEST_RETRY_BASE_DELAY = float(os.getenv("INGEST_RETRY_BASE_DELAY", 30.0)) # Seconds, doubled per attempt
+        self.INGEST_PARSE_CONCURRENCY = int(os.getenv("INGEST_PARSE_CONCURRENCY", 2)) # Jobs per stage at once, 0 = unbounded
+        self.INGEST_OCR_CONCURRENCY = int(os.getenv("INGEST_OCR_CONCURRENCY", 1))
+        self.INGEST_EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", 2))
+        self.INGEST_UPSERT_CONCURRENCY = int(os.getenv("INGEST_UPSERT_CONCURRENCY", 1))
+        self.REINDEX_WORKERS = int(os.getenv("REINDEX_WORKERS", 0)) # Parse processes, 0 = one per CPU
+        self.REINDEX_WRITE_CONCURRENCY = int(os.getenv("REINDEX_WRITE_CONCURRENCY", 4)) # Parallel embed+upsert batches
+        self.NEAR_DUPLICATE_POLICY = os.getenv("NEAR_DUPLICATE_POLICY", "report") # off, report, refuse or replace
+        self.NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.85)) # Min estimated Jaccard similarity
+        self.OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", 30)) # Pages with less text are OCR'd, 0 disables
+        self.OCR_PAGE_RANGE_SIZE = int(os.getenv("OCR_PAGE_RANGE_SIZE", 20)) # Pages per concurrent OCR request, 0 disables splitting
+        self.OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", 4)) # Page ranges analyzed in parallel
+        self.OCR_MAX_RETRIES = int(os.getenv("OCR_MAX_RETRIES", 4)) # Retries of a throttled OCR request
+        self.OCR_RETRY_BASE_DELAY = float(os.getenv("OCR_RETRY_BASE_DELAY", 2.0)) # Seconds, doubled per retry
+
+        # Generation
+        self.CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 6000)) # Max tokens of retrieved context per prompt
+        self.STREAM_ANSWERS = os.getenv("STREAM_ANSWERS", "true").lower() == "true"
+        self.STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.5)) # Min seconds between Telegram edits
+
+        # Query bot concurrency
+        self.QUERY_CONCURRENT_UPDATES = int(os.getenv("QUERY_CONCURRENT_UPDATES", 64)) # Updates handled in parallel
+        self.QUERY_RETRIEVAL_CONCURRENCY = int(os.getenv("QUERY_RETRIEVAL_CONCURRENCY", 8))
+        self.QUERY_GENERATION_CONCURRENCY = int(os.getenv("QUERY_GENERATION_CONCURRENCY", 8))
+        self.QUERY_DOWNLOAD_CONCURRENCY = int(os.getenv("QUERY_DOWNLOAD_CONCURRENCY", 4)) # Answers fetching their source files at once
         
         # Load whitelists once
         self.QUERY_ALLOWED_USERS = self._parse_id_list("QUERY_ALLOWED_USERS")
@@ -31,6 +87,17 @@ class Config:
         self.AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
         self.AZURE_CONTAINER_NAME = os.getenv("AZURE_CONTAINER_NAME", "moshavkb")
         self.AZURE_BACKUP_CONTAINER_NAME = os.getenv("AZURE_BACKUP_CONTAINER_NAME", "moshavkb-backups")
+        self.CHROMA_DATA_DIR = os.getenv("CHROMA_DATA_DIR", "/app/data/chroma_db") # Backed up / restored by scripts/
+        self.BACKUP_FULL_EVERY = int(os.getenv("BACKUP_FULL_EVERY", 7)) # Every Nth backup is full, the rest incremental
+        self.BACKUP_COMPRESSION_LEVEL = int(os.getenv("BACKUP_COMPRESSION_LEVEL", 3)) # zstd level
+        self.BACKUP_COMPRESSION_THREADS = int(os.getenv("BACKUP_COMPRESSION_THREADS", 0)) # zstd threads, 0 = all cores
+        self.RESTORE_CONCURRENCY = int(os.getenv("RESTORE_CONCURRENCY", 4)) # Backup archives downloaded at once on restore
+        self.STORAGE_CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", 4 * 1024 * 1024)) # Bytes per download range / upload block
+        self.STORAGE_MAX_CONCURRENCY = int(os.getenv("STORAGE_MAX_CONCURRENCY", 4)) # Parallel ranges / blocks per transfer
+        self.STORAGE_CACHE_ENABLED = os.getenv("STORAGE_CACHE_ENABLED", "true").lower() == "true" # Local disk cache of read files
+        self.STORAGE_CACHE_MAX_BYTES = int(os.getenv("STORAGE_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+        self.STORAGE_CACHE_VALIDATE_INTERVAL = float(os.getenv("STORAGE_CACHE_VALIDATE_INTERVAL", 60)) # Seconds between ETag checks
+        self.STORAGE_SPOOL_THRESHOLD = int(os.getenv("STORAGE_SPOOL_THRESHOLD", 16 * 1024 * 1024)) # Downloads beyond this spill to disk
         
         # Azure AI Document Intelligence
         self.AZURE_DOC_INTEL_ENDPOINT = os.getenv("AZURE_DOC_INTEL_ENDPOINT")
@@ -0,0 +1,401 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tarfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+from src.config import config
+
+try:
+    import zstandard
+except ImportError:  # gzip fallback
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PREFIX = "backups/chroma/"
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 1
+
+READ_SIZE = 1024 * 1024
+
+def default_compression() -> str:
+    return "zstd" if zstandard is not None else "gzip"
+
+def archive_extension(compression: str) -> str:
+    return ".tar.zst" if compression == "zstd" else ".tar.gz"
+
+def compressing_writer(raw, compression: str):
+    """
+    Wraps a writable binary stream in a compressor. zstd compresses on
+    BACKUP_COMPRESSION_THREADS threads (0 = all cores); gzip is single-threaded.
+    """
+    if compression == "zstd":
+        threads = config.BACKUP_COMPRESSION_THREADS or -1
+        return zstandard.ZstdCompressor(level=config.BACKUP_COMPRESSION_LEVEL, threads=threads).stream_writer(raw)
+    return gzip.GzipFile(fileobj=raw, mode="wb")
+
+def decompressing_reader(raw, compression: str):
+    """Wraps a readable binary stream of a compressed archive for tarfile's "r|" stream mode."""
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read .tar.zst backups")
+        return zstandard.ZstdDecompressor().stream_reader(raw)
+    return gzip.GzipFile(fileobj=raw, mode="rb")
+
+def compression_of(archive: str) -> str:
+    return "zstd" if archive.endswith(".zst") else "gzip"
+
+def scan_files(data_dir: str) -> dict:
+    """{relative posix path: {"size", "mtime_ns"}} of the regular files under data_dir."""
+    files = {}
+    for root, _, names in os.walk(data_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            stat = os.lstat(path)
+            if not os.path.isfile(path) or os.path.islink(path):
+                continue
+            relative = os.path.relpath(path, data_dir).replace(os.sep, "/")
+            files[relative] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return files
+
+def changed_files(current: dict, previous: Optional[dict]) -> tuple[list[str], list[str]]:
+    """(paths new or modified since previous, paths deleted since previous); everything if there is none."""
+    if previous is None:
+        return sorted(current), []
+    old = previous["files"]
+    changed = sorted(
+        path for path, entry in current.items()
+        if path not in old or (old[path]["size"], old[path]["mtime_ns"]) != (entry["size"], entry["mtime_ns"])
+    )
+    deleted = sorted(path for path in old if path not in current)
+    return changed, deleted
+
+def manifest_key(name: str) -> str:
+    return f"{BACKUP_PREFIX}{name}{MANIFEST_SUFFIX}"
+
+def list_manifests(storage) -> list[str]:
+    """Backup names that have a manifest (i.e. completed), oldest first."""
+    return sorted(
+        key[len(BACKUP_PREFIX):-len(MANIFEST_SUFFIX)]
+        for key in storage.list_files()
+        if key.startswith(BACKUP_PREFIX) and key.endswith(MANIFEST_SUFFIX)
+    )
+
+def load_manifest(storage, name: str) -> Optional[dict]:
+    stream = storage.get_file_stream(manifest_key(name))
+    if stream is None:
+        return None
+    try:
+        return json.loads(stream.read().decode("utf-8"))
+    finally:
+        stream.close()
+
+def latest_manifest(storage) -> Optional[dict]:
+    names = list_manifests(storage)
+    return load_manifest(storage, names[-1]) if names else None
+
+class _HashingReader:
+    """Passes reads through, hashing what was read."""
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.sha256.update(data)
+        return data
+
+class _PipeReader:
+    """
+    Read end of the archive pipe. At EOF it waits for the producer and raises its error,
+    so a failed archive is never committed as a complete upload.
+    """
+    def __init__(self, raw, producer: threading.Thread, errors: list):
+        self.raw = raw
+        self.producer = producer
+        self.errors = errors
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        if not data:
+            self.producer.join()
+            if self.errors:
+                raise self.errors[0]
+        return data
+
+def _write_archive(raw, data_dir: str, paths: list[str], compression: str, hashes: dict) -> None:
+    with raw, compressing_writer(raw, compression) as out, tarfile.open(fileobj=out, mode="w|") as tar:
+        for path in paths:
+            full_path = os.path.join(data_dir, path)
+            try:
+                tarinfo = tar.gettarinfo(full_path, arcname=path)
+                with open(full_path, "rb") as f:
+                    reader = _HashingReader(f)
+                    tar.addfile(tarinfo, reader)
+            except FileNotFoundError:
+                # Deleted since the scan (e.g. a compacted segment); the next backup records it
+                logger.warning(f"{path} disappeared during the backup, skipped")
+                continue
+            hashes[path] = reader.sha256.hexdigest()
+
+def stream_archive_upload(storage, remote_path: str, data_dir: str, paths: list[str], compression: str) -> dict:
+    """
+    Tars paths (relative to data_dir) through the compressor straight into
+    storage.upload_from_file, with no temporary archive on disk. Returns {path: sha256}
+    of the files archived.
+    """
+    read_fd, write_fd = os.pipe()
+    errors = []
+    hashes = {}
+
+    def produce():
+        try:
+            _write_archive(os.fdopen(write_fd, "wb"), data_dir, paths, compression, hashes)
+        except BaseException as e:
+            errors.append(e)
+
+    producer = threading.Thread(target=produce, name="backup-archive", daemon=True)
+    with os.fdopen(read_fd, "rb") as raw:
+        producer.start()
+        try:
+            storage.upload_from_file(remote_path, _PipeReader(raw, producer, errors), content_type="application/octet-stream")
+        finally:
+            # Unblocks the producer if the upload failed midway
+            raw.close()
+            producer.join()
+    if errors:
+        raise errors[0]
+    return hashes
+
+def backup_chroma(storage, data_dir: str, full: bool = False, compression: str = None) -> Optional[dict]:
+    """
+    Backs up data_dir to storage as a streamed, compressed tar plus a manifest.
+    Unless full is set, only files changed since the latest backup are archived
+    (an incremental backup on top of it); every BACKUP_FULL_EVERY-th backup is full.
+    Returns the manifest, or None if nothing changed.
+    """
+    compression = compression or default_compression()
+    previous = None if full else latest_manifest(storage)
+    if previous is not None and previous["chain_length"] + 1 >= config.BACKUP_FULL_EVERY > 0:
+        logger.info(f"{previous['chain_length']} incremental backups since the last full one, taking a full backup")
+        previous = None
+
+    current = scan_files(data_dir)
+    changed, deleted = changed_files(current, previous)
+    if previous is not None and not changed and not deleted:
+        logger.info("No changes since the latest backup, nothing to do.")
+        return None
+
+    kind = "incremental" if previous is not None else "full"
+    name = f"chroma_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}" + ("_incr" if previous else "")
+    archive = f"{BACKUP_PREFIX}{name}{archive_extension(compression)}"
+    logger.info(f"Streaming {kind} backup of {len(changed)} files ({len(deleted)} deleted) to {archive}...")
+    hashes = stream_archive_upload(storage, archive, data_dir, changed, compression)
+
+    files = {}
+    for path, entry in current.items():
+        if path in hashes:
+            files[path] = {**entry, "sha256": hashes[path]}
+        elif previous is not None and path in previous["files"] and path not in changed:
+            files[path] = previous["files"][path]
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "name": name,
+        "type": kind,
+        "base": previous["name"] if previous else None,
+        "chain_length": previous["chain_length"] + 1 if previous else 0,
+        "archive": archive,
+        "compression": compression,
+        "created_at": datetime.now().isoformat(),
+        "files": files,
+        "changed": sorted(hashes),
+        "deleted": deleted,
+    }
+    # Written last: a backup without a manifest is incomplete and ignored
+    storage.save_file(json.dumps(manifest).encode("utf-8"), manifest_key(name), content_type="application/json")
+    logger.info(f"Backup {name} complete ({len(hashes)} files archived).")
+    return manifest
+
+class ChunkReader:
+    """Read-only file object over an iterator of byte chunks (e.g. a chunked blob download)."""
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._chunk = b""
+        self._pos = 0
+        self._done = False
+
+    def read(self, size=-1):
+        parts = []
+        while size != 0:
+            if self._pos >= len(self._chunk):
+                if self._done:
+                    break
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    self._done = True
+                    break
+                self._chunk, self._pos = chunk, 0
+                continue
+            end = len(self._chunk) if size < 0 else min(len(self._chunk), self._pos + size)
+            parts.append(self._chunk[self._pos:end])
+            if size > 0:
+                size -= end - self._pos
+            self._pos = end
+        return b"".join(parts)
+
+def _safe_path(base_dir: str, name: str) -> str:
+    """Joins an archive member name under base_dir, refusing absolute or escaping paths."""
+    normalized = os.path.normpath(name)
+    if os.path.isabs(normalized) or normalized == ".." or normalized.startswith(".." + os.sep):
+        raise ValueError(f"Unsafe path in backup archive: {name}")
+    return os.path.join(base_dir, normalized)
+
+def _stream_members(storage, archive: str, compression: str):
+    """Yields (tar, member) of an archive while it downloads, in constant memory."""
+    chunks = storage.iter_file_chunks(archive)
+    if chunks is None:
+        raise FileNotFoundError(f"Backup archive not found: {archive}")
+    reader = ChunkReader(chunks)
+    if compression == "zstd":
+        fileobj, mode = decompressing_reader(reader, compression), "r|"
+    else:
+        # Also covers legacy gzip archives
+        fileobj, mode = reader, "r|*"
+    with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+        for member in tar:
+            yield tar, member
+
+def extract_archive(storage, archive: str, compression: str, target_dir: str, wanted: Optional[dict],
+                    strip_components: int = 0) -> int:
+    """
+    Streams an archive into target_dir. wanted ({path: {"sha256", "mtime_ns"}}) limits it
+    to those files, verifying their hashes and restoring their mtimes; None extracts every
+    file. Returns the number of files written.
+    """
+    written = 0
+    for tar, member in _stream_members(storage, archive, compression):
+        if not member.isfile():
+            continue
+        name = "/".join(member.name.split("/")[strip_components:])
+        if not name or (wanted is not None and name not in wanted):
+            continue
+        path = _safe_path(target_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        source = tar.extractfile(member)
+        sha256 = hashlib.sha256()
+        with open(path, "wb") as f:
+            while True:
+                data = source.read(READ_SIZE)
+                if not data:
+                    break
+                sha256.update(data)
+                f.write(data)
+        if wanted is not None:
+            expected = wanted[name]
+            if expected.get("sha256") and sha256.hexdigest() != expected["sha256"]:
+                raise ValueError(f"Checksum mismatch for {name} in {archive}")
+            os.utime(path, ns=(expected["mtime_ns"], expected["mtime_ns"]))
+        written += 1
+    return written
+
+def resolve_backup(storage, name: str = None) -> tuple[Optional[dict], str]:
+    """
+    (manifest, backup name) of the named backup, accepting a backup name, its archive
+    file name or "latest". Archives from before manifests existed return (None, archive key).
+    """
+    if not name or name == "latest":
+        names = list_manifests(storage)
+        if not names:
+            raise FileNotFoundError("No backups found")
+        return load_manifest(storage, names[-1]), names[-1]
+
+    base_name = name[len(BACKUP_PREFIX):] if name.startswith(BACKUP_PREFIX) else name
+    for suffix in (MANIFEST_SUFFIX, ".tar.zst", ".tar.gz"):
+        if base_name.endswith(suffix):
+            base_name = base_name[:-len(suffix)]
+            break
+    manifest = load_manifest(storage, base_name)
+    if manifest is not None:
+        return manifest, base_name
+    return None, name if "/" in name else f"{BACKUP_PREFIX}{name}"
+
+def backup_chain(storage, manifest: dict) -> list[dict]:
+    """The manifests from the full backup up to manifest, oldest first."""
+    chain = [manifest]
+    while chain[0]["base"]:
+        base = load_manifest(storage, chain[0]["base"])
+        if base is None:
+            raise FileNotFoundError(f"Backup {chain[0]['name']} depends on missing backup {chain[0]['base']}")
+        chain.insert(0, base)
+    return chain
+
+def _swap_in(staging_dir: str, data_dir: str) -> None:
+    """Replaces data_dir with staging_dir (same parent, so both renames are atomic)."""
+    old_dir = f"{data_dir}.old-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    if os.path.exists(data_dir):
+        os.rename(data_dir, old_dir)
+    try:
+        os.rename(staging_dir, data_dir)
+    except Exception:
+        if os.path.exists(old_dir):
+            os.rename(old_dir, data_dir)
+        raise
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+
+def restore_chroma(storage, data_dir: str, name: str = None, concurrency: int = None) -> dict:
+    """
+    Restores data_dir from a backup (default: the latest) while downloading it.
+    For an incremental backup the archives of its chain are streamed concurrently, each
+    contributing only the files it holds the final version of. Everything is extracted
+    into a staging directory next to data_dir, checked against the manifest and swapped in,
+    so a failed restore leaves the live data untouched. ChromaDB must be stopped meanwhile.
+    """
+    manifest, backup_name = resolve_backup(storage, name)
+    parent_dir = os.path.dirname(os.path.abspath(data_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    staging_dir = os.path.join(parent_dir, f".{os.path.basename(data_dir)}.restore-{uuid.uuid4().hex[:8]}")
+    os.makedirs(staging_dir)
+
+    try:
+        if manifest is None:
+            # Legacy single archive (chroma_db/... inside a .tar.gz)
+            logger.info(f"Restoring legacy backup {backup_name}...")
+            written = extract_archive(storage, backup_name, "gzip", staging_dir, None, strip_components=1)
+            archives = 1
+        else:
+            chain = backup_chain(storage, manifest)
+            # Each file comes from the latest archive in the chain that changed it
+            layers = [{} for _ in chain]
+            for path, entry in manifest["files"].items():
+                source = max((i for i, m in enumerate(chain) if path in m["changed"]), default=None)
+                if source is None:
+                    raise ValueError(f"No archive in the chain of {backup_name} contains {path}")
+                layers[source][path] = entry
+
+            jobs = [(m, wanted) for m, wanted in zip(chain, layers) if wanted]
+            archives = len(jobs)
+            logger.info(f"Restoring {backup_name} from {archives} archives ({len(manifest['files'])} files)...")
+            with ThreadPoolExecutor(max_workers=max(1, concurrency or config.RESTORE_CONCURRENCY)) as executor:
+                counts = list(executor.map(
+                    lambda job: extract_archive(storage, job[0]["archive"], job[0]["compression"], staging_dir, job[1]),
+                    jobs
+                ))
+            written = sum(counts)
+            if written != len(manifest["files"]):
+                raise ValueError(f"Expected {len(manifest['files'])} files, extracted {written}")
+
+        _swap_in(staging_dir, data_dir)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    logger.info(f"Restored {written} files from {backup_name} into {data_dir}.")
+    return {"backup": backup_name, "archives": archives, "files": written}
@@ -2,9 +2,18 @@ import chromadb
 from chromadb.config import Settings
 from src.config import config
 import logging
+import os
+import threading
+import time
 
+from contextlib import nullcontext
 from typing import Optional
 
+try:
+    import httpx  # transport of the Chroma HTTP client
+except ImportError:
+    httpx = None
+
 logger = logging.getLogger(__name__)
 
 def get_client():
@@ -24,30 +33,243 @@ def get_client():
 
 from chromadb.utils import embedding_functions
 from src.llm.factory import LLMFactory
+from src.llm.embedding_cache import EmbeddingCache, embed_with_cache
+from src.db.versions import CollectionVersionStore
+from src.db.hash_index import FileHashIndex
+from src.rag import lexical
 
-def get_collection():
-    client = get_client()
-    # verify connection
+def is_connection_error(error: Exception) -> bool:
+    """Whether error is a transport failure (worth reconnecting), not a request Chroma rejected."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return httpx is not None and isinstance(error, httpx.TransportError)
+
+class ChromaConnectionManager:
+    """
+    Process-wide owner of the ChromaDB client.
+    Keeps a single HTTP client (its underlying session pools keep-alive connections)
+    and caches collection handles per (tenant, collection).
+    On failure the cached state is dropped and rebuilt lazily on the next call.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._client = None
+        self._embedding_function = None
+        self._collections = {}
+        self._healthy = None
+        self._last_error = None
+        self._last_check = None
+
+    def get_client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = get_client()
+                logger.info("Created ChromaDB client")
+            return self._client
+
+    def get_embedding_function(self):
+        with self._lock:
+            if self._embedding_function is None:
+                self._embedding_function = LLMFactory.get_embedding_function()
+            return self._embedding_function
+
+    def get_collection(self, name: str = None):
+        key = (config.TENANT_NAME, name or config.COLLECTION_NAME)
+        collection = self._collections.get(key)
+        if collection is not None:
+            return collection
+
+        with self._lock:
+            collection = self._collections.get(key)
+            if collection is None:
+                collection = self.get_client().get_or_create_collection(
+                    name=key[1],
+                    embedding_function=self.get_embedding_function()
+                )
+                self._collections[key] = collection
+                self._healthy = True
+                logger.info(f"Opened collection '{key[1]}' for tenant '{key[0]}'")
+            return collection
+
+    def run(self, operation, name: str = None):
+        """
+        Runs operation(collection). If the connection fails, it is reset and the
+        operation is retried once on a fresh client before the error is raised.
+        Other errors (bad filters, dimension mismatches...) are raised as is.
+        """
+        try:
+            return operation(self.get_collection(name))
+        except Exception as e:
+            if not is_connection_error(e):
+                raise
+            logger.warning(f"ChromaDB operation failed, reconnecting: {e}")
+            self.invalidate(e)
+            return operation(self.get_collection(name))
+
+    def invalidate(self, error: Exception = None):
+        """Drops the cached client and collection handles."""
+        with self._lock:
+            self._client = None
+            self._collections.clear()
+            self._healthy = False
+            self._last_error = str(error) if error else None
+
+    def check_health(self) -> bool:
+        """Heartbeats the server. Meant for startup and health probes, not the request path."""
+        try:
+            self.get_client().heartbeat()
+            with self._lock:
+                self._healthy = True
+                self._last_error = None
+        except Exception as e:
+            logger.warning(f"Warning: Could not connect to ChromaDB: {e}")
+            self.invalidate(e)
+        self._last_check = time.time()
+        return bool(self._healthy)
+
+    def health(self) -> dict:
+        return {
+            "healthy": self._healthy,
+            "last_error": self._last_error,
+            "last_check": self._last_check,
+            "open_collections": [f"{t}/{c}" for t, c in self._collections],
+        }
+
+manager = ChromaConnectionManager()
+
+_embedding_cache = None
+_local_store_lock = threading.Lock()
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    global _embedding_cache
+    if not config.EMBEDDING_CACHE_ENABLED:
+        return None
+    with _local_store_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(os.path.join(config.CACHE_DIR, "embeddings.sqlite"))
+        return _embedding_cache
+
+_version_store = None
+
+def _get_version_store() -> CollectionVersionStore:
+    global _version_store
+    with _local_store_lock:
+        if _version_store is None:
+            _version_store = CollectionVersionStore(os.path.join(config.CACHE_DIR, "collection_versions.sqlite"))
+        return _version_store
+
+def get_collection_version() -> Optional[int]:
+    """
+    Returns the change counter of the current collection, bumped on every write or delete,
+    or None if it cannot be read (callers must then not cache anything keyed by it).
+    """
+    try:
+        return _get_version_store().get(config.TENANT_NAME, config.COLLECTION_NAME)
+    except Exception as e:
+        logger.error(f"Failed to read collection version: {e}")
+        return None
+
+def bump_collection_version() -> int:
+    try:
+        return _get_version_store().bump(config.TENANT_NAME, config.COLLECTION_NAME)
+    except Exception as e:
+        logger.error(f"Failed to bump collection version: {e}")
+        return -1
+
+_hash_index = None
+
+HASH_INDEX_PAGE_SIZE = 1000
+
+def _get_hash_index() -> FileHashIndex:
+    global _hash_index
+    with _local_store_lock:
+        if _hash_index is None:
+            _hash_index = FileHashIndex(os.path.join(config.CACHE_DIR, "file_hashes.sqlite"))
+        return _hash_index
+
+def rebuild_hash_index() -> int:
+    """
+    Rebuilds the local file hash -> filename index from the chunk metadata in Chroma.
+    Returns the number of files indexed.
+    """
+    entries = {}
+    offset = 0
+    while True:
+        page = manager.run(lambda collection: collection.get(
+            include=["metadatas"], limit=HASH_INDEX_PAGE_SIZE, offset=offset
+        ))
+        metadatas = page['metadatas'] or []
+        for metadata in metadatas:
+            if metadata and metadata.get('file_hash'):
+                entries.setdefault(metadata['file_hash'], metadata.get('filename'))
+        if len(metadatas) < HASH_INDEX_PAGE_SIZE:
+            break
+        offset += HASH_INDEX_PAGE_SIZE
+
+    _get_hash_index().rebuild(config.TENANT_NAME, config.COLLECTION_NAME, entries)
+    return len(entries)
+
+def ensure_hash_index() -> None:
+    """Builds the file hash index from Chroma if this collection has none yet (call on startup)."""
+    try:
+        if not _get_hash_index().is_built(config.TENANT_NAME, config.COLLECTION_NAME):
+            logger.info("Building the file hash index from ChromaDB...")
+            logger.info(f"File hash index built with {rebuild_hash_index()} files.")
+    except Exception as e:
+        logger.error(f"Failed to build the file hash index: {e}")
+
+def invalidate_hash_index(all_collections: bool = False) -> None:
+    """
+    Drops the file hash index (of this collection, or of all of them), so the next
+    ensure_hash_index() rebuilds it from Chroma.
+    """
+    if all_collections:
+        _get_hash_index().invalidate_all()
+    else:
+        _get_hash_index().invalidate(config.TENANT_NAME, config.COLLECTION_NAME)
+
+def _index_file_hashes(docs: list) -> None:
+    entries = {
+        d['metadata']['file_hash']: d['metadata'].get('filename')
+        for d in docs if d.get('metadata') and d['metadata'].get('file_hash')
+    }
+    if not entries:
+        return
     try:
-        client.heartbeat()
-        logger.info("Connected to ChromaDB")
+        _get_hash_index().put_many(config.TENANT_NAME, config.COLLECTION_NAME, entries)
     except Exception as e:
-        logger.warning(f"Warning: Could not connect to ChromaDB: {e}")
+        logger.error(f"Failed to update the file hash index: {e}")
 
-    openai_ef = LLMFactory.get_embedding_function()
+def record_file_hash(file_hash: str, filename: str) -> None:
+    """Records an indexed file in the file hash index (see add_document's index_hashes)."""
+    _index_file_hashes([{'metadata': {'file_hash': file_hash, 'filename': filename}}])
 
-    return client.get_or_create_collection(
-        name=config.COLLECTION_NAME,
-        embedding_function=openai_ef
+def _unindex_filename(filename: str) -> None:
+    try:
+        _get_hash_index().remove_filename(config.TENANT_NAME, config.COLLECTION_NAME, filename)
+    except Exception as e:
+        logger.error(f"Failed to update the file hash index: {e}")
+
+def embed_texts(texts: list[str]) -> list[list[float]]:
+    """Embeds texts with the collection's embedding function, reusing cached vectors."""
+    return embed_with_cache(
+        texts,
+        manager.get_embedding_function(),
+        model=config.AZURE_EMBEDDING_DEPLOYMENT_NAME,
+        cache=get_embedding_cache()
     )
 
-def add_document(doc_data_list):
+def get_collection():
+    return manager.get_collection()
+
+def add_document(doc_data_list, limits=None, index_hashes: bool = True):
     """
     Adds a list of document chunks to the collection.
     doc_data_list expected: List of {'text': str, 'metadata': dict, 'id': str}
+    limits (e.g. the ingest queue's StageLimits) bounds concurrent "embed" and "upsert" calls.
+    With index_hashes=False the file hashes are not recorded for duplicate checks; the
+    caller does that with record_file_hash once every batch of the file is in.
     """
-    collection = get_collection()
-    
     if not doc_data_list:
         return
 
@@ -58,26 +280,79 @@ def add_document(doc_data_list):
         logger.warning("No valid (non-empty) chunks to add.")
         return
 
+    # Precompute embeddings so unchanged chunks never hit the embedding endpoint
+    texts = [d['text'] for d in valid_docs]
+    with limits.stage("embed") if limits else nullcontext():
+        embeddings = embed_texts(texts)
+
     # Bulk upsert
-    collection.upsert(
-        documents=[d['text'] for d in valid_docs],
-        metadatas=[d['metadata'] for d in valid_docs],
-        ids=[d['id'] for d in valid_docs]
-    )
+    with limits.stage("upsert") if limits else nullcontext():
+        manager.run(lambda collection: collection.upsert(
+            documents=texts,
+            embeddings=embeddings,
+            metadatas=[d['metadata'] for d in valid_docs],
+            ids=[d['id'] for d in valid_docs]
+        ))
+    lexical.index_documents(valid_docs)
+    if index_hashes:
+        _index_file_hashes(valid_docs)
+    bump_collection_version()
     logger.info(f"Added {len(valid_docs)} document chunks.")
 
+def delete_documents_by_filename(filename: str) -> None:
+    """
+    Deletes every chunk of the given file from the collection.
+    """
+    def _delete(collection):
+        ids = collection.get(where={"filename": filename}, include=[])['ids']
+        if ids:
+            collection.delete(ids=ids)
+        return ids
+
+    deleted_ids = manager.run(_delete)
+    lexical.remove_documents(deleted_ids)
+    _unindex_filename(filename)
+    bump_collection_version()
+    logger.info(f"Deleted {len(deleted_ids)} chunks of {filename}.")
+
+def delete_stale_documents(filename: str, keep_ids: set) -> int:
+    """
+    Deletes the chunks of the given file whose IDs are not in keep_ids, e.g. the tail
+    left over when a re-indexed file now has fewer chunks. Returns the number deleted.
+    """
+    def _delete(collection):
+        ids = collection.get(where={"filename": filename}, include=[])['ids']
+        stale_ids = [doc_id for doc_id in ids if doc_id not in keep_ids]
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+        return stale_ids
+
+    stale_ids = manager.run(_delete)
+    if stale_ids:
+        lexical.remove_documents(stale_ids)
+        bump_collection_version()
+        logger.info(f"Deleted {len(stale_ids)} stale chunks of {filename}.")
+    return len(stale_ids)
+
 def check_file_exists_by_hash(file_hash: str) -> Optional[str]:
     """
     Check if a file with the given MD5 hash already exists in the collection.
     Returns the filename if found, otherwise None.
+    Answered from the local file hash index once it is built; Chroma is only queried before that.
     """
     try:
-        collection = get_collection()
-        results = collection.get(
+        hash_index = _get_hash_index()
+        if hash_index.is_built(config.TENANT_NAME, config.COLLECTION_NAME):
+            return hash_index.get(config.TENANT_NAME, config.COLLECTION_NAME, file_hash)
+    except Exception as e:
+        logger.error(f"File hash index lookup failed, querying ChromaDB: {e}")
+
+    try:
+        results = manager.run(lambda collection: collection.get(
             where={"file_hash": file_hash},
             limit=1,
             include=["metadatas"]
-        )
+        ))
         
         if results and results['metadatas'] and len(results['metadatas']) > 0:
             # Return the filename of the first match
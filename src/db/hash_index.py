@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+class FileHashIndex:
+    """
+    Persistent content hash -> filename index per (tenant, collection), kept in SQLite
+    next to the other shared stores so duplicate checks never touch the vector store.
+    An index is only trusted once it has been built (from Chroma or by ingest); until
+    then callers fall back to querying Chroma.
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_hashes ("
+            "tenant TEXT NOT NULL, collection TEXT NOT NULL, file_hash TEXT NOT NULL, filename TEXT NOT NULL, "
+            "PRIMARY KEY (tenant, collection, file_hash))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS file_hashes_by_filename ON file_hashes (tenant, collection, filename)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS built ("
+            "tenant TEXT NOT NULL, collection TEXT NOT NULL, PRIMARY KEY (tenant, collection))"
+        )
+        self._conn.commit()
+
+    def is_built(self, tenant: str, collection: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM built WHERE tenant = ? AND collection = ?", (tenant, collection)
+            ).fetchone()
+        return row is not None
+
+    def get(self, tenant: str, collection: str, file_hash: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT filename FROM file_hashes WHERE tenant = ? AND collection = ? AND file_hash = ?",
+                (tenant, collection, file_hash)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, tenant: str, collection: str, entries: dict) -> None:
+        """Adds {file_hash: filename} entries."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO file_hashes (tenant, collection, file_hash, filename) VALUES (?, ?, ?, ?)",
+                [(tenant, collection, file_hash, filename) for file_hash, filename in entries.items()]
+            )
+            self._conn.commit()
+
+    def remove_filename(self, tenant: str, collection: str, filename: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM file_hashes WHERE tenant = ? AND collection = ? AND filename = ?",
+                (tenant, collection, filename)
+            )
+            self._conn.commit()
+
+    def rebuild(self, tenant: str, collection: str, entries: dict) -> None:
+        """Replaces the index of a collection with {file_hash: filename} and marks it built."""
+        with self._lock:
+            self._conn.execute("DELETE FROM file_hashes WHERE tenant = ? AND collection = ?", (tenant, collection))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO file_hashes (tenant, collection, file_hash, filename) VALUES (?, ?, ?, ?)",
+                [(tenant, collection, file_hash, filename) for file_hash, filename in entries.items()]
+            )
+            self._conn.execute("INSERT OR IGNORE INTO built (tenant, collection) VALUES (?, ?)", (tenant, collection))
+            self._conn.commit()
+
+    def invalidate(self, tenant: str, collection: str) -> None:
+        """Forgets the index of a collection (e.g. after restoring Chroma from a backup)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM file_hashes WHERE tenant = ? AND collection = ?", (tenant, collection))
+            self._conn.execute("DELETE FROM built WHERE tenant = ? AND collection = ?", (tenant, collection))
+            self._conn.commit()
+
+    def invalidate_all(self) -> None:
+        """Forgets the index of every collection (a restore replaces all tenants' data)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM file_hashes")
+            self._conn.execute("DELETE FROM built")
+            self._conn.commit()
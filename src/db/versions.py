@@ -0,0 +1,41 @@
+import os
+import sqlite3
+import threading
+
+class CollectionVersionStore:
+    """
+    Monotonic per-(tenant, collection) change counter kept in SQLite.
+    Lives in the shared data dir so the query bot sees writes made by the ingest
+    bot and by maintenance scripts running in other processes.
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS versions ("
+            "tenant TEXT NOT NULL, collection TEXT NOT NULL, version INTEGER NOT NULL, "
+            "PRIMARY KEY (tenant, collection))"
+        )
+        self._conn.commit()
+
+    def get(self, tenant: str, collection: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM versions WHERE tenant = ? AND collection = ?", (tenant, collection)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, tenant: str, collection: str) -> int:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO versions (tenant, collection, version) VALUES (?, ?, 1) "
+                "ON CONFLICT(tenant, collection) DO UPDATE SET version = version + 1",
+                (tenant, collection)
+            )
+            self._conn.commit()
+            row = self._conn.execute(
+                "SELECT version FROM versions WHERE tenant = ? AND collection = ?", (tenant, collection)
+            ).fetchone()
+        return row[0]
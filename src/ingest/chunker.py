@@ -1,76 +1,249 @@
-import re
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+
+# Bump when a change to the chunkers changes their output, so reindexing redoes every file
+CHUNKER_VERSION = 1
 
 def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> list[str]:
     """
     Splits text into chunks using a recursive character splitting strategy.
     It tries to split by the most natural separators first (\n\n, \n, . , space).
+    Works on offsets into the original string; pieces between separators are never
+    materialized, so cost scales with the number of chunks rather than pieces.
+    """
+    return [chunk for _, _, chunk in chunk_spans(text, chunk_size, overlap)]
+
+def chunk_spans(text: str, chunk_size: int = 1000, overlap: int = 200) -> list[tuple[int, int, str]]:
+    """
+    Same chunks as chunk_text, as (start, end, chunk) where text[start:end] is the
+    range of the original text the chunk was taken from.
     """
-    separators = ["\n\n", "\n", ". ", " ", ""]
-    raw_chunks = _split_text(text, chunk_size, overlap, separators)
+    raw_chunks = []
+    _split_text(text, 0, len(text), chunk_size, overlap, SEPARATORS, raw_chunks)
     # Filter empty or whitespace-only chunks
-    return [c for c in raw_chunks if c and c.strip()]
+    return [span for span in raw_chunks if span[2] and span[2].strip()]
+
+def _is_self_overlapping(separator: str) -> bool:
+    return any(separator[:k] == separator[-k:] for k in range(1, len(separator)))
+
+class _SeparatorPieces:
+    """
+    Pieces of text[start:end].split(separator), located with find/rfind.
+    Only valid for separators that cannot overlap themselves, where every
+    occurrence is a split point.
+    """
+    def __init__(self, text: str, start: int, end: int, separator: str):
+        self.text = text
+        self.end = end
+        self.separator = separator
+        self.sep_len = len(separator)
+
+    def end_of(self, pos: int) -> int:
+        """End of the piece starting at pos."""
+        idx = self.text.find(self.separator, pos, self.end)
+        return self.end if idx == -1 else idx
+
+    def last_end_within(self, pos: int, limit: int) -> int:
+        """Largest end <= limit of the pieces starting at pos, or -1 if the first piece is longer."""
+        if self.end <= limit:
+            return self.end
+        if limit < pos:
+            return -1
+        return self.text.rfind(self.separator, pos, min(limit + self.sep_len, self.end))
+
+    def first_start_from(self, lower: int, span_end: int):
+        """Smallest piece start >= lower inside a span ending at span_end, or None."""
+        # Clamp: negative bounds would be read as offsets from the end of the string
+        idx = self.text.find(self.separator, max(lower - self.sep_len, 0), span_end)
+        return None if idx == -1 else idx + self.sep_len
 
-def _split_text(text: str, chunk_size: int, overlap: int, separators: list[str]) -> list[str]:
-    final_chunks = []
-    
+class _OffsetPieces:
+    """
+    Same interface backed by absolute piece start offsets, for separators that can
+    overlap themselves ("\n\n" inside a run of newlines) and for single characters.
+    """
+    def __init__(self, text: str, start: int, end: int, separator: str):
+        self.end = end
+        self.sep_len = len(separator)
+        if separator:
+            steps = map(self.sep_len.__add__, map(len, text[start:end].split(separator)))
+            self.starts = list(accumulate(steps, initial=start))
+        else:
+            self.starts = range(start, end + 1)
+        self.count = len(self.starts) - 1
+
+    def end_of(self, pos: int) -> int:
+        return self.starts[bisect_left(self.starts, pos) + 1] - self.sep_len
+
+    def last_end_within(self, pos: int, limit: int) -> int:
+        k = bisect_left(self.starts, pos)
+        m = bisect_right(self.starts, limit + self.sep_len, k + 1, self.count + 1) - 1
+        return -1 if m <= k else self.starts[m] - self.sep_len
+
+    def first_start_from(self, lower: int, span_end: int):
+        k = bisect_left(self.starts, lower)
+        return self.starts[k] if k < self.count and self.starts[k] <= span_end else None
+
+def _split_chars(text: str, start: int, end: int, chunk_size: int, overlap: int, final_chunks: list):
+    """
+    Character-level split: fixed windows of chunk_size with chunk_size - overlap stride.
+    """
+    if start >= end:
+        return
+    pos = start
+    while end - pos > chunk_size:
+        final_chunks.append((pos, pos + chunk_size, text[pos:pos + chunk_size]))
+        pos += chunk_size - overlap
+    final_chunks.append((pos, end, text[pos:end]))
+
+def _split_text(text: str, start: int, end: int, chunk_size: int, overlap: int,
+                separators: list[str], final_chunks: list):
     # Get the current separator
     separator = separators[0]
     next_separators = separators[1:] if len(separators) > 1 else []
-    
-    # Split text by the current separator
-    if separator:
-        splits = text.split(separator)
+
+    if not separator:
+        if 0 <= overlap < chunk_size:
+            _split_chars(text, start, end, chunk_size, overlap, final_chunks)
+            return
+        if start >= end:
+            return
+
+    if separator and text.find(separator, start, end) == -1:
+        # Separator absent: the whole range is a single piece
+        if end - start > chunk_size and next_separators:
+            _split_text(text, start, end, chunk_size, overlap, next_separators, final_chunks)
+        else:
+            final_chunks.append((start, end, text[start:end]))
+        return
+
+    sep_len = len(separator)
+    if separator and not _is_self_overlapping(separator):
+        pieces = _SeparatorPieces(text, start, end, separator)
     else:
-        splits = list(text) # Split by character if no separator left
+        pieces = _OffsetPieces(text, start, end, separator)
 
-    # Buffer to build the current chunk
+    def emit(spans):
+        # Spans are runs of adjacent pieces (one slice each). They are only disjoint
+        # around a recursively split piece; those are joined with the separator.
+        if len(spans) == 1:
+            chunk = text[spans[0][0]:spans[0][1]]
+        else:
+            chunk = separator.join(text[s:e] for s, e in spans)
+        final_chunks.append((spans[0][0], spans[-1][1], chunk))
+
+    def add_span(span_start, span_end):
+        if current_chunk and current_chunk[-1][1] + sep_len == span_start:
+            current_chunk[-1][1] = span_end
+        else:
+            current_chunk.append([span_start, span_end])
+
+    # Current chunk as [start, end] spans of adjacent pieces
     current_chunk = []
     current_length = 0
-    
-    for split in splits:
-        # Re-attach separator if it's not the last split (approximation for reconstruction)
-        # However, for splitting purposes, we usually just join later.
-        # But split() removes the separator. We need to account for its length if we join.
-        sep_len = len(separator) if separator else 0
-        split_len = len(split)
-        
-        # If adding this split exceeds chunk size
-        if current_length + split_len + (sep_len if current_chunk else 0) > chunk_size:
-            # If buffer is not empty, save it
-            if current_chunk:
-                doc_chunk = separator.join(current_chunk)
-                final_chunks.append(doc_chunk)
-                
-                # Handle overlap: keep ending items that fit within overlap
-                # This is a simplified overlap strategy for recursive splitting
-                overlap_buffer = []
-                overlap_len = 0
-                for item in reversed(current_chunk):
-                    item_len = len(item)
-                    if overlap_len + item_len + sep_len <= overlap:
-                         overlap_buffer.insert(0, item)
-                         overlap_len += item_len + sep_len
-                    else:
-                        break
-                current_chunk = overlap_buffer
-                current_length = overlap_len
-            
-            # Now check the current split again
-            # If single split is still too large, verify if we can split it further
-            if len(split) > chunk_size and next_separators:
-                sub_chunks = _split_text(split, chunk_size, overlap, next_separators)
-                final_chunks.extend(sub_chunks)
-            else:
-                # If cannot split further or fits now (unlikely if loop entered), add to buffer
-                # Note: If > chunk_size and no separators, we force split (handled by list(text) case ideally, or accept oversized)
-                current_chunk.append(split)
-                current_length += len(split)
+    pos = start
+
+    while pos is not None:
+        if current_chunk:
+            # Take every following piece that still fits in one step.
+            # Each piece counts with its separator, matching the original length accounting.
+            last_end = pieces.last_end_within(pos, chunk_size - current_length + pos - sep_len)
+            if last_end >= pos:
+                add_span(pos, last_end)
+                current_length += last_end - pos + sep_len
+                pos = last_end + sep_len if last_end < end else None
+                continue
+
+            # The next piece does not fit: save the buffer
+            emit(current_chunk)
+
+            # Handle overlap: keep ending pieces whose total length fits within overlap
+            kept = []
+            overlap_len = 0
+            for span_start, span_end in reversed(current_chunk):
+                lower = span_end + sep_len - (overlap - overlap_len)
+                if lower <= span_start:
+                    kept.append([span_start, span_end])
+                    overlap_len += span_end + sep_len - span_start
+                    continue
+                kept_start = pieces.first_start_from(lower, span_end)
+                if kept_start is not None:
+                    kept.append([kept_start, span_end])
+                    overlap_len += span_end + sep_len - kept_start
+                break
+            current_chunk = kept[::-1]
+            current_length = overlap_len
+            piece_end = pieces.end_of(pos)
+        else:
+            piece_end = pieces.end_of(pos)
+            if piece_end - pos <= chunk_size:
+                add_span(pos, piece_end)
+                current_length += piece_end - pos + sep_len
+                pos = piece_end + sep_len if piece_end < end else None
+                continue
+
+        # If single split is still too large, split it further with the next separator
+        if piece_end - pos > chunk_size and next_separators:
+            _split_text(text, pos, piece_end, chunk_size, overlap, next_separators, final_chunks)
         else:
-            current_chunk.append(split)
-            current_length += split_len + (sep_len if current_chunk else 0)
-            
+            # Cannot split further (or fits now): add to buffer, possibly oversized
+            add_span(pos, piece_end)
+            current_length += piece_end - pos
+        pos = piece_end + sep_len if piece_end < end else None
+
     # Add remaining buffer
     if current_chunk:
-        final_chunks.append(separator.join(current_chunk))
-        
-    return final_chunks
+        emit(current_chunk)
+
+TOKEN_BOUNDARY_SEPARATORS = ["\n\n", "\n", ". "]
+
+def chunk_text_by_tokens(text: str, token_offsets, chunk_tokens: int = 400, overlap_tokens: int = 80) -> list[str]:
+    """
+    Splits text into windows of at most chunk_tokens tokens, repeating overlap_tokens
+    tokens between consecutive windows.
+    token_offsets(text) returns the character offset where each token starts
+    (see src.llm.tokens.TokenCounter.token_offsets), so chunks are slices of the
+    original text and never cut a character in half.
+    Where possible a window ends right after a paragraph, line or sentence break
+    found in its last quarter.
+    """
+    return [chunk for _, _, chunk in token_chunk_spans(text, token_offsets, chunk_tokens, overlap_tokens)]
+
+def token_chunk_spans(text: str, token_offsets, chunk_tokens: int = 400, overlap_tokens: int = 80) -> list[tuple[int, int, str]]:
+    """Same chunks as chunk_text_by_tokens, as (start, end, chunk) with chunk == text[start:end]."""
+    if overlap_tokens >= chunk_tokens:
+        raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+
+    offsets = token_offsets(text)
+    n = len(offsets)
+    # Character offset where token i starts, with offsets[n] == len(text)
+    bounds = list(offsets) + [len(text)]
+
+    raw_chunks = []
+    start = 0
+    while start < n:
+        end = min(start + chunk_tokens, n)
+        if end < n:
+            end = _snap_to_boundary(text, bounds, start, end, chunk_tokens, overlap_tokens)
+        raw_chunks.append((bounds[start], bounds[end], text[bounds[start]:bounds[end]]))
+        if end >= n:
+            break
+        start = max(end - overlap_tokens, start + 1)
+
+    return [span for span in raw_chunks if span[2] and span[2].strip()]
+
+def _snap_to_boundary(text: str, bounds: list[int], start: int, end: int, chunk_tokens: int, overlap_tokens: int) -> int:
+    """Moves the window end back to the token after the last natural break in the window's tail."""
+    floor = start + max(chunk_tokens * 3 // 4, overlap_tokens + 1)
+    if floor >= end:
+        return end
+    lo, hi = bounds[floor], bounds[end]
+    for separator in TOKEN_BOUNDARY_SEPARATORS:
+        idx = text.rfind(separator, lo, hi)
+        if idx != -1:
+            cut = bisect_left(bounds, idx + len(separator), floor, end)
+            if floor <= cut < end:
+                return cut
+    return end
@@ -0,0 +1,281 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Optional
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+INGEST_STAGES = ("parse", "ocr", "embed", "upsert")
+
+POLL_INTERVAL = 1.0 # Seconds an idle worker waits before looking for due jobs
+
+class StageLimits:
+    """
+    Bounds how many ingest jobs are in each stage at once, across all workers
+    (e.g. a single OCR request in flight while other jobs parse and embed).
+    Stages without a limit are unbounded.
+    """
+    def __init__(self, limits: dict):
+        self._semaphores = {
+            stage: threading.BoundedSemaphore(limit) for stage, limit in limits.items() if limit and limit > 0
+        }
+
+    @classmethod
+    def from_config(cls) -> "StageLimits":
+        return cls({
+            "parse": config.INGEST_PARSE_CONCURRENCY,
+            "ocr": config.INGEST_OCR_CONCURRENCY,
+            "embed": config.INGEST_EMBED_CONCURRENCY,
+            "upsert": config.INGEST_UPSERT_CONCURRENCY,
+        })
+
+    def stage(self, name: str):
+        return self._semaphores.get(name) or nullcontext()
+
+    def iterate(self, name: str, iterable):
+        """Yields from iterable, holding the stage only while each item is produced (e.g. a lazy parser)."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+NO_LIMITS = StageLimits({})
+
+class IngestJobStore:
+    """
+    Persistent ingest queue of one (tenant, collection). Jobs and their status live in
+    SQLite; the uploaded file is spooled next to it until the job finishes, so queued and
+    interrupted jobs survive a restart.
+    The ingest bots of all tenants share CACHE_DIR, so every job records its tenant and
+    collection and a store only ever sees its own.
+    """
+    def __init__(self, path: str, spool_dir: str = None, tenant: str = None, collection: str = None):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.tenant = tenant or config.TENANT_NAME
+        self.collection = collection or config.COLLECTION_NAME
+        self.spool_dir = spool_dir or os.path.join(
+            os.path.dirname(os.path.abspath(path)), "ingest_spool", self.tenant, self.collection
+        )
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, tenant TEXT NOT NULL DEFAULT '', collection TEXT NOT NULL DEFAULT '', "
+            "file_name TEXT NOT NULL, payload_path TEXT NOT NULL, "
+            "chat_id INTEGER, message_id INTEGER, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt_at REAL NOT NULL, result_status TEXT, result_message TEXT, "
+            "created_at TEXT NOT NULL, updated_at TEXT NOT NULL)"
+        )
+        # Queues created before jobs were scoped per tenant
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("tenant", "collection"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("DROP INDEX IF EXISTS jobs_by_status")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_by_tenant_status ON jobs (tenant, collection, status, next_attempt_at)"
+        )
+        self._conn.commit()
+
+    def enqueue(self, file_name: str, file_content: bytes, chat_id: int = None, message_id: int = None) -> str:
+        job_id = uuid.uuid4().hex
+        payload_path = os.path.join(self.spool_dir, f"{job_id}.pdf")
+        with open(payload_path, "wb") as f:
+            f.write(file_content)
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, tenant, collection, file_name, payload_path, chat_id, message_id, status, "
+                "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, self.tenant, self.collection, file_name, payload_path, chat_id, message_id, time.time(), now, now)
+            )
+            self._conn.commit()
+        return job_id
+
+    def claim_next(self) -> Optional[dict]:
+        """Marks the oldest due queued job as running and returns it (attempts already counted)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE tenant = ? AND collection = ? AND status = 'queued' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at, created_at LIMIT 1",
+                (self.tenant, self.collection, time.time())
+            ).fetchone()
+            if not row:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (datetime.now().isoformat(), row[0])
+            )
+            self._conn.commit()
+        return self.get(row[0])
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, file_name, payload_path, chat_id, message_id, status, attempts, "
+                "result_status, result_message FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if not row:
+            return None
+        keys = ("id", "file_name", "payload_path", "chat_id", "message_id", "status", "attempts",
+                "result_status", "result_message")
+        return dict(zip(keys, row))
+
+    def retry(self, job_id: str, delay: float, error: str) -> None:
+        self._update(job_id, "queued", None, error, next_attempt_at=time.time() + delay)
+
+    def finish(self, job_id: str, result_status: str, result_message: str = None) -> None:
+        """Records the result and deletes the spooled file."""
+        self._update(job_id, "done" if result_status != "ERROR" else "failed", result_status, result_message)
+        job = self.get(job_id)
+        if job:
+            try:
+                os.remove(job["payload_path"])
+            except FileNotFoundError:
+                pass
+
+    def _update(self, job_id: str, status: str, result_status: Optional[str], result_message: Optional[str],
+                next_attempt_at: float = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result_status = ?, result_message = ?, "
+                "next_attempt_at = COALESCE(?, next_attempt_at), updated_at = ? WHERE id = ?",
+                (status, result_status, result_message, next_attempt_at, datetime.now().isoformat(), job_id)
+            )
+            self._conn.commit()
+
+    def requeue_running(self) -> int:
+        """Puts jobs left running by a crash or restart back in the queue. Returns how many."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? "
+                "WHERE tenant = ? AND collection = ? AND status = 'running'",
+                (datetime.now().isoformat(), self.tenant, self.collection)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE tenant = ? AND collection = ? AND status IN ('queued', 'running')",
+                (self.tenant, self.collection)
+            ).fetchone()[0]
+
+class QueueFullError(Exception):
+    pass
+
+class IngestQueue:
+    """
+    Fixed pool of worker threads draining an IngestJobStore.
+    process(file_name, file_content, limits) returns a (status, message) tuple as
+    process_document does; "ERROR" results and exceptions are retried with exponential
+    backoff up to max_attempts. notify(job, event, status, message) is called on "queued",
+    "started", "retrying" and "finished" (e.g. to edit the uploader's status message)
+    and must not block. on_retry(file_name, file_content) runs before every attempt after
+    the first (including jobs interrupted by a restart), to clear what the failed one left behind.
+    """
+    def __init__(self, store: IngestJobStore, process, notify=None, workers: int = None,
+                 limits: StageLimits = None, max_pending: int = None, max_attempts: int = None,
+                 retry_base_delay: float = None, on_retry=None):
+        self.store = store
+        self.process = process
+        self.notify = notify
+        self.on_retry = on_retry
+        self.workers = workers or config.INGEST_WORKERS
+        self.limits = limits or StageLimits.from_config()
+        self.max_pending = max_pending if max_pending is not None else config.INGEST_QUEUE_MAX_PENDING
+        self.max_attempts = max_attempts or config.INGEST_MAX_ATTEMPTS
+        self.retry_base_delay = retry_base_delay if retry_base_delay is not None else config.INGEST_RETRY_BASE_DELAY
+        self._threads = []
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+
+    def start(self) -> None:
+        recovered = self.store.requeue_running()
+        if recovered:
+            logger.info(f"Requeued {recovered} interrupted ingest jobs")
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Ingest queue started with {self.workers} workers ({self.store.pending_count()} jobs pending)")
+
+    def stop(self, timeout: float = None) -> None:
+        """Stops taking new jobs and waits for the running ones; unfinished jobs resume on the next start."""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, file_name: str, file_content: bytes, chat_id: int = None, message_id: int = None) -> str:
+        """Queues a file for ingestion. Raises QueueFullError when max_pending jobs are already waiting."""
+        pending = self.store.pending_count()
+        if self.max_pending and pending >= self.max_pending:
+            raise QueueFullError(f"{pending} ingest jobs pending")
+        job_id = self.store.enqueue(file_name, bytes(file_content), chat_id, message_id)
+        self._notify(self.store.get(job_id), "queued", None, str(pending))
+        self._wakeup.set()
+        return job_id
+
+    def _notify(self, job: dict, event: str, status: Optional[str], message: Optional[str]) -> None:
+        if self.notify is None or job is None:
+            return
+        try:
+            self.notify(job, event, status, message)
+        except Exception as e:
+            logger.error(f"Failed to report {event} of ingest job {job['id']}: {e}")
+
+    def _work(self) -> None:
+        while not self._stopping.is_set():
+            job = self.store.claim_next()
+            if job is None:
+                self._wakeup.wait(POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            self.run_job(job)
+
+    def run_job(self, job: dict) -> None:
+        self._notify(job, "started", None, None)
+        try:
+            with open(job["payload_path"], "rb") as f:
+                file_content = f.read()
+        except OSError as e:
+            logger.error(f"Ingest job {job['id']} lost its file: {e}")
+            self.store.finish(job["id"], "ERROR", str(e))
+            self._notify(job, "finished", "ERROR", str(e))
+            return
+
+        try:
+            if job["attempts"] > 1 and self.on_retry is not None:
+                self.on_retry(job["file_name"], file_content)
+            status, message = self.process(job["file_name"], file_content, self.limits)
+        except Exception as e:
+            status, message = "ERROR", str(e)
+
+        if status == "ERROR" and job["attempts"] < self.max_attempts:
+            delay = self.retry_base_delay * (2 ** (job["attempts"] - 1))
+            logger.warning(f"Ingest of {job['file_name']} failed (attempt {job['attempts']}/{self.max_attempts}), "
+                           f"retrying in {delay:.0f}s: {message}")
+            self.store.retry(job["id"], delay, message)
+            self._notify(job, "retrying", status, message)
+            return
+
+        self.store.finish(job["id"], status, message)
+        logger.info(f"Ingest of {job['file_name']} finished: {status}")
+        self._notify(job, "finished", status, message)
@@ -0,0 +1,188 @@
+import fitz  # PyMuPDF
+import hashlib
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+from array import array
+from typing import Optional
+from src.config import config
+from src.ingest.parser import iter_pdf_pages
+from src.rag.lexical import normalize_hebrew
+
+logger = logging.getLogger(__name__)
+
+NEAR_DUPLICATE_POLICIES = ("off", "report", "refuse", "replace")
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 128
+# 16 bands of 8 rows: documents with Jaccard similarity around 0.7 and above become candidates
+LSH_BANDS = 16
+
+_WORD_RE = re.compile(r"\w+")
+
+def _hash64(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set[int]:
+    """64-bit hashes of the word n-grams of the normalized text (niqqud, final letters and case folded)."""
+    words = _WORD_RE.findall(normalize_hebrew(text))
+    if not words:
+        return set()
+    if len(words) < size:
+        return {_hash64(" ".join(words))}
+    return {_hash64(" ".join(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+class MinHasher:
+    """
+    MinHash signatures. Each permutation XORs the 64-bit shingle hashes with a random
+    mask (fixed seed, so signatures are comparable across runs), which keeps the
+    per-permutation minimum a single C-level pass.
+    """
+    def __init__(self, num_permutations: int = NUM_PERMUTATIONS, seed: int = 1):
+        rnd = random.Random(seed)
+        self.masks = [rnd.getrandbits(64) for _ in range(num_permutations)]
+
+    def signature(self, shingle_set: set[int]) -> Optional[list[int]]:
+        if not shingle_set:
+            return None
+        return [min(map(mask.__xor__, shingle_set)) for mask in self.masks]
+
+_hasher = MinHasher()
+
+def document_signature(texts) -> Optional[list[int]]:
+    """MinHash signature of a document given as an iterable of texts (pages or chunks)."""
+    shingle_set = set()
+    for text in texts:
+        shingle_set |= shingles(text)
+    return _hasher.signature(shingle_set)
+
+def pdf_signature(file_content: bytes, page_texts: dict = None) -> Optional[list[int]]:
+    """Signature of a PDF's text layer, with page_texts (OCR results) replacing those pages."""
+    doc = fitz.open(stream=file_content, filetype="pdf")
+    try:
+        return document_signature(text for _, text in iter_pdf_pages(doc, page_texts))
+    finally:
+        doc.close()
+
+def estimate_similarity(first: list[int], second: list[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+def _band_keys(signature: list[int]) -> list[str]:
+    rows = len(signature) // LSH_BANDS
+    return [
+        hashlib.md5(array('Q', signature[band * rows:(band + 1) * rows]).tobytes()).hexdigest()[:16]
+        for band in range(LSH_BANDS)
+    ]
+
+class NearDuplicateIndex:
+    """
+    Persistent LSH index of document MinHash signatures per (tenant, collection).
+    Documents sharing a band bucket are candidates; they are confirmed by comparing
+    the full signatures.
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS signatures ("
+            "tenant TEXT NOT NULL, collection TEXT NOT NULL, filename TEXT NOT NULL, "
+            "file_hash TEXT NOT NULL, signature BLOB NOT NULL, "
+            "PRIMARY KEY (tenant, collection, filename))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "tenant TEXT NOT NULL, collection TEXT NOT NULL, band INTEGER NOT NULL, bucket TEXT NOT NULL, "
+            "filename TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS buckets_by_key ON buckets (tenant, collection, band, bucket)"
+        )
+        self._conn.commit()
+
+    def add(self, tenant: str, collection: str, filename: str, file_hash: str, signature: list[int]) -> None:
+        with self._lock:
+            self._remove(tenant, collection, filename)
+            self._conn.execute(
+                "INSERT INTO signatures (tenant, collection, filename, file_hash, signature) VALUES (?, ?, ?, ?, ?)",
+                (tenant, collection, filename, file_hash or "", array('Q', signature).tobytes())
+            )
+            self._conn.executemany(
+                "INSERT INTO buckets (tenant, collection, band, bucket, filename) VALUES (?, ?, ?, ?, ?)",
+                [(tenant, collection, band, key, filename) for band, key in enumerate(_band_keys(signature))]
+            )
+            self._conn.commit()
+
+    def remove(self, tenant: str, collection: str, filename: str) -> None:
+        with self._lock:
+            self._remove(tenant, collection, filename)
+            self._conn.commit()
+
+    def _remove(self, tenant: str, collection: str, filename: str) -> None:
+        self._conn.execute(
+            "DELETE FROM signatures WHERE tenant = ? AND collection = ? AND filename = ?", (tenant, collection, filename)
+        )
+        self._conn.execute(
+            "DELETE FROM buckets WHERE tenant = ? AND collection = ? AND filename = ?", (tenant, collection, filename)
+        )
+
+    def query(self, tenant: str, collection: str, signature: list[int], threshold: float) -> list[tuple[str, str, float]]:
+        """Returns (filename, file_hash, similarity) of indexed documents at or above threshold, most similar first."""
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(_band_keys(signature)):
+                rows = self._conn.execute(
+                    "SELECT filename FROM buckets WHERE tenant = ? AND collection = ? AND band = ? AND bucket = ?",
+                    (tenant, collection, band, key)
+                ).fetchall()
+                candidates.update(row[0] for row in rows)
+
+            matches = []
+            for filename in candidates:
+                row = self._conn.execute(
+                    "SELECT file_hash, signature FROM signatures WHERE tenant = ? AND collection = ? AND filename = ?",
+                    (tenant, collection, filename)
+                ).fetchone()
+                if not row:
+                    continue
+                similarity = estimate_similarity(signature, array('Q', row[1]).tolist())
+                if similarity >= threshold:
+                    matches.append((filename, row[0], similarity))
+        return sorted(matches, key=lambda match: -match[2])
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index() -> NearDuplicateIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NearDuplicateIndex(os.path.join(config.CACHE_DIR, "near_duplicates.sqlite"))
+        return _index
+
+def find_near_duplicate(signature: list[int], exists=None) -> Optional[tuple[str, float]]:
+    """
+    Returns (filename, similarity) of the most similar indexed document at or above
+    config.NEAR_DUPLICATE_THRESHOLD, or None.
+    exists(filename, file_hash) confirms a match is still in the collection; stale
+    entries are dropped.
+    """
+    index = get_index()
+    for filename, file_hash, similarity in index.query(
+            config.TENANT_NAME, config.COLLECTION_NAME, signature, config.NEAR_DUPLICATE_THRESHOLD):
+        if exists is not None and not exists(filename, file_hash):
+            index.remove(config.TENANT_NAME, config.COLLECTION_NAME, filename)
+            continue
+        return filename, similarity
+    return None
+
+def record(filename: str, file_hash: str, signature: list[int]) -> None:
+    get_index().add(config.TENANT_NAME, config.COLLECTION_NAME, filename, file_hash, signature)
+
+def forget(filename: str) -> None:
+    get_index().remove(config.TENANT_NAME, config.COLLECTION_NAME, filename)
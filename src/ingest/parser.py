@@ -5,54 +5,175 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-from src.ingest.chunker import chunk_text
+from bisect import bisect_right
+from itertools import islice
+from src.config import config
+from src.ingest.chunker import chunk_spans, token_chunk_spans
+from src.llm.tokens import get_token_counter
 
-def parse_pdf(filepath: str, file_content: bytes = None, file_hash: str = None):
+CHUNKING_MODES = ("chars", "tokens")
+
+def split_text_spans(text: str, mode: str = None) -> list[tuple[int, int, str]]:
     """
-    Extracts text and metadata from a PDF file.
-    If file_content is provided, parses from memory stream.
-    Returns a LIST of chunk dictionaries.
+    Chunks text using the configured chunking mode (config.CHUNKING_MODE unless given):
+    "chars" for character-sized chunks, "tokens" for chunks sized in the embedding
+    model's tokens (config.CHUNK_TOKENIZER).
+    Returns (start, end, chunk) tuples locating each chunk in text.
     """
-    try:
-        if file_content:
-            doc = fitz.open(stream=file_content, filetype="pdf")
-            # For stream, use current time as created_at
-            created_at = datetime.now().isoformat()
+    mode = mode or config.CHUNKING_MODE
+    if mode == "tokens":
+        counter = get_token_counter(config.CHUNK_TOKENIZER)
+        return token_chunk_spans(text, counter.token_offsets, config.CHUNK_TOKENS, config.CHUNK_OVERLAP_TOKENS)
+    if mode != "chars":
+        raise ValueError(f"Unknown chunking mode: {mode} (expected one of {CHUNKING_MODES})")
+    return chunk_spans(text, config.CHUNK_SIZE, config.CHUNK_OVERLAP)
+
+def split_text(text: str, mode: str = None) -> list[str]:
+    """Chunks text using the configured chunking mode. See split_text_spans."""
+    return [chunk for _, _, chunk in split_text_spans(text, mode)]
+
+def _open_pdf(filepath: str, file_content: bytes = None):
+    if file_content:
+        doc = fitz.open(stream=file_content, filetype="pdf")
+        # For stream, use current time as created_at
+        created_at = datetime.now().isoformat()
+    else:
+        doc = fitz.open(filepath)
+        created_at = datetime.fromtimestamp(os.path.getctime(filepath)).isoformat()
+    return doc, created_at
+
+def iter_pdf_pages(doc, page_texts: dict = None):
+    """
+    Yields (page_number, text) for each page, 1-based, extracting one page at a time.
+    page_texts replaces the text of some pages, e.g. with OCR results for scanned pages.
+    """
+    page_texts = page_texts or {}
+    for page_number, page in enumerate(doc, start=1):
+        if page_number in page_texts:
+            yield page_number, page_texts[page_number]
         else:
-            doc = fitz.open(filepath)
-            created_at = datetime.fromtimestamp(os.path.getctime(filepath)).isoformat()
-            
-            # If hash not provided and reading from file, calculate it (optional backup)
-            # But the caller should usually provide it.
-
-        text = ""
-        for page in doc:
-            text += page.get_text() + "\n"
-            
+            yield page_number, page.get_text()
+
+def iter_page_chunks(pages, chunking_mode: str = None, buffer_chars: int = None):
+    """
+    Chunks a stream of (page_number, text) pages incrementally.
+    Yields (chunk, page_start, page_end). Pages are buffered only until buffer_chars
+    (config.INGEST_BUFFER_CHARS) is reached; the buffer is then chunked, every chunk
+    but the last is yielded, and chunking resumes from the start of the last chunk.
+    Documents smaller than the buffer are chunked exactly as one string.
+    """
+    if buffer_chars is None:
+        buffer_chars = config.INGEST_BUFFER_CHARS
+
+    buffer = ""
+    # Offset in buffer where each buffered page starts, and its page number
+    page_offsets = []
+    page_numbers = []
+
+    def page_at(offset):
+        return page_numbers[bisect_right(page_offsets, offset) - 1]
+
+    def chunk_buffer(final):
+        nonlocal buffer, page_offsets, page_numbers
+        spans = split_text_spans(buffer, chunking_mode)
+        if not final:
+            if len(spans) < 2:
+                return
+            # The last chunk may continue on the next page: keep it buffered
+            cut = spans[-1][0]
+            spans = spans[:-1]
+        for start, end, chunk in spans:
+            yield chunk, page_at(start), page_at(max(end - 1, start))
+        if not final:
+            first = bisect_right(page_offsets, cut) - 1
+            page_offsets = [max(offset - cut, 0) for offset in page_offsets[first:]]
+            page_numbers = page_numbers[first:]
+            buffer = buffer[cut:]
+
+    for page_number, page_text in pages:
+        page_offsets.append(len(buffer))
+        page_numbers.append(page_number)
+        buffer += page_text + "\n"
+        if len(buffer) >= buffer_chars:
+            yield from chunk_buffer(final=False)
+
+    if buffer:
+        yield from chunk_buffer(final=True)
+
+def iter_pdf_documents(filepath: str, file_content: bytes = None, file_hash: str = None, chunking_mode: str = None,
+                       page_texts: dict = None):
+    """
+    Streaming variant of parse_pdf: yields chunk documents page by page instead of
+    extracting the whole PDF into one string first.
+    Each chunk records the pages it spans as page_start/page_end (1-based).
+    page_texts ({page_number: text}) is used instead of the text layer of those pages
+    (OCR results); the chunks are then marked with ocr=true.
+    Raises on parse errors.
+    """
+    doc, created_at = _open_pdf(filepath, file_content)
+    try:
+        filename = os.path.basename(filepath)
         base_metadata = {
-            "filename": os.path.basename(filepath),
+            "filename": filename,
             "created_at": created_at,
             "page_count": len(doc)
         }
-        
+
         if file_hash:
             base_metadata["file_hash"] = file_hash
-        
-        # Chunk the text
-        text_chunks = chunk_text(text)
-        
-        return create_documents_from_chunks(text_chunks, base_metadata, os.path.basename(filepath))
 
+        if page_texts:
+            base_metadata["ocr"] = "true"
+
+        page_chunks = iter_page_chunks(iter_pdf_pages(doc, page_texts), chunking_mode)
+        for i, (chunk, page_start, page_end) in enumerate(page_chunks):
+            document = create_documents_from_chunks([chunk], base_metadata, filename, start_index=i)[0]
+            document["metadata"]["page_start"] = page_start
+            document["metadata"]["page_end"] = page_end
+            yield document
+    finally:
+        doc.close()
+
+def iter_batches(iterable, size: int):
+    """Yields lists of up to size items from iterable."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def parse_pdf(filepath: str, file_content: bytes = None, file_hash: str = None, chunking_mode: str = None):
+    """
+    Extracts text and metadata from a PDF file.
+    If file_content is provided, parses from memory stream.
+    chunking_mode overrides config.CHUNKING_MODE ("chars" or "tokens").
+    Returns a LIST of chunk dictionaries (see iter_pdf_documents to stream them).
+    """
+    try:
+        return list(iter_pdf_documents(filepath, file_content, file_hash, chunking_mode))
     except Exception as e:
         logger.error(f"Error parsing {filepath}: {e}")
         return []
 
-def create_documents_from_chunks(chunks: list[str], base_metadata: dict, filename: str) -> list[dict]:
+def create_ocr_text_documents(text: str, filename: str, file_hash: str = None, chunking_mode: str = None) -> list[dict]:
+    """
+    Chunk documents for the text of a whole-file OCR, which has no page information.
+    """
+    base_metadata = {
+        "filename": filename,
+        "created_at": datetime.now().isoformat(),
+        "page_count": 0,
+        "ocr": "true"
+    }
+    if file_hash:
+        base_metadata["file_hash"] = file_hash
+    return create_documents_from_chunks(split_text(text, chunking_mode), base_metadata, filename)
+
+def create_documents_from_chunks(chunks: list[str], base_metadata: dict, filename: str, start_index: int = 0) -> list[dict]:
     """
     Helper to format text chunks into document objects.
+    start_index numbers the chunks when a document is built in several batches.
     """
     documents = []
-    for i, chunk in enumerate(chunks):
+    for i, chunk in enumerate(chunks, start=start_index):
         doc_id = f"{filename}_part_{i}"
         chunk_metadata = base_metadata.copy()
         chunk_metadata["chunk_index"] = i
@@ -0,0 +1,236 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from typing import Optional
+from src.config import config
+from src.db import chroma
+from src.ingest.chunker import CHUNKER_VERSION
+from src.ingest.parser import iter_pdf_documents, iter_batches, create_ocr_text_documents
+from src.ocr.cache import load_ocr_result, ocr_page_texts
+
+logger = logging.getLogger(__name__)
+
+class ReindexManifest:
+    """
+    Persistent record of what is indexed: per (tenant, collection, filename) the content
+    hash, chunker signature and embedding model it was indexed with.
+    A file is written here only after all its chunks are stored, so an interrupted
+    reindex resumes where it stopped.
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS manifest ("
+            "tenant TEXT NOT NULL, collection TEXT NOT NULL, filename TEXT NOT NULL, "
+            "file_hash TEXT NOT NULL, chunker TEXT NOT NULL, embedding_model TEXT NOT NULL, "
+            "chunks INTEGER NOT NULL, indexed_at TEXT NOT NULL, "
+            "PRIMARY KEY (tenant, collection, filename))"
+        )
+        self._conn.commit()
+
+    def get(self, tenant: str, collection: str, filename: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_hash, chunker, embedding_model, chunks FROM manifest "
+                "WHERE tenant = ? AND collection = ? AND filename = ?",
+                (tenant, collection, filename)
+            ).fetchone()
+        if not row:
+            return None
+        return {"file_hash": row[0], "chunker": row[1], "embedding_model": row[2], "chunks": row[3]}
+
+    def put(self, tenant: str, collection: str, filename: str, file_hash: str, chunker: str,
+            embedding_model: str, chunks: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO manifest "
+                "(tenant, collection, filename, file_hash, chunker, embedding_model, chunks, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (tenant, collection, filename, file_hash, chunker, embedding_model, chunks, datetime.now().isoformat())
+            )
+            self._conn.commit()
+
+    def remove(self, tenant: str, collection: str, filename: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM manifest WHERE tenant = ? AND collection = ? AND filename = ?",
+                (tenant, collection, filename)
+            )
+            self._conn.commit()
+
+    def filenames(self, tenant: str, collection: str) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename FROM manifest WHERE tenant = ? AND collection = ?", (tenant, collection)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+def chunker_signature() -> str:
+    """Identifies the chunker output: chunker version plus the chunking settings."""
+    if config.CHUNKING_MODE == "tokens":
+        settings = f"{config.CHUNK_TOKENIZER}:{config.CHUNK_TOKENS}:{config.CHUNK_OVERLAP_TOKENS}"
+    else:
+        settings = f"{config.CHUNK_SIZE}:{config.CHUNK_OVERLAP}"
+    return f"v{CHUNKER_VERSION}:{config.CHUNKING_MODE}:{settings}"
+
+def parse_file(filename: str, file_content: bytes, file_hash: str, page_texts: dict = None, ocr_text: str = None) -> list[dict]:
+    """
+    Chunks one PDF (runs in a worker process). page_texts / ocr_text are OCR results
+    saved at ingest time: scanned pages, or the text of a file without any text layer.
+    """
+    documents = list(iter_pdf_documents(filename, file_content=file_content, file_hash=file_hash, page_texts=page_texts))
+    if not documents and ocr_text:
+        documents = create_ocr_text_documents(ocr_text, filename, file_hash)
+    return documents
+
+class Reindexer:
+    """
+    Incremental reindex of every PDF in a StorageProvider.
+    Files whose content hash, chunker signature and embedding model match the manifest,
+    and that the collection still holds, are skipped. The rest are parsed in a process pool while the chunks of finished files
+    are embedded and upserted in parallel batches.
+    """
+    def __init__(self, storage, manifest: ReindexManifest = None, workers: int = None, write_concurrency: int = None):
+        self.storage = storage
+        self.manifest = manifest or ReindexManifest(os.path.join(config.CACHE_DIR, "reindex_manifest.sqlite"))
+        self.workers = workers or config.REINDEX_WORKERS or os.cpu_count() or 1
+        self.write_concurrency = write_concurrency or config.REINDEX_WRITE_CONCURRENCY
+        self.tenant = config.TENANT_NAME
+        self.collection = config.COLLECTION_NAME
+        self.chunker = chunker_signature()
+        self.embedding_model = config.AZURE_EMBEDDING_DEPLOYMENT_NAME or ""
+
+    def is_current(self, filename: str, file_hash: str) -> bool:
+        entry = self.manifest.get(self.tenant, self.collection, filename)
+        return (
+            entry is not None
+            and entry["file_hash"] == file_hash
+            and entry["chunker"] == self.chunker
+            and entry["embedding_model"] == self.embedding_model
+            # The manifest outlives deletes, Chroma wipes and restores of older backups
+            and chroma.check_file_exists_by_hash(file_hash) == filename
+        )
+
+    def _prepare(self, filename: str, force: bool):
+        """Returns the parse_file arguments for a file that needs indexing, or None to skip it."""
+        file_hash = None if force else self.storage.get_content_md5(filename)
+        if file_hash and self.is_current(filename, file_hash):
+            return None
+
+        stream = self.storage.get_file_stream(filename)
+        if stream is None:
+            raise IOError(f"Could not download {filename}")
+        try:
+            file_content = stream.read()
+        finally:
+            stream.close()
+        file_hash = hashlib.md5(file_content).hexdigest()
+        if not force and self.is_current(filename, file_hash):
+            return None
+
+        ocr_result = load_ocr_result(self.storage, filename, file_hash)
+        page_texts = ocr_page_texts(ocr_result) if ocr_result else None
+        ocr_text = ocr_result["text"] if ocr_result and page_texts is None else None
+        return (filename, file_content, file_hash, page_texts, ocr_text)
+
+    def _write(self, write_pool, filename: str, file_hash: str, documents: list[dict]) -> int:
+        futures = [write_pool.submit(chroma.add_document, batch) for batch in iter_batches(documents, config.INGEST_BATCH_SIZE)]
+        for future in futures:
+            future.result()
+        chroma.delete_stale_documents(filename, {doc["id"] for doc in documents})
+        self.manifest.put(self.tenant, self.collection, filename, file_hash, self.chunker, self.embedding_model, len(documents))
+        return len(documents)
+
+    def prune(self, existing: set) -> int:
+        """Removes files that are no longer in storage from the collection and the manifest."""
+        removed = 0
+        for filename in self.manifest.filenames(self.tenant, self.collection):
+            if filename not in existing:
+                chroma.delete_documents_by_filename(filename)
+                self.manifest.remove(self.tenant, self.collection, filename)
+                removed += 1
+        return removed
+
+    def run(self, force: bool = False, prune: bool = False) -> dict:
+        filenames = sorted(f for f in self.storage.list_files() if f.lower().endswith(".pdf"))
+        stats = {"total": len(filenames), "indexed": 0, "skipped": 0, "empty": 0, "failed": 0, "chunks": 0, "pruned": 0}
+        logger.info(f"Reindexing {len(filenames)} PDFs with {self.workers} parse workers (chunker {self.chunker})...")
+        # Answers is_current's "still indexed" checks locally instead of a Chroma query per file
+        chroma.ensure_hash_index()
+        start_time = time.monotonic()
+        done = 0
+
+        def report(filename, status):
+            nonlocal done
+            done += 1
+            logger.info(f"[{done}/{len(filenames)}] {filename}: {status} ({time.monotonic() - start_time:.0f}s)")
+
+        def finish(write_pool, job, documents):
+            filename, file_hash = job[0], job[2]
+            if not documents:
+                stats["empty"] += 1
+                report(filename, "no text (and no OCR result), skipped")
+                return
+            chunks = self._write(write_pool, filename, file_hash, documents)
+            stats["indexed"] += 1
+            stats["chunks"] += chunks
+            report(filename, f"{chunks} chunks")
+
+        parse_pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        with ThreadPoolExecutor(max_workers=self.write_concurrency) as write_pool:
+            in_flight = {}
+
+            def collect(futures):
+                for future in futures:
+                    job = in_flight.pop(future)
+                    try:
+                        finish(write_pool, job, future.result())
+                    except Exception as e:
+                        stats["failed"] += 1
+                        report(job[0], f"failed: {e}")
+
+            try:
+                for filename in filenames:
+                    try:
+                        job = self._prepare(filename, force)
+                    except Exception as e:
+                        stats["failed"] += 1
+                        report(filename, f"failed: {e}")
+                        continue
+                    if job is None:
+                        stats["skipped"] += 1
+                        report(filename, "unchanged")
+                        continue
+
+                    if parse_pool is None:
+                        try:
+                            finish(write_pool, job, parse_file(*job))
+                        except Exception as e:
+                            stats["failed"] += 1
+                            report(filename, f"failed: {e}")
+                        continue
+
+                    in_flight[parse_pool.submit(parse_file, *job)] = job
+                    # Bound the files held in memory
+                    if len(in_flight) >= self.workers * 2:
+                        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(finished)
+
+                collect(list(in_flight))
+            finally:
+                if parse_pool is not None:
+                    parse_pool.shutdown(cancel_futures=True)
+
+        if prune:
+            stats["pruned"] = self.prune(set(filenames))
+
+        logger.info(f"Reindex complete in {time.monotonic() - start_time:.0f}s: {stats}")
+        return stats
@@ -4,10 +4,14 @@ from src.storage.factory import StorageFactory
 from src.config import config
 import asyncio
 import hashlib
+import os
 from src.db import chroma
-from src.ingest.parser import parse_pdf, create_documents_from_chunks
-from src.ocr.document_intelligence import DocumentIntelligenceWrapper
-from src.ingest.chunker import chunk_text
+from src.ingest.parser import iter_pdf_documents, iter_batches, create_documents_from_chunks, split_text
+from src.ocr.document_intelligence import DocumentIntelligenceWrapper, OCRError
+from src.ocr.partial import ocr_low_text_pages, format_ocr_pages
+from src.ocr.cache import cached_ocr_result, remember_ocr_result, ocr_page_texts
+from src.ingest import near_duplicates
+from src.ingest.job_queue import IngestJobStore, IngestQueue, QueueFullError, NO_LIMITS
 from io import BytesIO
 from datetime import datetime
 import logging
@@ -47,37 +51,191 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # converted to bytes in process_document or storage
         file_content = await file.download_as_bytearray()
-        
-        await status_msg.edit_text(f"מעבד... ⚙️")
 
-        # Process document (sync wrapper)
-        loop = asyncio.get_event_loop()
-        # Pass file_content to avoid needing local file
-        status, msg = await loop.run_in_executor(None, process_document, file_name, file_content)
-        
-        if status == "SUCCESS":
-             await status_msg.edit_text(f"Successfully processed and indexed: {file_name} ✅")
-        elif status == "DUPLICATE_SAME_NAME":
-             await status_msg.edit_text(f"File '{file_name}' already exists! 🔄")
-        elif status == "DUPLICATE_DIFF_NAME":
-             await status_msg.edit_text(f"File content already exists as '{msg}'! 🔄")
-        elif status == "NO_TEXT":
-             await status_msg.edit_text(f"Could not extract text from: {file_name} ⚠️")
-        else:
-             await status_msg.edit_text(f"Failed to process: {file_name} ❌")
-        
+        # Processing happens on the ingest queue's workers, which report back by editing status_msg
+        await asyncio.to_thread(
+            ingest_queue.submit, file_name, file_content, status_msg.chat_id, status_msg.message_id
+        )
+
+    except QueueFullError as e:
+        logger.warning(f"Refused {document.file_name}: {e}")
+        await status_msg.edit_text("Too many files are waiting to be processed. Please try again later. ⏳")
     except Exception as e:
         logger.error(f"Error handling file: {e}")
         await status_msg.edit_text("An error occurred while handling the file.")
 
-def process_document(file_name, file_content):
+def _result_message(file_name: str, status: str, msg: str) -> str:
+    if status == "SUCCESS":
+        return f"Successfully processed and indexed: {file_name} ✅"
+    if status == "SUCCESS_NEAR_DUPLICATE":
+        return f"Successfully processed and indexed: {file_name} ✅\nNote: it looks like a near-duplicate of '{msg}'."
+    if status == "REPLACED":
+        return f"Successfully processed and indexed: {file_name} ✅\nIt replaced the near-duplicate '{msg}'. 🔄"
+    if status == "NEAR_DUPLICATE":
+        return f"File looks like a near-duplicate of '{msg}' and was not added. 🔄"
+    if status == "DUPLICATE_SAME_NAME":
+        return f"File '{file_name}' already exists! 🔄"
+    if status == "DUPLICATE_DIFF_NAME":
+        return f"File content already exists as '{msg}'! 🔄"
+    if status == "NO_TEXT":
+        return f"Could not extract text from: {file_name} ⚠️"
+    return f"Failed to process: {file_name} ❌"
+
+def _job_status_text(job: dict, event: str, status: str, message: str) -> str:
+    if event == "queued":
+        ahead = int(message or 0)
+        return f"בתור לעיבוד ({ahead} קבצים לפניו)... ⏳" if ahead else "בתור לעיבוד... ⏳"
+    if event == "started":
+        return "מעבד... ⚙️"
+    if event == "retrying":
+        return f"Processing {job['file_name']} failed, retrying shortly... 🔁"
+    return _result_message(job["file_name"], status, message)
+
+def _telegram_notifier(bot, loop):
+    """Returns an IngestQueue notify callback that edits the job's status message from a worker thread."""
+    def notify(job, event, status, message):
+        if not job.get("chat_id") or not job.get("message_id"):
+            return
+        future = asyncio.run_coroutine_threadsafe(
+            bot.edit_message_text(
+                _job_status_text(job, event, status, message), chat_id=job["chat_id"], message_id=job["message_id"]
+            ),
+            loop
+        )
+
+        def log_failure(f):
+            if not f.cancelled() and f.exception():
+                logger.warning(f"Failed to update the status of {job['file_name']}: {f.exception()}")
+
+        future.add_done_callback(log_failure)
+    return notify
+
+def _process_job(file_name, file_content, limits):
+    return process_document(file_name, file_content, limits=limits)
+
+def _clear_failed_attempt(file_name, file_content):
+    """
+    Before a retry: if chunks of this very content are still indexed under file_name
+    (a failed attempt that could not clean up, or one interrupted by a restart), removes
+    them so the retry indexes the file instead of reporting it as a duplicate.
+    """
+    md5_hash = hashlib.md5(file_content).hexdigest()
+    if chroma.check_file_exists_by_hash(md5_hash) == file_name:
+        logger.info(f"Removing what a failed attempt left of {file_name} before retrying")
+        chroma.delete_documents_by_filename(file_name)
+
+ingest_queue = None
+
+async def start_ingest_queue(application):
+    """Starts the ingest workers (Application post_init hook); jobs left from a previous run resume."""
+    global ingest_queue
+    store = IngestJobStore(
+        os.path.join(config.CACHE_DIR, "ingest_jobs.sqlite"),
+        os.path.join(config.CACHE_DIR, "ingest_spool", config.TENANT_NAME, config.COLLECTION_NAME),
+        tenant=config.TENANT_NAME, collection=config.COLLECTION_NAME
+    )
+    ingest_queue = IngestQueue(
+        store, _process_job, notify=_telegram_notifier(application.bot, asyncio.get_running_loop()),
+        on_retry=_clear_failed_attempt
+    )
+    ingest_queue.start()
+
+async def stop_ingest_queue(application):
+    """Application post_shutdown hook: waits for running jobs, queued ones stay persisted."""
+    if ingest_queue is not None:
+        await asyncio.to_thread(ingest_queue.stop)
+
+def _save_ocr_results(file_name: str, file_hash: str, text: str, ocr_pages: str = ""):
+    """
+    Saves the OCR sidecar next to the PDF and flags the PDF, so reindexing can skip OCR,
+    and caches the result by content hash.
+    """
+    remember_ocr_result(file_hash, text, ocr_pages)
+    metadata = {'ocr': 'true'}
+    if ocr_pages:
+        metadata['ocr_pages'] = ocr_pages
+    try:
+        logger.info("OCR successful. Saving sidecar and updating metadata.")
+        storage.save_file(text.encode('utf-8'), f"{file_name}.txt", content_type='text/plain; charset=utf-8')
+        storage.update_metadata(file_name, metadata)
+    except Exception as e:
+         logger.error(f"Failed to save OCR results: {e}")
+
+def _check_near_duplicate(file_name: str, file_content, page_texts: dict, text: str = None, limits=NO_LIMITS):
+    """Returns (signature, filename of the indexed near-duplicate or None). Failures only disable the check."""
+    try:
+        if text:
+            signature = near_duplicates.document_signature([text])
+        else:
+            with limits.stage("parse"):
+                signature = near_duplicates.pdf_signature(file_content, page_texts)
+        if signature is None:
+            return None, None
+        match = near_duplicates.find_near_duplicate(
+            signature, exists=lambda filename, file_hash: chroma.check_file_exists_by_hash(file_hash) == filename
+        )
+        if match is None:
+            return signature, None
+        logger.info(f"{file_name} is a near-duplicate of {match[0]} (similarity {match[1]:.2f})")
+        return signature, match[0]
+    except Exception as e:
+        logger.error(f"Near-duplicate check failed for {file_name}: {e}")
+        return None, None
+
+def _remove_replaced_document(existing_filename: str, file_name: str):
+    """Removes a near-duplicate that file_name replaces from the index and from storage."""
+    chroma.delete_documents_by_filename(existing_filename)
+    near_duplicates.forget(existing_filename)
+    if existing_filename == file_name:
+        # Same name: storage already holds the new upload
+        return
+    for name in (existing_filename, f"{existing_filename}.txt"):
+        try:
+            storage.delete_file(name)
+        except Exception as e:
+            logger.error(f"Failed to delete replaced file {name}: {e}")
+
+def _discard_partial_index(file_name: str):
+    """Removes the chunks of a file whose indexing failed midway, so a retry starts clean."""
+    try:
+        chroma.delete_documents_by_filename(file_name)
+    except Exception as e:
+        logger.error(f"Failed to remove the partially indexed {file_name}: {e}")
+
+def _indexed_status(file_name: str, md5_hash: str, signature, near_duplicate: str, policy: str):
+    # Only a fully indexed file counts for duplicate checks
+    chroma.record_file_hash(md5_hash, file_name)
+    if near_duplicate and policy == "replace" and near_duplicate != file_name:
+        # Only now that the new copy is indexed, so a failed ingest leaves the older one searchable
+        _remove_replaced_document(near_duplicate, file_name)
+    if signature is not None:
+        try:
+            near_duplicates.record(file_name, md5_hash, signature)
+        except Exception as e:
+            logger.error(f"Failed to record the near-duplicate signature of {file_name}: {e}")
+    if near_duplicate and policy == "replace":
+        return "REPLACED", near_duplicate
+    if near_duplicate:
+        return "SUCCESS_NEAR_DUPLICATE", near_duplicate
+    return "SUCCESS", None
+
+def process_document(file_name, file_content, chunking_mode=None, near_duplicate_policy=None, limits=None):
     """
     Sync function to process the document:
     1. Calculate Hash
     2. Check Existence
-    3. Save to S3 (if new)
-    4. Parse & Index
+    3. OCR pages without a text layer
+    4. Check for near-duplicates
+    5. Save to storage (if new)
+    6. Parse & Index
+    chunking_mode overrides config.CHUNKING_MODE for both the text layer and OCR text.
+    near_duplicate_policy overrides config.NEAR_DUPLICATE_POLICY: "off", "report" (index and
+    tell the uploader), "refuse" (don't index) or "replace" (index and remove the older copy).
+    limits (the ingest queue's StageLimits) bounds the jobs parsing, OCRing, embedding and
+    upserting at once.
     """
+    policy = near_duplicate_policy or config.NEAR_DUPLICATE_POLICY
+    limits = limits or NO_LIMITS
     try:
         # 1. Calculate MD5 Hash
         md5_hash = hashlib.md5(file_content).hexdigest()
@@ -93,50 +251,122 @@ def process_document(file_name, file_content):
             else:
                 return "DUPLICATE_DIFF_NAME", existing_filename
 
-        # 3. Save file to storage (only if new)
+        # 3. OCR only the pages that have no text layer (e.g. scanned annexes),
+        # unless this content was OCR'd before
+        page_texts = {}
+        text = None
+        ocr_result = None
+        cached_ocr = cached_ocr_result(md5_hash)
+        if cached_ocr is not None:
+            logger.info(f"Reusing the cached OCR result for {file_name}")
+            ocr_result = (cached_ocr["text"], cached_ocr["ocr_pages"])
+            page_texts = ocr_page_texts(cached_ocr)
+            if page_texts is None:
+                text = cached_ocr["text"]
+                page_texts = {}
+        else:
+            try:
+                with limits.stage("ocr"):
+                    page_texts = ocr_low_text_pages(file_content, doc_intel_client)
+            except OCRError:
+                # Fail the job (the ingest queue retries it) rather than index and cache a partial result
+                raise
+            except Exception as e:
+                logger.error(f"Partial OCR failed for {file_name}: {e}")
+
+            if page_texts:
+                ocr_result = format_ocr_pages(page_texts)
+                remember_ocr_result(md5_hash, *ocr_result)
+
+        # 4. Check for near-duplicates (re-exported or re-scanned copies of an indexed document)
+        signature = None
+        near_duplicate = None
+        if policy != "off":
+            signature, near_duplicate = _check_near_duplicate(file_name, file_content, page_texts, text, limits)
+            if near_duplicate and policy == "refuse":
+                return "NEAR_DUPLICATE", near_duplicate
+
+        # 5. Save file to storage (only if new)
         storage.save_file(file_content, file_name, content_type='application/pdf')
-        
-        # 4. Parse PDF
+        if ocr_result:
+            _save_ocr_results(file_name, md5_hash, *ocr_result)
+        if near_duplicate == file_name and policy == "replace":
+            # Same name: the old chunks must go before the new ones are written
+            _remove_replaced_document(near_duplicate, file_name)
+
+        # 6. Parse PDF page by page (OCR text merged in page order), indexing in bounded batches
         # We pass the hash so it gets embedded in metadata
-        chunks = parse_pdf(file_name, file_content=file_content, file_hash=md5_hash)
+        # Only parser errors fall through to whole-file OCR; Chroma and embedding errors
+        # propagate, so the job fails with ERROR and the ingest queue retries it
+        indexed = 0
+        try:
+            documents = iter_pdf_documents(file_name, file_content=file_content, file_hash=md5_hash,
+                                           chunking_mode=chunking_mode, page_texts=page_texts)
+            batches = iter_batches(limits.iterate("parse", documents), config.INGEST_BATCH_SIZE)
+            while True:
+                try:
+                    batch = next(batches, None)
+                except Exception as e:
+                    if indexed:
+                        raise
+                    logger.error(f"Error parsing {file_name}: {e}")
+                    break
+                if batch is None:
+                    break
+                chroma.add_document(batch, limits=limits, index_hashes=False)
+                indexed += len(batch)
+        except Exception:
+            if indexed:
+                # Don't leave a partially indexed file behind
+                _discard_partial_index(file_name)
+            raise
+
+        if indexed:
+            logger.info(f"Indexed {indexed} chunks from {file_name}")
+            return _indexed_status(file_name, md5_hash, signature, near_duplicate, policy)
+
+        logger.info(f"Normal parsing failed/empty for {file_name}. Running OCR on the whole file with Document Intelligence...")
         
-        if not chunks:
-            logger.info(f"Normal parsing failed/empty for {file_name}. Checking OCR with Document Intelligence...")
-            text = None
-            
-            # 4.2 Run OCR if needed
-            if not text:
-                logger.info("Running Azure AI Document Intelligence (Layout Model)...")
+        # 7. Fall back to OCR of the whole file (e.g. PDFs PyMuPDF could not open)
+        if not text:
+            logger.info("Running Azure AI Document Intelligence (Layout Model)...")
+            with limits.stage("ocr"):
                 text = doc_intel_client.extract_text(BytesIO(file_content))
-                
-                if text:
-                    try: 
-                        logger.info("OCR successful. Saving sidecar and updating metadata.")
-                        storage.save_file(text.encode('utf-8'), f"{file_name}.txt", content_type='text/plain; charset=utf-8')
-                        storage.update_metadata(file_name, {'ocr': 'true'})
-                    except Exception as e:
-                         logger.error(f"Failed to save OCR results: {e}")
-
-            # 4.3 Process OCR text
+            
             if text:
-                text_chunks = chunk_text(text)
-                base_metadata = {
-                    "filename": file_name,
-                    "created_at": datetime.now().isoformat(),
-                    "page_count": 0,
-                    "file_hash": md5_hash,
-                    "ocr": "true"
-                }
-                
-                chunks = create_documents_from_chunks(text_chunks, base_metadata, file_name)
-            else:
-                 logger.warning(f"No text extracted from {file_name} (OCR failed or empty)")
-                 return "NO_TEXT", None
+                _save_ocr_results(file_name, md5_hash, text)
+
+        # 7.1 Process OCR text
+        if text:
+            text_chunks = split_text(text, chunking_mode)
+            base_metadata = {
+                "filename": file_name,
+                "created_at": datetime.now().isoformat(),
+                "page_count": 0,
+                "file_hash": md5_hash,
+                "ocr": "true"
+            }
             
-        # 5. Add to Chroma
-        chroma.add_document(chunks)
+            chunks = create_documents_from_chunks(text_chunks, base_metadata, file_name)
+        else:
+             logger.warning(f"No text extracted from {file_name} (OCR failed or empty)")
+             return "NO_TEXT", None
+        
+        # 7.2 Add OCR chunks to Chroma
+        indexed = 0
+        try:
+            for batch in iter_batches(chunks, config.INGEST_BATCH_SIZE):
+                chroma.add_document(batch, limits=limits, index_hashes=False)
+                indexed += len(batch)
+        except Exception:
+            if indexed:
+                _discard_partial_index(file_name)
+            raise
+
+        if signature is None and policy != "off":
+            signature = near_duplicates.document_signature([text])
         
-        return "SUCCESS", None
+        return _indexed_status(file_name, md5_hash, signature, near_duplicate, policy)
 
     except Exception as e:
         logger.error(f"Error processing document {file_name}: {e}")
@@ -2,10 +2,11 @@ import os
 import logging
 from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, ContextTypes
-from src.ingest_bot.handlers import start, handle_document
+from src.ingest_bot.handlers import start, handle_document, start_ingest_queue, stop_ingest_queue
 from dotenv import load_dotenv
 
 from src.config import config
+from src.db import chroma
 
 # Load env vars if not already loaded (though config usually does it)
 load_dotenv()
@@ -21,8 +22,17 @@ def main():
         logging.error("Error: TELEGRAM_INGESTION_BOT_TOKEN not found in environment variables.")
         return
 
+    # Warm up the shared ChromaDB connection off the request path
+    chroma.manager.check_health()
+    # Duplicate checks are answered from the local hash index
+    chroma.ensure_hash_index()
+
     # Increase timeouts for stability
-    application = ApplicationBuilder().token(token).read_timeout(60).write_timeout(60).connect_timeout(60).build()
+    # Uploads are processed by the persistent ingest queue, started with the application
+    application = (
+        ApplicationBuilder().token(token).read_timeout(60).write_timeout(60).connect_timeout(60)
+        .post_init(start_ingest_queue).post_shutdown(stop_ingest_queue).build()
+    )
     
     application.add_handler(CommandHandler("start", start))
     application.add_handler(MessageHandler(filters.Document.PDF, handle_document))
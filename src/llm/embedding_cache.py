@@ -0,0 +1,93 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from array import array
+
+logger = logging.getLogger(__name__)
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Disk-backed map of (embedding model, sha256(text)) -> vector, stored in SQLite.
+    Vectors are kept as packed float32 blobs. Safe to share between threads and,
+    thanks to WAL mode, between the bot processes that mount the same data dir.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: list[str]) -> dict:
+        """Returns {hash: vector} for the hashes that are cached."""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, model: str, items: dict) -> None:
+        """Stores {hash: vector}."""
+        if not items:
+            return
+        rows = [(model, h, array("f", vector).tobytes()) for h, vector in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def embed_with_cache(texts: list[str], embedding_function, model: str, cache: EmbeddingCache = None,
+                     batch_size: int = 100) -> list[list[float]]:
+    """
+    Returns one embedding per text, calling embedding_function only for texts
+    that are not in the cache. Identical texts in the same call are embedded once.
+    """
+    hashes = [text_hash(t) for t in texts]
+    vectors = cache.get_many(model, hashes) if cache is not None else {}
+
+    missing = {}
+    for h, t in zip(hashes, texts):
+        if h not in vectors:
+            missing.setdefault(h, t)
+
+    if missing:
+        missing_hashes = list(missing)
+        for start in range(0, len(missing_hashes), batch_size):
+            batch = missing_hashes[start:start + batch_size]
+            embedded = embedding_function([missing[h] for h in batch])
+            new_vectors = {h: [float(x) for x in v] for h, v in zip(batch, embedded)}
+            vectors.update(new_vectors)
+            if cache is not None:
+                cache.put_many(model, new_vectors)
+
+    logger.info(f"Embeddings: computed {len(missing)} of {len(texts)} (rest served from cache).")
+    return [vectors[h] for h in hashes]
@@ -1,4 +1,4 @@
-from openai import OpenAI, AzureOpenAI
+from openai import OpenAI, AzureOpenAI, AsyncAzureOpenAI
 from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
 from src.config import config
 import logging
@@ -22,6 +22,21 @@ class LLMFactory:
             azure_endpoint=config.AZURE_OPENAI_ENDPOINT
         )
 
+    @staticmethod
+    def get_async_llm_client():
+        """
+        Returns an initialized AsyncAzureOpenAI client for use on the event loop.
+        """
+        logger.info("Initializing Async Azure OpenAI Client")
+        if not all([config.AZURE_OPENAI_API_KEY, config.AZURE_OPENAI_ENDPOINT, config.AZURE_OPENAI_API_VERSION]):
+            raise ValueError("Azure OpenAI configuration missing (Key, Endpoint, or Version)")
+
+        return AsyncAzureOpenAI(
+            api_key=config.AZURE_OPENAI_API_KEY,
+            api_version=config.AZURE_OPENAI_API_VERSION,
+            azure_endpoint=config.AZURE_OPENAI_ENDPOINT
+        )
+
     @staticmethod
     def get_embedding_function():
         """
@@ -0,0 +1,66 @@
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a conservative character-based estimate
+    tiktoken = None
+
+DEFAULT_ENCODING = "o200k_base"
+# Hebrew averages well under 3 characters per token; 2 keeps the estimate on the safe side
+CHARS_PER_TOKEN_ESTIMATE = 2
+
+class TokenCounter:
+    """
+    Counts, truncates and locates tokens for a model or encoding name, using tiktoken when installed.
+    Azure deployment names are not model names, so unknown names use o200k_base (gpt-4o family).
+    """
+    def __init__(self, model: str = None):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = self._resolve_encoding(model)
+            except Exception as e:
+                # tiktoken downloads encodings on first use; offline that fails unless cached (TIKTOKEN_CACHE_DIR)
+                logger.warning(f"Failed to load the tokenizer for {model or DEFAULT_ENCODING}, estimating token counts: {e}")
+
+    @staticmethod
+    def _resolve_encoding(name: str):
+        if not name:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+        try:
+            return tiktoken.get_encoding(name)
+        except ValueError:
+            pass
+        try:
+            return tiktoken.encoding_for_model(name)
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return -(-len(text) // CHARS_PER_TOKEN_ESTIMATE)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text)
+            return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+        return text[:max_tokens * CHARS_PER_TOKEN_ESTIMATE]
+
+    def token_offsets(self, text: str) -> list[int]:
+        """Character offset in text where each token starts."""
+        if self.encoding is not None:
+            decoded, offsets = self.encoding.decode_with_offsets(self.encoding.encode(text))
+            if decoded == text:
+                return offsets
+            logger.warning("Tokenizer round-trip changed the text, using estimated token offsets.")
+        return list(range(0, len(text), CHARS_PER_TOKEN_ESTIMATE))
+
+@lru_cache(maxsize=8)
+def get_token_counter(model: str = None) -> TokenCounter:
+    return TokenCounter(model)
@@ -0,0 +1,108 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import Optional
+from src.config import config
+from src.ocr.partial import parse_ocr_pages
+
+logger = logging.getLogger(__name__)
+
+class OcrResultCache:
+    """
+    Persistent map of PDF content hash -> OCR result, so a file is never sent to
+    Document Intelligence twice (re-uploads, reindexes).
+    A result is {"text": ..., "ocr_pages": ...}: ocr_pages lists the pages the
+    form-feed separated text belongs to (partial OCR), or is "" for whole-file OCR text.
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_results ("
+            "file_hash TEXT PRIMARY KEY, ocr_pages TEXT NOT NULL, text TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, file_hash: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ocr_pages, text FROM ocr_results WHERE file_hash = ?", (file_hash,)
+            ).fetchone()
+        return {"ocr_pages": row[0], "text": row[1]} if row else None
+
+    def put(self, file_hash: str, text: str, ocr_pages: str = "") -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_results (file_hash, ocr_pages, text) VALUES (?, ?, ?)",
+                (file_hash, ocr_pages or "", text)
+            )
+            self._conn.commit()
+
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+def get_ocr_cache() -> Optional[OcrResultCache]:
+    global _ocr_cache
+    if not config.OCR_CACHE_ENABLED:
+        return None
+    with _ocr_cache_lock:
+        if _ocr_cache is None:
+            _ocr_cache = OcrResultCache(os.path.join(config.CACHE_DIR, "ocr_results.sqlite"))
+        return _ocr_cache
+
+def cached_ocr_result(file_hash: str) -> Optional[dict]:
+    """OCR result of this exact content from the local cache, or None."""
+    cache = get_ocr_cache()
+    if cache is None or not file_hash:
+        return None
+    try:
+        return cache.get(file_hash)
+    except Exception as e:
+        logger.error(f"Failed to read cached OCR result for {file_hash}: {e}")
+        return None
+
+def remember_ocr_result(file_hash: str, text: str, ocr_pages: str = "") -> None:
+    cache = get_ocr_cache()
+    if cache is None or not file_hash:
+        return
+    try:
+        cache.put(file_hash, text, ocr_pages)
+    except Exception as e:
+        logger.error(f"Failed to cache OCR result for {file_hash}: {e}")
+
+def load_ocr_result(storage, filename: str, file_hash: str = None) -> Optional[dict]:
+    """
+    Returns the OCR result of a previously OCR'd PDF without calling OCR again:
+    from the local cache by content hash, else from the sidecar ({filename}.txt) that
+    ingest saved next to a PDF whose storage metadata has ocr=true.
+    Returns None if the file was never OCR'd.
+    """
+    cached = cached_ocr_result(file_hash)
+    if cached is not None:
+        return cached
+
+    metadata = storage.get_metadata(filename)
+    if metadata.get('ocr') != 'true':
+        return None
+
+    stream = storage.get_file_stream(f"{filename}.txt")
+    if stream is None:
+        logger.warning(f"{filename} is marked as OCR'd but its sidecar is missing")
+        return None
+
+    try:
+        result = {"text": stream.read().decode('utf-8'), "ocr_pages": metadata.get('ocr_pages', "")}
+    finally:
+        stream.close()
+    if file_hash:
+        remember_ocr_result(file_hash, result["text"], result["ocr_pages"])
+    return result
+
+def ocr_page_texts(result: dict) -> Optional[dict]:
+    """{page_number: text} of a partial OCR result, None for whole-file OCR text."""
+    if not result["ocr_pages"]:
+        return None
+    return parse_ocr_pages(result["text"], result["ocr_pages"])
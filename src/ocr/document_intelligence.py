@@ -1,18 +1,50 @@
+import fitz  # PyMuPDF
 import logging
 import time
 from azure.core.credentials import AzureKeyCredential
 from azure.ai.formrecognizer import DocumentAnalysisClient
 from src.config import config
+from src.ocr.parallel import page_ranges, call_with_retries, map_in_parallel
 from io import BytesIO
 
 logger = logging.getLogger(__name__)
 
+class OCRError(Exception):
+    """Document Intelligence analysis failed (after retries), so its result would be incomplete."""
+
+def split_pdf(data: bytes, ranges: list[tuple[int, int]]) -> list[bytes]:
+    """Copies each (first, last) 1-based page range of a PDF into its own PDF."""
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        parts = []
+        for first, last in ranges:
+            part = fitz.open()
+            try:
+                part.insert_pdf(doc, from_page=first - 1, to_page=last - 1)
+                parts.append(part.tobytes())
+            finally:
+                part.close()
+        return parts
+    finally:
+        doc.close()
+
+def count_pdf_pages(data: bytes) -> int:
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
 class DocumentIntelligenceWrapper:
-    def __init__(self):
+    def __init__(self, client=None):
+        """client replaces the Azure DocumentAnalysisClient (e.g. a local stand-in in tests)."""
         self.endpoint = config.AZURE_DOC_INTEL_ENDPOINT
         self.key = config.AZURE_DOC_INTEL_KEY
-        self.client = None
+        self.client = client
         
+        if client is not None:
+            return
+
         if self.endpoint and self.key:
             try:
                 self.client = DocumentAnalysisClient(
@@ -34,21 +66,7 @@ class DocumentIntelligenceWrapper:
             return ""
 
         try:
-            logger.info("Starting layout analysis via Document Intelligence...")
-            
-            # Read flow requires seekable stream at 0
-            if hasattr(file_stream, 'seek'):
-                file_stream.seek(0)
-            
-            # Start the analysis
-            # We use "prebuilt-read" which is optimized for text extraction.
-            # "prebuilt-layout" is better for tables/structure but costlier.
-            # Given the requirement for generic text, 'prebuilt-read' is excellent.
-            # But the user mentioned "Layout" model is better for Hebrew. I will use "prebuilt-layout" per recommendation.
-            poller = self.client.begin_analyze_document("prebuilt-layout", document=file_stream)
-            
-            # Wait for result
-            result = poller.result()
+            result = self._analyze(file_stream)
             
             text_lines = []
             
@@ -70,3 +88,89 @@ class DocumentIntelligenceWrapper:
         except Exception as e:
             logger.error(f"Document Intelligence analysis failed: {e}")
             return ""
+
+    def extract_pages(self, file_stream) -> list[str]:
+        """
+        Like extract_text, but returns the text of each page of the document, in page order.
+        PDFs longer than OCR_PAGE_RANGE_SIZE pages are split into page ranges that are
+        analyzed concurrently (up to OCR_CONCURRENCY at a time, each retried with backoff
+        when throttled).
+        Returns an empty list if the client is not configured; raises OCRError if any page
+        could not be analyzed, rather than returning a partial result.
+        """
+        if not self.client:
+            logger.error("Document Intelligence client not initialized")
+            return []
+
+        try:
+            if hasattr(file_stream, 'seek'):
+                file_stream.seek(0)
+            data = file_stream.read()
+
+            range_size = config.OCR_PAGE_RANGE_SIZE
+            page_count = count_pdf_pages(data) if range_size > 0 and config.OCR_CONCURRENCY > 1 else 0
+            if page_count > range_size:
+                return self._extract_page_ranges(data, page_ranges(page_count, range_size))
+
+            pages = self._analyze_pages(data)
+            logger.info(f"Analysis completed. Extracted {len(pages)} pages.")
+            return pages
+
+        except OCRError:
+            raise
+        except Exception as e:
+            logger.error(f"Document Intelligence analysis failed: {e}")
+            raise OCRError(f"Document Intelligence analysis failed: {e}") from e
+
+    def _extract_page_ranges(self, data: bytes, ranges: list[tuple[int, int]]) -> list[str]:
+        logger.info(f"Analyzing {ranges[-1][1]} pages as {len(ranges)} ranges, {config.OCR_CONCURRENCY} at a time...")
+        start_time = time.monotonic()
+        parts = split_pdf(data, ranges)
+
+        def analyze_range(index):
+            first, last = ranges[index]
+            try:
+                pages = self._analyze_pages(parts[index])
+            except Exception as e:
+                logger.error(f"Document Intelligence analysis of pages {first}-{last} failed: {e}")
+                raise OCRError(f"Analysis of pages {first}-{last} failed: {e}") from e
+            if len(pages) != last - first + 1:
+                raise OCRError(f"Pages {first}-{last}: expected {last - first + 1} pages, got {len(pages)}")
+            return pages
+
+        results = map_in_parallel(analyze_range, list(range(len(ranges))), config.OCR_CONCURRENCY)
+        logger.info(f"Analysis completed in {time.monotonic() - start_time:.1f}s.")
+        return [text for pages in results for text in pages]
+
+    def _analyze_pages(self, data: bytes) -> list[str]:
+        result = call_with_retries(
+            lambda: self._analyze(BytesIO(data)),
+            max_retries=config.OCR_MAX_RETRIES,
+            base_delay=config.OCR_RETRY_BASE_DELAY
+        )
+        pages = sorted(result.pages, key=lambda page: page.page_number)
+        return [self._page_text(result, page) for page in pages]
+
+    def _analyze(self, file_stream):
+        logger.info("Starting layout analysis via Document Intelligence...")
+
+        # Read flow requires seekable stream at 0
+        if hasattr(file_stream, 'seek'):
+            file_stream.seek(0)
+
+        # Start the analysis
+        # We use "prebuilt-read" which is optimized for text extraction.
+        # "prebuilt-layout" is better for tables/structure but costlier.
+        # Given the requirement for generic text, 'prebuilt-read' is excellent.
+        # But the user mentioned "Layout" model is better for Hebrew. I will use "prebuilt-layout" per recommendation.
+        poller = self.client.begin_analyze_document("prebuilt-layout", document=file_stream)
+
+        # Wait for result
+        return poller.result()
+
+    @staticmethod
+    def _page_text(result, page) -> str:
+        # Page spans point into result.content, which preserves reading order
+        if result.content and page.spans:
+            return "".join(result.content[span.offset:span.offset + span.length] for span in page.spans)
+        return "\n".join(line.content for line in page.lines)
@@ -0,0 +1,63 @@
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from azure.core.exceptions import ServiceRequestError, ServiceResponseError
+except ImportError:
+    ServiceRequestError = ServiceResponseError = None
+
+logger = logging.getLogger(__name__)
+
+# Throttling (429) and transient service errors worth retrying
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Connection failures, including the Azure SDK's (request not sent / response not received)
+TRANSIENT_ERRORS = tuple(
+    error for error in (ConnectionError, TimeoutError, ServiceRequestError, ServiceResponseError)
+    if isinstance(error, type)
+)
+
+def page_ranges(page_count: int, range_size: int) -> list[tuple[int, int]]:
+    """Splits pages 1..page_count into consecutive (first, last) ranges of up to range_size pages."""
+    return [(first, min(first + range_size - 1, page_count)) for first in range(1, page_count + 1, range_size)]
+
+def is_retryable(error: Exception) -> bool:
+    if getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES:
+        return True
+    return isinstance(error, TRANSIENT_ERRORS)
+
+def _retry_after(error: Exception):
+    """Seconds from the Retry-After header of a throttled response, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+def call_with_retries(operation, max_retries: int, base_delay: float, sleep=time.sleep):
+    """
+    Calls operation(), retrying throttled/transient failures with exponential backoff
+    and jitter (or the server's Retry-After). Other errors are raised immediately.
+    """
+    attempt = 0
+    while True:
+        try:
+            return operation()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = base_delay * (2 ** attempt) * (0.5 + random.random() / 2)
+            attempt += 1
+            logger.warning(f"Retrying after {delay:.1f}s (attempt {attempt}/{max_retries}): {e}")
+            sleep(delay)
+
+def map_in_parallel(function, items: list, concurrency: int) -> list:
+    """Applies function to items with at most `concurrency` calls in flight; results keep the order of items."""
+    if concurrency <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(items)), thread_name_prefix="ocr") as executor:
+        return list(executor.map(function, items))
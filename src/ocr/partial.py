@@ -0,0 +1,82 @@
+import fitz  # PyMuPDF
+import logging
+from io import BytesIO
+from src.config import config
+from src.ocr.document_intelligence import OCRError
+
+logger = logging.getLogger(__name__)
+
+# Page texts in an OCR sidecar are separated with a form feed, like pdftotext does
+PAGE_SEPARATOR = "\f"
+
+def find_low_text_pages(doc, min_chars: int) -> list[int]:
+    """1-based numbers of the pages whose text layer has fewer than min_chars non-space characters."""
+    low_text_pages = []
+    for page_number, page in enumerate(doc, start=1):
+        if len("".join(page.get_text().split())) < min_chars:
+            low_text_pages.append(page_number)
+    return low_text_pages
+
+def build_sub_pdf(doc, page_numbers: list[int]) -> bytes:
+    """Copies the given 1-based pages of doc into a new PDF, in order."""
+    sub_doc = fitz.open()
+    try:
+        for page_number in page_numbers:
+            sub_doc.insert_pdf(doc, from_page=page_number - 1, to_page=page_number - 1)
+        return sub_doc.tobytes()
+    finally:
+        sub_doc.close()
+
+def ocr_low_text_pages(file_content: bytes, ocr_client, min_chars: int = None) -> dict[int, str]:
+    """
+    Runs OCR only on the pages of a PDF that have no (or very little) extractable text,
+    e.g. scanned annexes of a typed protocol.
+    Returns {page_number: ocr_text} for those pages; pages OCR returned no text for are left out.
+    Raises OCRError if the OCR result does not cover exactly those pages.
+    """
+    if min_chars is None:
+        min_chars = config.OCR_MIN_PAGE_CHARS
+    if min_chars <= 0:
+        return {}
+
+    doc = fitz.open(stream=file_content, filetype="pdf")
+    try:
+        page_numbers = find_low_text_pages(doc, min_chars)
+        if not page_numbers:
+            return {}
+
+        logger.info(f"Running OCR on {len(page_numbers)}/{len(doc)} pages without a text layer: {page_numbers}")
+        if len(page_numbers) == len(doc):
+            sub_pdf = file_content
+        else:
+            sub_pdf = build_sub_pdf(doc, page_numbers)
+    finally:
+        doc.close()
+
+    page_texts = ocr_client.extract_pages(BytesIO(sub_pdf))
+    if not page_texts:
+        # OCR is not configured
+        return {}
+    if len(page_texts) != len(page_numbers):
+        # Pages can't be matched to their numbers; fail like any incomplete OCR result
+        raise OCRError(f"OCR returned {len(page_texts)} pages, expected {len(page_numbers)}")
+
+    return {
+        page_number: text
+        for page_number, text in zip(page_numbers, page_texts)
+        if text and text.strip()
+    }
+
+def format_ocr_pages(page_texts: dict[int, str]) -> tuple[str, str]:
+    """Sidecar text and 'ocr_pages' metadata value for the OCR'd pages."""
+    page_numbers = sorted(page_texts)
+    text = PAGE_SEPARATOR.join(page_texts[page_number].replace(PAGE_SEPARATOR, "\n") for page_number in page_numbers)
+    return text, ",".join(str(page_number) for page_number in page_numbers)
+
+def parse_ocr_pages(text: str, ocr_pages: str) -> dict[int, str]:
+    """Inverse of format_ocr_pages."""
+    page_numbers = [int(page_number) for page_number in ocr_pages.split(",") if page_number]
+    texts = text.split(PAGE_SEPARATOR)
+    if len(texts) != len(page_numbers):
+        raise ValueError(f"OCR sidecar has {len(texts)} pages, metadata lists {len(page_numbers)}")
+    return dict(zip(page_numbers, texts))
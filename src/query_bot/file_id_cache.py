@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+class TelegramFileIdCache:
+    """
+    Persistent map of (bot id, filename, content hash) -> Telegram file_id.
+    Telegram file_ids are only valid for the bot that uploaded the file, hence the bot id
+    in the key; the content hash makes a re-uploaded file with the same name miss.
+    Files without a known content hash are never cached, as they could not tell versions apart.
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_ids ("
+            "bot_id INTEGER NOT NULL, filename TEXT NOT NULL, content_hash TEXT NOT NULL, file_id TEXT NOT NULL, "
+            "PRIMARY KEY (bot_id, filename, content_hash))"
+        )
+        self._conn.commit()
+
+    def get(self, bot_id: int, filename: str, content_hash: str = None) -> Optional[str]:
+        if not content_hash:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_id FROM file_ids WHERE bot_id = ? AND filename = ? AND content_hash = ?",
+                (bot_id, filename, content_hash)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, bot_id: int, filename: str, content_hash: str, file_id: str) -> None:
+        if not content_hash:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_ids (bot_id, filename, content_hash, file_id) VALUES (?, ?, ?, ?)",
+                (bot_id, filename, content_hash, file_id)
+            )
+            self._conn.commit()
+
+    def invalidate(self, bot_id: int, filename: str, content_hash: str = None) -> None:
+        if not content_hash:
+            return
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM file_ids WHERE bot_id = ? AND filename = ? AND content_hash = ?",
+                (bot_id, filename, content_hash)
+            )
+            self._conn.commit()
@@ -1,10 +1,17 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from src.rag.search import search_similar_docs
-from src.rag.generator import generate_answer
+from src.rag.search import search_similar_docs, get_query_embedding
+from src.rag.generator import generate_answer_async, stream_answer, ERROR_ANSWER
+from src.rag.query_cache import AnswerCache
+from src.db.chroma import get_collection_version
+from src.query_bot.file_id_cache import TelegramFileIdCache
 from opik import track
 from src.config import config
+import asyncio
 import logging
+import os
+import time
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
@@ -17,23 +24,106 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 from src.storage.factory import StorageFactory
 from src.auth import auth_required, AuthRole
 
-# Initialize storage (dynamic based on config)
-storage = StorageFactory.get_storage_provider()
+# Initialize storage (dynamic based on config); source files are fetched without blocking the event loop
+storage = StorageFactory.get_async_storage_provider()
 
+async def close_storage(application):
+    """Application post_shutdown hook: closes the pooled storage connections."""
+    await storage.close()
 
+file_id_cache = TelegramFileIdCache(os.path.join(config.CACHE_DIR, "telegram_file_ids.sqlite"))
+
+answer_cache = AnswerCache(
+    threshold=config.ANSWER_CACHE_THRESHOLD,
+    max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+    ttl=config.ANSWER_CACHE_TTL
+)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+class StreamingMessageEditor:
+    """
+    Progressively edits a Telegram message with a partial answer.
+    Edits are throttled to one per `interval` seconds to stay within Telegram's edit limits.
+    """
+    def __init__(self, message, interval: float):
+        self.message = message
+        self.interval = interval
+        self._last_edit = 0.0
+        self._last_text = None
+
+    async def update(self, text: str):
+        now = time.monotonic()
+        if now - self._last_edit < self.interval:
+            return
+        text = text.strip()
+        if not text or text == self._last_text:
+            return
+        self._last_edit = now
+        self._last_text = text
+        try:
+            await self.message.edit_text(text[:TELEGRAM_MESSAGE_LIMIT - 2] + " …", disable_web_page_preview=True)
+        except Exception as e:
+            logger.debug(f"Skipping streaming edit: {e}")
+
+# Bounded concurrency per pipeline stage, so a burst of chats queues up instead of
+# flooding Chroma, Azure OpenAI or blob storage
+stage_limits = {
+    "retrieval": asyncio.Semaphore(config.QUERY_RETRIEVAL_CONCURRENCY),
+    "generation": asyncio.Semaphore(config.QUERY_GENERATION_CONCURRENCY),
+    "download": asyncio.Semaphore(config.QUERY_DOWNLOAD_CONCURRENCY),
+}
+
+def retrieved_chunk_ids(chunks: list) -> list:
+    ids = []
+    for chunk in chunks:
+        ids.extend(chunk.get('hit_ids') or [chunk['id']])
+    return ids
+
+def _answer_cache_key(query_text: str, chunks: list) -> Optional[tuple]:
+    """None if the collection version is unknown, as changes could then go unnoticed."""
+    version = get_collection_version()
+    if version is None:
+        return None
+    return (get_query_embedding(query_text), retrieved_chunk_ids(chunks), version)
 
 @track(tags=[f"tenant:{config.TENANT_NAME}"])
-async def process_query_logic(query_text: str) -> dict:
+async def process_query_logic(query_text: str, on_partial=None) -> dict:
     """
     Core logic for handling a query. Returns a dict containing 'answer' and 'sources' list.
+    If on_partial is given (and STREAM_ANSWERS is on), it is awaited with the answer text
+    generated so far while the LLM streams.
     """
-    # 1. Retrieve relevant chunks
-    chunks = search_similar_docs(query_text, n_results=20)
-    
-    logger.debug(f"DEBUG: Retrieved {len(chunks)} chunks.")
+    # 1. Retrieve relevant chunks (Chroma and embedding calls are blocking, keep them off the event loop)
+    async with stage_limits["retrieval"]:
+        chunks = await asyncio.to_thread(search_similar_docs, query_text, 20)
+
+        logger.debug(f"DEBUG: Retrieved {len(chunks)} chunks.")
+
+        # 2. Reuse a previous answer for a similar question over the same chunks
+        cache_key = None
+        if config.ANSWER_CACHE_ENABLED and chunks:
+            try:
+                cache_key = await asyncio.to_thread(_answer_cache_key, query_text, chunks)
+                cached = answer_cache.get(*cache_key) if cache_key is not None else None
+                if cached is not None:
+                    logger.info(f"Answer cache hit for query: '{query_text}'")
+                    return cached
+            except Exception as e:
+                logger.error(f"Answer cache lookup failed: {e}")
+                cache_key = None
     
-    # 2. Generate answer
-    response_data = generate_answer(query_text, chunks)
+    # 3. Generate answer
+    async with stage_limits["generation"]:
+        if on_partial is not None and config.STREAM_ANSWERS:
+            response_data = None
+            async for kind, payload in stream_answer(query_text, chunks):
+                if kind == "partial":
+                    await on_partial(payload)
+                else:
+                    response_data = payload
+        else:
+            response_data = await generate_answer_async(query_text, chunks)
     
     logger.debug(f"response_data type: {type(response_data)}")
     logger.debug(f"response_data content: {response_data}")
@@ -45,9 +135,75 @@ async def process_query_logic(query_text: str) -> dict:
             response_data = json.loads(response_data)
         except:
              return {"answer": response_data, "sources": []}
+
+    if isinstance(response_data, dict):
+        # Content hashes let handle_query reuse Telegram file_ids for the sources
+        response_data["file_hashes"] = {
+            chunk['metadata'].get('filename'): chunk['metadata'].get('file_hash')
+            for chunk in chunks if chunk['metadata'].get('file_hash')
+        }
+
+    if cache_key is not None and isinstance(response_data, dict) and response_data.get("answer") != ERROR_ANSWER:
+        answer_cache.put(*cache_key, response_data)
             
     return response_data
 
+async def _send_by_file_id(update: Update, bot_id: int, filename: str, content_hash: str = None) -> bool:
+    """Re-sends a file by the Telegram file_id of a previous upload. Returns False if there is none (or it was rejected)."""
+    file_id = file_id_cache.get(bot_id, filename, content_hash)
+    if not file_id:
+        return False
+    try:
+        await update.message.reply_document(document=file_id, filename=filename)
+        return True
+    except Exception as e:
+        logger.warning(f"Cached file_id for {filename} was rejected, re-uploading: {e}")
+        file_id_cache.invalidate(bot_id, filename, content_hash)
+        return False
+
+async def _upload_source_file(update: Update, bot_id: int, filename: str, content_hash: str, file_stream):
+    try:
+        if not file_stream:
+            await update.message.reply_text(f"⚠️ לא ניתן היה לאתר את הקובץ: {filename}")
+            return
+        try:
+            message = await update.message.reply_document(document=file_stream, filename=filename)
+        finally:
+            # May be spooled to a temporary file on disk
+            file_stream.close()
+        if message and message.document:
+            file_id_cache.put(bot_id, filename, content_hash, message.document.file_id)
+    except Exception as e:
+         logger.error(f"Failed to send file {filename}: {e}")
+         await update.message.reply_text(f"⚠️ שגיאה בשליחת הקובץ: {filename}")
+
+async def send_source_files(update: Update, context: ContextTypes.DEFAULT_TYPE, filenames: list, file_hashes: dict):
+    """
+    Sends source documents, re-using the Telegram file_id from a previous upload when
+    possible so the file is neither downloaded from storage nor uploaded again.
+    The remaining files are fetched from storage concurrently, so delivery takes about
+    as long as the slowest file.
+    """
+    bot_id = context.bot.id
+    reused = await asyncio.gather(*[
+        _send_by_file_id(update, bot_id, filename, file_hashes.get(filename)) for filename in filenames
+    ])
+    missing = [filename for filename, sent in zip(filenames, reused) if not sent]
+    if not missing:
+        return
+
+    try:
+        async with stage_limits["download"]:
+            file_streams = await storage.get_file_streams(missing)
+    except Exception as e:
+        logger.error(f"Failed to fetch source files {missing}: {e}")
+        file_streams = {}
+
+    await asyncio.gather(*[
+        _upload_source_file(update, bot_id, filename, file_hashes.get(filename), file_streams.get(filename))
+        for filename in missing
+    ])
+
 @auth_required(AuthRole.QUERY)
 async def handle_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query_text = update.message.text
@@ -59,8 +215,9 @@ async def handle_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
     status_msg = await update.message.reply_text("מחפש מידע... 🔍")
     
     try:
-        # Run the tracked logic
-        result = await process_query_logic(query_text)
+        # Run the tracked logic, showing the answer as it is generated
+        editor = StreamingMessageEditor(status_msg, config.STREAM_EDIT_INTERVAL)
+        result = await process_query_logic(query_text, on_partial=editor.update)
         answer_text = result.get("answer", "No answer.")
         sources = result.get("sources", [])
         
@@ -79,16 +236,7 @@ async def handle_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # 4. Send Files
         if sources:
             await update.message.reply_text("📂 **קבצים מצורפים:**", parse_mode='Markdown')
-            for filename in sources:
-                try:
-                    file_stream = storage.get_file_stream(filename)
-                    if file_stream:
-                        await update.message.reply_document(document=file_stream, filename=filename)
-                    else:
-                        await update.message.reply_text(f"⚠️ לא ניתן היה לאתר את הקובץ: {filename}")
-                except Exception as e:
-                     logger.error(f"Failed to send file {filename}: {e}")
-                     await update.message.reply_text(f"⚠️ שגיאה בשליחת הקובץ: {filename}")
+            await send_source_files(update, context, sources, result.get("file_hashes", {}))
         
     except Exception as e:
         logger.error(f"Error handling query: {e}")
@@ -3,10 +3,11 @@ import logging
 import opik
 from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, ContextTypes
-from src.query_bot.handlers import start, handle_query
+from src.query_bot.handlers import start, handle_query, close_storage
 from dotenv import load_dotenv
 
 from src.config import config
+from src.db import chroma
 
 # Load env vars
 load_dotenv()
@@ -30,8 +31,13 @@ def main():
     except Exception as e:
         logger.warning(f"Failed to configure Opik: {e}")
 
+    # Warm up the shared ChromaDB connection off the request path
+    chroma.manager.check_health()
+
     # Increase timeouts for stability
-    application = ApplicationBuilder().token(token).read_timeout(60).write_timeout(60).connect_timeout(60).build()
+    # Handle updates concurrently so one slow answer doesn't hold up other chats
+    application = ApplicationBuilder().token(token).read_timeout(60).write_timeout(60).connect_timeout(60) \
+        .concurrent_updates(config.QUERY_CONCURRENT_UPDATES).post_shutdown(close_storage).build()
     
     application.add_handler(CommandHandler("start", start))
     
@@ -0,0 +1,57 @@
+import logging
+from src.llm.tokens import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+MIN_TRUNCATED_TOKENS = 100
+MIN_DEDUP_LINE_LENGTH = 20
+
+def join_with_overlap(first: str, second: str, max_overlap: int = 500, min_overlap: int = 10) -> str:
+    """
+    Joins consecutive chunks, dropping the text the chunker repeated at the start of
+    `second` (the overlap window) when it matches the end of `first`.
+    """
+    limit = min(len(first), len(second), max_overlap)
+    for size in range(limit, min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return first + "\n" + second
+
+def dedupe_lines(text: str, seen: set) -> str:
+    """Removes lines already emitted in earlier chunks. Short lines (dates, headings) are kept."""
+    kept = []
+    for line in text.split("\n"):
+        key = line.strip()
+        if len(key) >= MIN_DEDUP_LINE_LENGTH:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(line)
+    return "\n".join(kept).strip()
+
+def pack_context(context_chunks: list, token_budget: int, counter: TokenCounter, format_block) -> list:
+    """
+    Packs chunks (already in relevance order) into the token budget.
+    Text repeated across chunks is dropped; the first chunk that does not fit is truncated
+    if a meaningful amount of budget is left, and everything after it is dropped.
+    Returns (chunk, text) pairs to include.
+    """
+    packed = []
+    seen = set()
+    used = 0
+    for chunk in context_chunks:
+        text = dedupe_lines(chunk['text'], seen)
+        if not text:
+            continue
+        block_tokens = counter.count(format_block(chunk, text))
+        if used + block_tokens <= token_budget:
+            packed.append((chunk, text))
+            used += block_tokens
+            continue
+
+        remaining = token_budget - used - counter.count(format_block(chunk, ""))
+        if remaining >= MIN_TRUNCATED_TOKENS:
+            packed.append((chunk, counter.truncate(text, remaining)))
+        logger.info(f"Context budget reached: kept {len(packed)} of {len(context_chunks)} chunks (~{used} tokens before tail).")
+        break
+    return packed
@@ -3,11 +3,15 @@ from openai import OpenAI
 from src.config import config
 from opik import track
 from src.llm.factory import LLMFactory
+from src.rag.json_stream import AnswerStreamParser
+from src.rag.context_builder import pack_context
+from src.llm.tokens import get_token_counter
 
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI/Azure client lazily
+# Initialize OpenAI/Azure clients lazily
 _client = None
+_async_client = None
 
 def get_client():
     global _client
@@ -15,8 +19,17 @@ def get_client():
         _client = LLMFactory.get_llm_client()
     return _client
 
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = LLMFactory.get_async_llm_client()
+    return _async_client
+
 import json
 
+NO_CONTEXT_ANSWER = "לא מצאתי מידע רלוונטי במאגר הידע שלי כדי לענות על שאלתך."
+ERROR_ANSWER = "מצטער, אירעה שגיאה בעת ניסיון ליצור את התשובה."
+
 SYSTEM_PROMPT = """
 אתה מזכיר מושב מקצועי, אדיב ויעיל. המטרה שלך היא לענות לשאלות של חברי המושב בהתבסס על המידע המסופק בפרוטוקולים ובמסמכים המצורפים.
 
@@ -46,7 +59,7 @@ def generate_answer(query: str, context_chunks: list) -> dict:
     """
     if not context_chunks:
         return {
-            "answer": "לא מצאתי מידע רלוונטי במאגר הידע שלי כדי לענות על שאלתך.",
+            "answer": NO_CONTEXT_ANSWER,
             "sources": []
         }
 
@@ -64,23 +77,90 @@ def generate_answer(query: str, context_chunks: list) -> dict:
     except Exception as e:
         logger.error(f"Error generating answer with OpenAI: {e}")
         return {
-            "answer": "מצטער, אירעה שגיאה בעת ניסיון ליצור את התשובה.",
+            "answer": ERROR_ANSWER,
             "sources": []
         }
 
 @track(tags=[f"tenant:{config.TENANT_NAME}"])
-def construct_system_prompt(context_chunks: list) -> str:
+async def generate_answer_async(query: str, context_chunks: list) -> dict:
+    """
+    Async variant of generate_answer using the async OpenAI client, so the event loop
+    keeps serving other chats while the completion is generated.
+    """
+    if not context_chunks:
+        return {
+            "answer": NO_CONTEXT_ANSWER,
+            "sources": []
+        }
+
+    formatted_system_prompt = construct_system_prompt(context_chunks)
+
+    logger.info(f"Generating answer for query: '{query}' with {len(context_chunks)} chunks.")
+
+    try:
+        response = await call_llm_async(formatted_system_prompt, query)
+
+        content = response.choices[0].message.content.strip()
+        return json.loads(content)
+
+    except Exception as e:
+        logger.error(f"Error generating answer with OpenAI: {e}")
+        return {
+            "answer": ERROR_ANSWER,
+            "sources": []
+        }
+
+@track(tags=[f"tenant:{config.TENANT_NAME}"], generations_aggregator=lambda events: events[-1][1] if events else None)
+async def stream_answer(query: str, context_chunks: list):
+    """
+    Streaming variant of generate_answer (async generator).
+    Yields ("partial", answer_so_far) as tokens arrive and finally ("done", result_dict).
+    """
+    if not context_chunks:
+        yield "done", {"answer": NO_CONTEXT_ANSWER, "sources": []}
+        return
+
+    formatted_system_prompt = construct_system_prompt(context_chunks)
+
+    logger.info(f"Streaming answer for query: '{query}' with {len(context_chunks)} chunks.")
+
+    parser = AnswerStreamParser()
+    try:
+        async for delta in call_llm_stream(formatted_system_prompt, query):
+            previous = parser.answer
+            answer_so_far = parser.feed(delta)
+            if answer_so_far != previous:
+                yield "partial", answer_so_far
+    except Exception as e:
+        logger.error(f"Error streaming answer with OpenAI: {e}")
+        yield "done", {"answer": ERROR_ANSWER, "sources": []}
+        return
+
+    yield "done", parser.result()
+
+def _format_context_block(chunk: dict, text: str) -> str:
+    source = chunk['metadata'].get('filename', 'Unknown Source')
+    return f"---\nמקור: {source}\nתוכן: {text}\n"
+
+@track(tags=[f"tenant:{config.TENANT_NAME}"])
+def construct_system_prompt(context_chunks: list, token_budget: int = None) -> str:
     """
     Constructs the system prompt with context and a list of valid filenames.
+    Chunks are taken in relevance order, de-duplicated and packed into token_budget
+    (config.CONTEXT_TOKEN_BUDGET by default); the tail is truncated or dropped.
     """
-    context_text = ""
-    filenames = set()
+    if token_budget is None:
+        token_budget = config.CONTEXT_TOKEN_BUDGET
+
+    counter = get_token_counter(config.AZURE_DEPLOYMENT_NAME)
+    packed = pack_context(context_chunks, token_budget, counter, _format_context_block)
 
-    for chunk in context_chunks:
-        source = chunk['metadata'].get('filename', 'Unknown Source')
-        filenames.add(source)
-        text = chunk['text']
-        context_text += f"---\nמקור: {source}\nתוכן: {text}\n"
+    context_parts = []
+    filenames = set()
+    for chunk, text in packed:
+        filenames.add(chunk['metadata'].get('filename', 'Unknown Source'))
+        context_parts.append(_format_context_block(chunk, text))
+    context_text = "".join(context_parts)
 
     # Create a clean list of filenames for the prompt
     file_list_str = "\n".join([f"- {f}" for f in sorted(list(filenames))])
@@ -89,10 +169,8 @@ def construct_system_prompt(context_chunks: list) -> str:
     return SYSTEM_PROMPT.format(file_list=file_list_str, context=context_text)
 
 
-@track(tags=[f"tenant:{config.TENANT_NAME}"])
-def call_llm(system_prompt: str, query: str) -> dict:
-    client = get_client()
-    return client.chat.completions.create(
+def _completion_args(system_prompt: str, query: str) -> dict:
+    return dict(
         model=config.AZURE_DEPLOYMENT_NAME if config.LLM_PROVIDER == "azure" else "gpt-4o-mini",
         messages=[
             {"role": "system", "content": system_prompt},
@@ -102,3 +180,21 @@ def call_llm(system_prompt: str, query: str) -> dict:
         max_tokens=2000,
         response_format={"type": "json_object"}
     )
+
+@track(tags=[f"tenant:{config.TENANT_NAME}"])
+def call_llm(system_prompt: str, query: str) -> dict:
+    client = get_client()
+    return client.chat.completions.create(**_completion_args(system_prompt, query))
+
+@track(tags=[f"tenant:{config.TENANT_NAME}"])
+async def call_llm_async(system_prompt: str, query: str):
+    client = get_async_client()
+    return await client.chat.completions.create(**_completion_args(system_prompt, query))
+
+@track(tags=[f"tenant:{config.TENANT_NAME}"], generations_aggregator="".join)
+async def call_llm_stream(system_prompt: str, query: str):
+    """Yields the completion text as it streams (traced once complete, as the joined text)."""
+    client = get_async_client()
+    async for event in await client.chat.completions.create(stream=True, **_completion_args(system_prompt, query)):
+        if event.choices and event.choices[0].delta.content:
+            yield event.choices[0].delta.content
@@ -0,0 +1,71 @@
+import json
+import re
+
+_ANSWER_KEY_RE = re.compile(r'"answer"\s*:\s*"')
+_HEX = set("0123456789abcdefABCDEF")
+
+class AnswerStreamParser:
+    """
+    Incrementally extracts the "answer" string from a streamed JSON completion
+    like {"answer": "...", "sources": [...]}. Escapes split across deltas are held
+    back until complete, so every returned prefix is valid text.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.answer = ""
+        self.complete = False
+        self._start = None
+        self._pos = None
+
+    def feed(self, delta: str) -> str:
+        """Consumes a chunk of the completion and returns the answer decoded so far."""
+        if not delta:
+            return self.answer
+        self.buffer += delta
+        if self._start is None:
+            match = _ANSWER_KEY_RE.search(self.buffer)
+            if not match:
+                return self.answer
+            self._start = self._pos = match.end()
+        if not self.complete:
+            self._scan()
+        return self.answer
+
+    def _scan(self):
+        buffer = self.buffer
+        i = self._pos
+        end = len(buffer)
+        while i < end:
+            char = buffer[i]
+            if char == '"':
+                self.complete = True
+                break
+            if char != "\\":
+                i += 1
+                continue
+            # Escape sequence: only advance once it is fully received
+            if i + 1 >= end:
+                break
+            if buffer[i + 1] != "u":
+                i += 2
+                continue
+            code = buffer[i + 2:i + 6]
+            if len(code) < 4 or not set(code) <= _HEX:
+                break
+            if 0xD800 <= int(code, 16) <= 0xDBFF:
+                # High surrogate: wait for its low half so we never emit half a character
+                if len(buffer) < i + 12:
+                    break
+                i += 12
+            else:
+                i += 6
+        if i != self._pos or self.complete:
+            self._pos = i
+            self.answer = json.loads('"' + buffer[self._start:i] + '"', strict=False)
+
+    def result(self) -> dict:
+        """Parses the full completion, falling back to the streamed answer if it is not valid JSON."""
+        try:
+            return json.loads(self.buffer.strip())
+        except ValueError:
+            return {"answer": self.answer, "sources": []}
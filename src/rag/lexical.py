@@ -0,0 +1,210 @@
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter
+from typing import Optional
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+# Hebrew points and cantillation marks (keeps maqaf and sof pasuq out of the range)
+_NIQQUD_RE = re.compile("[\u0591-\u05BD\u05BF\u05C1\u05C2\u05C4\u05C5\u05C7]")
+_TOKEN_RE = re.compile(r"\w+")
+_FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+_HEBREW_PREFIXES = "והבלמש"
+_MIN_STEM_LENGTH = 3
+_MAX_PREFIXES = 2
+
+def normalize_hebrew(text: str) -> str:
+    """Strips niqqud, folds final letters and lowercases Latin text."""
+    return _NIQQUD_RE.sub("", text).translate(_FINAL_LETTERS).lower()
+
+def strip_prefixes(token: str) -> str:
+    """
+    Removes up to two leading Hebrew prefix letters (ו/ה/ב/ל/מ/ש),
+    e.g. "וההחלטה" -> "החלטה", while keeping at least three letters.
+    """
+    stripped = 0
+    while (stripped < _MAX_PREFIXES and len(token) > _MIN_STEM_LENGTH
+           and token[0] in _HEBREW_PREFIXES):
+        token = token[1:]
+        stripped += 1
+    return token
+
+def tokenize(text: str) -> list[str]:
+    """
+    Returns index terms for text. Each token is emitted as-is, and again without
+    its prefixes when they differ, so exact forms score higher than stem matches.
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(normalize_hebrew(text)):
+        terms.append(token)
+        stem = strip_prefixes(token)
+        if stem != token:
+            terms.append(stem)
+    return terms
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring.
+    Stores chunk text and metadata so lexical-only hits can be returned without
+    another round-trip to Chroma.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._doc_terms = {}
+        self._docs = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def ids(self) -> set:
+        with self._lock:
+            return set(self._docs)
+
+    def get(self, doc_id: str):
+        return self._docs.get(doc_id)
+
+    def add(self, doc_id: str, text: str, metadata: dict = None):
+        with self._lock:
+            if doc_id in self._docs:
+                self.remove(doc_id)
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            length = sum(counts.values())
+            self._doc_terms[doc_id] = (list(counts), length)
+            self._docs[doc_id] = {"id": doc_id, "text": text, "metadata": metadata or {}}
+            self._total_length += length
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            entry = self._doc_terms.pop(doc_id, None)
+            if entry is None:
+                return
+            terms, length = entry
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._docs.pop(doc_id, None)
+            self._total_length -= length
+
+    def search(self, query: str, n_results: int = 5) -> list[tuple[str, float]]:
+        """Returns up to n_results (doc_id, score) pairs, best first."""
+        with self._lock:
+            doc_count = len(self._docs)
+            if not doc_count:
+                return []
+            avg_length = self._total_length / doc_count
+            scores = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    length = self._doc_terms[doc_id][1]
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:n_results]
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """
+    Fuses several ranked ID lists: score(d) = sum(1 / (k + rank)).
+    Ties keep the order in which IDs were first seen.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
+
+# Per (tenant, collection) index, built lazily from Chroma
+_indexes = {}
+_last_sync = {}
+_synced_versions = {}
+_sync_locks = {}
+_registry_lock = threading.Lock()
+_SYNC_BATCH_SIZE = 500
+
+def _key():
+    return (config.TENANT_NAME, config.COLLECTION_NAME)
+
+def get_index() -> BM25Index:
+    with _registry_lock:
+        index = _indexes.get(_key())
+        if index is None:
+            index = _indexes[_key()] = BM25Index()
+        return index
+
+def index_documents(doc_data_list: list):
+    """Keeps the in-process index in step with add_document (no-op before the first sync)."""
+    if _key() not in _last_sync:
+        return
+    index = get_index()
+    for doc in doc_data_list:
+        index.add(doc['id'], doc['text'], doc.get('metadata'))
+
+def remove_documents(doc_ids: list):
+    if _key() not in _last_sync:
+        return
+    index = get_index()
+    for doc_id in doc_ids:
+        index.remove(doc_id)
+
+def _get_sync_lock(key) -> threading.Lock:
+    with _registry_lock:
+        lock = _sync_locks.get(key)
+        if lock is None:
+            lock = _sync_locks[key] = threading.Lock()
+        return lock
+
+def sync_index(collection, version: Optional[int] = None, force: bool = False) -> BM25Index:
+    """
+    Brings the index in line with the collection. Writes from other processes
+    (e.g. the ingest bot) are picked up at most every LEXICAL_SYNC_INTERVAL seconds:
+    version is the collection version (chroma.get_collection_version(), bumped by every
+    write and delete), and when it differs from the one last synced the index is rebuilt
+    from the collection, so text re-upserted under existing chunk IDs is replaced too.
+    An unknown version (None) always rebuilds.
+    Concurrent callers wait for a running sync instead of searching a partial index;
+    the rebuilt index is swapped in when complete.
+    """
+    key = _key()
+    with _get_sync_lock(key):
+        index = get_index()
+        now = time.time()
+        if not force and now - _last_sync.get(key, 0) < config.LEXICAL_SYNC_INTERVAL:
+            return index
+        if not force and version is not None and key in _last_sync and _synced_versions.get(key) == version:
+            _last_sync[key] = now
+            return index
+
+        index = BM25Index()
+        remote_ids = sorted(collection.get(include=[])['ids'])
+        for start in range(0, len(remote_ids), _SYNC_BATCH_SIZE):
+            batch = collection.get(ids=remote_ids[start:start + _SYNC_BATCH_SIZE], include=["documents", "metadatas"])
+            for j, doc_id in enumerate(batch['ids']):
+                index.add(doc_id, batch['documents'][j] or "", batch['metadatas'][j] if batch['metadatas'] else {})
+
+        with _registry_lock:
+            _indexes[key] = index
+        _last_sync[key] = now
+        _synced_versions[key] = version
+
+        logger.info(f"Lexical index rebuilt: {len(index)} chunks (collection version {version})")
+        return index
@@ -0,0 +1,142 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from src.rag.lexical import normalize_hebrew
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = " ?!.,;:"
+
+def normalize_query(query_text: str) -> str:
+    """Canonical form used as cache key: no niqqud, folded finals, single spaces, no trailing '?'."""
+    return _WHITESPACE_RE.sub(" ", normalize_hebrew(query_text)).strip(_TRAILING_PUNCTUATION)
+
+class QueryEmbeddingCache:
+    """
+    In-memory LRU of normalized query -> embedding.
+    Bounded by entry count and approximate vector bytes; entries expire after ttl seconds.
+    """
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024,
+                 ttl: float = 3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _size(vector) -> int:
+        return len(vector) * 8
+
+    def get(self, query_text: str):
+        key = normalize_query(query_text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            vector, expires_at = entry
+            if expires_at <= self._clock():
+                self._pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, query_text: str, vector) -> None:
+        size = self._size(vector)
+        if size > self.max_bytes:
+            return
+        key = normalize_query(query_text)
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (vector, self._clock() + self.ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key):
+        vector, _ = self._entries.pop(key)
+        self._bytes -= self._size(vector)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+def cosine_similarity(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm_a = sum(x * x for x in a) ** 0.5
+    norm_b = sum(y * y for y in b) ** 0.5
+    if not norm_a or not norm_b:
+        return 0.0
+    return dot / (norm_a * norm_b)
+
+class AnswerCache:
+    """
+    Semantic cache of generated answers.
+    An entry is reused only when the retrieved chunk IDs are exactly the same and the
+    query embedding is at least `threshold` cosine-similar. Everything is dropped as soon
+    as the collection version changes.
+    """
+    def __init__(self, threshold: float = 0.95, max_entries: int = 512, ttl: float = 86400,
+                 clock=time.monotonic):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._next_id = 0
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                logger.info(f"Collection version changed ({self._version} -> {version}), clearing answer cache.")
+            self._entries.clear()
+            self._version = version
+
+    def get(self, query_embedding, chunk_ids, version):
+        """Returns the cached {'answer', 'sources'} dict or None."""
+        key = frozenset(chunk_ids)
+        now = self._clock()
+        with self._lock:
+            self._check_version(version)
+            best_id, best_score = None, self.threshold
+            for entry_id, (entry_key, embedding, _, expires_at) in list(self._entries.items()):
+                if expires_at <= now:
+                    del self._entries[entry_id]
+                    continue
+                if entry_key != key:
+                    continue
+                score = cosine_similarity(query_embedding, embedding)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                return None
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][2]
+
+    def put(self, query_embedding, chunk_ids, version, response: dict) -> None:
+        with self._lock:
+            self._check_version(version)
+            self._entries[self._next_id] = (frozenset(chunk_ids), query_embedding, response, self._clock() + self.ttl)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
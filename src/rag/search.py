@@ -1,86 +1,191 @@
 import logging
-from src.db.chroma import get_collection
+from src.db.chroma import manager, get_collection_version
 from src.config import config
+from src.rag import lexical
+from src.rag.query_cache import QueryEmbeddingCache
+from src.rag.context_builder import join_with_overlap
 from opik import track
 
 logger = logging.getLogger(__name__)
 
+query_embedding_cache = QueryEmbeddingCache(
+    max_entries=config.QUERY_CACHE_MAX_ENTRIES,
+    max_bytes=config.QUERY_CACHE_MAX_BYTES,
+    ttl=config.QUERY_CACHE_TTL
+)
+
+def get_query_embedding(query_text: str) -> list[float]:
+    """Returns the query embedding, computing it only on a cache miss."""
+    vector = query_embedding_cache.get(query_text)
+    if vector is None:
+        vector = [float(x) for x in manager.get_embedding_function()([query_text])[0]]
+        query_embedding_cache.put(query_text, vector)
+    else:
+        logger.debug(f"DEBUG: Query embedding cache hit for: {query_text}")
+    return vector
+
 @track(tags=[f"tenant:{config.TENANT_NAME}"])
-def search_similar_docs(query_text: str, n_results: int = 5):
+def search_similar_docs(query_text: str, n_results: int = 5, window_radius: int = None):
     """
     Searches for documents in ChromaDB similar to the query text.
     
     Args:
         query_text (str): The question or query to search for.
         n_results (int): Number of chunks to retrieve.
+        window_radius (int): Neighbor chunks to add on each side of a hit.
+            Defaults to config.CONTEXT_WINDOW_RADIUS.
         
     Returns:
-        list: A list of dictionaries containing 'text', 'metadata', and 'id'.
+        list: A list of dictionaries containing 'text', 'metadata', 'id' and 'hit_ids',
+        ordered by the rank of the best hit in each merged span.
     """
+    if window_radius is None:
+        window_radius = config.CONTEXT_WINDOW_RADIUS
+
     try:
-        collection = get_collection()
-        
+        query_embedding = get_query_embedding(query_text)
+
         # Query ChromaDB
-        results = collection.query(
-            query_texts=[query_text],
+        results = manager.run(lambda collection: collection.query(
+            query_embeddings=[query_embedding],
             n_results=n_results
-        )
+        ))
         
         # Format results
         # Chroma returns lists of lists (one list per query)
         if not results['documents'] or not results['documents'][0]:
             logging.info(f"No results found for query: {query_text}")
             return []
-            
-        formatted_results = []
+
+        hits = []
         for i, doc_text in enumerate(results['documents'][0]):
-            metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-            doc_id = results['ids'][0][i] if results['ids'] else "unknown"
-            
-            # Context Expansion: Fetch neighbors
-            expanded_text = doc_text
-            try:
-                chunk_index = metadata.get('chunk_index')
-                filename = metadata.get('filename')
-                
-                logger.debug(f"DEBUG: Processing doc_id={doc_id}, index={chunk_index}, file={filename}")
-
-                if chunk_index is not None and filename is not None:
-                    # Construct neighbor IDs
-                    prev_id = f"{filename}_part_{int(chunk_index) - 1}"
-                    next_id = f"{filename}_part_{int(chunk_index) + 1}"
-                    
-                    logger.debug(f"DEBUG: Fetching neighbors: {prev_id}, {next_id}")
-                    
-                    # Fetch them
-                    neighbors = collection.get(ids=[prev_id, next_id])
-                    logger.debug(f"DEBUG: Got neighbors result ids: {neighbors.get('ids')}")
-                    
-                    neighbor_map = {}
-                    if neighbors['ids']:
-                        for j, nid in enumerate(neighbors['ids']):
-                            neighbor_map[nid] = neighbors['documents'][j]
-                            
-                    # Merge text
-                    if prev_id in neighbor_map:
-                        expanded_text = neighbor_map[prev_id] + "\n" + expanded_text
-                        logger.debug(f"DEBUG: Merged prev chunk")
-                        
-                    if next_id in neighbor_map:
-                        expanded_text = expanded_text + "\n" + neighbor_map[next_id]
-                        logger.debug(f"DEBUG: Merged next chunk")
-                        
-            except Exception as e:
-                logger.error(f"Failed to fetch neighbors for {doc_id}: {e}")
-            
-            formatted_results.append({
-                "text": expanded_text,
-                "metadata": metadata,
-                "id": doc_id
+            hits.append({
+                "text": doc_text,
+                "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
+                "id": results['ids'][0][i] if results['ids'] else "unknown"
             })
-            
-        return formatted_results
+
+        if config.HYBRID_SEARCH:
+            hits = fuse_with_lexical(query_text, hits, n_results)
+
+        return expand_context(hits, window_radius)
         
     except Exception as e:
         logger.error(f"Error searching ChromaDB: {e}")
         return []
+
+def fuse_with_lexical(query_text: str, vector_hits: list, n_results: int) -> list:
+    """
+    Merges vector hits with BM25 hits using reciprocal-rank fusion.
+    Falls back to the vector hits if the lexical index is unavailable.
+    """
+    try:
+        version = get_collection_version()
+        index = manager.run(lambda collection: lexical.sync_index(collection, version))
+        lexical_ids = [doc_id for doc_id, _ in index.search(query_text, n_results)]
+    except Exception as e:
+        logger.error(f"Lexical search failed, using vector results only: {e}")
+        return vector_hits
+
+    by_id = {hit['id']: hit for hit in vector_hits}
+    fused_ids = lexical.reciprocal_rank_fusion([list(by_id), lexical_ids], k=config.RRF_K)
+
+    fused = []
+    for doc_id in fused_ids[:n_results]:
+        hit = by_id.get(doc_id) or index.get(doc_id)
+        if hit:
+            fused.append(hit)
+    logger.debug(f"DEBUG: Fused {len(vector_hits)} vector and {len(lexical_ids)} lexical hits")
+    return fused
+
+def merge_windows(hits: list, window_radius: int) -> list:
+    """
+    Groups ranked hits into contiguous chunk spans per file.
+    Windows of [index - radius, index + radius] that overlap or touch are merged.
+    Returns spans ordered by their best hit rank:
+    {'filename', 'start', 'end', 'rank', 'hit_ids'}, with hit_ids in rank order. Hits without a chunk index are
+    returned as single-hit spans with start/end set to None.
+    """
+    spans = []
+    by_file = {}
+    for rank, hit in enumerate(hits):
+        metadata = hit['metadata'] or {}
+        chunk_index = metadata.get('chunk_index')
+        filename = metadata.get('filename')
+        if chunk_index is None or filename is None:
+            spans.append({"filename": filename, "start": None, "end": None, "rank": rank, "hit_ids": [hit['id']]})
+            continue
+        chunk_index = int(chunk_index)
+        by_file.setdefault(filename, []).append((max(chunk_index - window_radius, 0), chunk_index + window_radius, rank, hit['id']))
+
+    for filename, windows in by_file.items():
+        windows.sort()
+        current = None
+        for start, end, rank, hit_id in windows:
+            if current is not None and start <= current['end'] + 1:
+                current['end'] = max(current['end'], end)
+                current['rank'] = min(current['rank'], rank)
+                current['hit_ids'].append(hit_id)
+            else:
+                current = {"filename": filename, "start": start, "end": end, "rank": rank, "hit_ids": [hit_id]}
+                spans.append(current)
+
+    rank_of = {hit['id']: rank for rank, hit in enumerate(hits)}
+    for span in spans:
+        span['hit_ids'].sort(key=rank_of.get)
+    spans.sort(key=lambda span: span['rank'])
+    return spans
+
+def expand_context(hits: list, window_radius: int) -> list:
+    """
+    Expands ranked hits with their neighboring chunks using a single batched fetch.
+    """
+    spans = merge_windows(hits, window_radius)
+
+    # One round-trip for every chunk covered by any span (deduplicated)
+    wanted_ids = []
+    seen = set()
+    for span in spans:
+        if span['start'] is None:
+            continue
+        for index in range(span['start'], span['end'] + 1):
+            chunk_id = f"{span['filename']}_part_{index}"
+            if chunk_id not in seen:
+                seen.add(chunk_id)
+                wanted_ids.append(chunk_id)
+
+    chunk_texts = {}
+    if wanted_ids:
+        try:
+            logger.debug(f"DEBUG: Fetching {len(wanted_ids)} chunks for {len(spans)} spans")
+            fetched = manager.run(lambda collection: collection.get(ids=wanted_ids, include=["documents"]))
+            for j, chunk_id in enumerate(fetched.get('ids') or []):
+                chunk_texts[chunk_id] = fetched['documents'][j]
+        except Exception as e:
+            logger.error(f"Failed to fetch neighbor chunks: {e}")
+
+    hits_by_id = {hit['id']: hit for hit in hits}
+    formatted_results = []
+    for span in spans:
+        best_hit = hits_by_id[span['hit_ids'][0]]
+
+        if span['start'] is None:
+            text = best_hit['text']
+        else:
+            text = ""
+            for index in range(span['start'], span['end'] + 1):
+                chunk_id = f"{span['filename']}_part_{index}"
+                # Hits are always available even if the batched fetch failed
+                part = chunk_texts.get(chunk_id) or (hits_by_id[chunk_id]['text'] if chunk_id in hits_by_id else None)
+                if part:
+                    # Consecutive chunks share the chunker's overlap window; keep it once
+                    text = join_with_overlap(text, part) if text else part
+
+        formatted_results.append({
+            "text": text,
+            "metadata": best_hit['metadata'],
+            "id": best_hit['id'],
+            "hit_ids": span['hit_ids']
+        })
+
+    return formatted_results
@@ -1,9 +1,12 @@
 from src.config import config
-from src.storage.interface import StorageProvider
+from src.storage.interface import StorageProvider, FileSource
+import hashlib
 import logging
-from azure.core.exceptions import ResourceExistsError
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
 from azure.storage.blob import BlobServiceClient, ContentSettings
-from io import BytesIO
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +23,12 @@ class AzureStorage(StorageProvider):
             return
 
         try:
-            self.blob_service_client = BlobServiceClient.from_connection_string(self.connection_string)
+            # Downloads are fetched in STORAGE_CHUNK_SIZE ranges rather than as one response
+            self.blob_service_client = BlobServiceClient.from_connection_string(
+                self.connection_string,
+                max_single_get_size=config.STORAGE_CHUNK_SIZE,
+                max_chunk_get_size=config.STORAGE_CHUNK_SIZE
+            )
             self.container_client = self.blob_service_client.get_container_client(self.container_name)
             
             # Ensure container exists
@@ -37,26 +45,72 @@ class AzureStorage(StorageProvider):
             self.blob_service_client = None
 
     def save_file(self, file_data: bytes, filename: str, content_type: str = None) -> str:
+        return self.upload_from_file(filename, file_data, content_type)
+
+    def upload_from_file(self, filename: str, source: FileSource, content_type: str = None) -> str:
+        """
+        Uploads from a path, a file object or bytes-like data without copying it whole:
+        the source is read STORAGE_CHUNK_SIZE bytes at a time. Anything larger than one
+        block is staged as blocks, up to STORAGE_MAX_CONCURRENCY in flight, and committed
+        with its Content-MD5 so get_content_md5 still works for it.
+        """
         if not self.container_client:
             logger.error("Azure container client not initialized.")
             return ""
 
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as f:
+                return self.upload_from_file(filename, f, content_type)
+
         try:
-            # Convert bytearray to bytes if needed, or wrap in BytesIO
-            if isinstance(file_data, bytearray):
-                file_data = bytes(file_data)
-            
             blob_client = self.container_client.get_blob_client(filename)
             logger.info(f"Uploading {filename} to Azure container {self.container_name}...")
-            
-            content_settings = ContentSettings(content_type=content_type) if content_type else None
-            
-            blob_client.upload_blob(file_data, overwrite=True, content_settings=content_settings)
+            read_block = _block_reader(source, config.STORAGE_CHUNK_SIZE)
+            first_block = read_block()
+            second_block = read_block() if first_block else b""
+
+            if not second_block:
+                # Fits in a single request (which also stores its Content-MD5)
+                content_settings = ContentSettings(content_type=content_type) if content_type else None
+                blob_client.upload_blob(first_block, overwrite=True, content_settings=content_settings)
+                return filename
+
+            self._upload_blocks(blob_client, read_block, [first_block, second_block], content_type)
             return filename
         except Exception as e:
             logger.error(f"Failed to upload {filename} to Azure: {e}")
             raise e
 
+    def _upload_blocks(self, blob_client, read_block, first_blocks: list, content_type: str = None) -> None:
+        md5 = hashlib.md5()
+        block_ids = []
+        concurrency = max(1, config.STORAGE_MAX_CONCURRENCY)
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="blob-upload") as executor:
+            in_flight = set()
+            pending = list(first_blocks)
+            while True:
+                block = pending.pop(0) if pending else read_block()
+                if not block:
+                    break
+                md5.update(block)
+                # Same-length IDs; the SDK base64-encodes them
+                block_id = f"{len(block_ids):08d}"
+                block_ids.append(block_id)
+                in_flight.add(executor.submit(blob_client.stage_block, block_id, block, length=len(block)))
+                # Bound the blocks held in memory
+                if len(in_flight) >= concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+            for future in in_flight:
+                future.result()
+
+        blob_client.commit_block_list(
+            block_ids,
+            content_settings=ContentSettings(content_type=content_type, content_md5=bytearray(md5.digest()))
+        )
+        logger.info(f"Uploaded {len(block_ids)} blocks.")
+
     def list_files(self) -> list[str]:
         if not self.container_client:
             return []
@@ -69,17 +123,55 @@ class AzureStorage(StorageProvider):
             return []
 
     def get_file_stream(self, filename: str):
+        """
+        Downloads the blob in chunks into a temporary file that stays in memory up to
+        STORAGE_SPOOL_THRESHOLD bytes and spills to disk beyond it. The caller closes it.
+        """
         if not self.container_client:
             return None
-        
+
+        spool = tempfile.SpooledTemporaryFile(max_size=config.STORAGE_SPOOL_THRESHOLD)
         try:
-             blob_client = self.container_client.get_blob_client(filename)
-             data = blob_client.download_blob().readall()
-             return BytesIO(data)
+            if not self.download_to_file(filename, spool):
+                spool.close()
+                return None
+            spool.seek(0)
+            return spool
         except Exception as e:
+            spool.close()
             logger.error(f"Error getting file stream for {filename}: {e}")
             return None
 
+    def download_to_file(self, filename: str, destination) -> bool:
+        if not self.container_client:
+            return False
+
+        if isinstance(destination, (str, os.PathLike)):
+            with open(destination, 'wb') as f:
+                found = self.download_to_file(filename, f)
+            if not found:
+                os.remove(destination)
+            return found
+
+        try:
+            blob_client = self.container_client.get_blob_client(filename)
+            downloader = blob_client.download_blob(max_concurrency=config.STORAGE_MAX_CONCURRENCY)
+            downloader.readinto(destination)
+            return True
+        except ResourceNotFoundError:
+            logger.error(f"File not found in Azure: {filename}")
+            return False
+
+    def iter_file_chunks(self, filename: str, chunk_size: int = None):
+        """Streams the blob in STORAGE_CHUNK_SIZE ranges (chunk_size is decided by the client)."""
+        if not self.container_client:
+            return None
+        try:
+            return self.container_client.get_blob_client(filename).download_blob().chunks()
+        except ResourceNotFoundError:
+            logger.error(f"File not found in Azure: {filename}")
+            return None
+
     def get_metadata(self, filename: str) -> dict:
         if not self.container_client:
             return {}
@@ -91,6 +183,39 @@ class AzureStorage(StorageProvider):
             logger.error(f"Failed to get metadata for {filename}: {e}")
             return {}
 
+    def delete_file(self, filename: str) -> None:
+        if not self.container_client:
+            return
+        try:
+            self.container_client.get_blob_client(filename).delete_blob()
+            logger.info(f"Deleted {filename} from Azure container {self.container_name}")
+        except ResourceNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to delete {filename} from Azure: {e}")
+            raise e
+
+    def get_content_md5(self, filename: str):
+        if not self.container_client:
+            return None
+        try:
+            blob_client = self.container_client.get_blob_client(filename)
+            content_md5 = blob_client.get_blob_properties().content_settings.content_md5
+            # Only set for blobs uploaded in a single request
+            return bytes(content_md5).hex() if content_md5 else None
+        except Exception as e:
+            logger.error(f"Failed to get content MD5 for {filename}: {e}")
+            return None
+
+    def get_etag(self, filename: str):
+        if not self.container_client:
+            return None
+        try:
+            return self.container_client.get_blob_client(filename).get_blob_properties().etag
+        except Exception as e:
+            logger.error(f"Failed to get ETag for {filename}: {e}")
+            return None
+
     def update_metadata(self, filename: str, metadata: dict) -> None:
         if not self.container_client:
             return
@@ -99,3 +224,28 @@ class AzureStorage(StorageProvider):
             blob_client.set_blob_metadata(metadata)
         except Exception as e:
             logger.error(f"Failed to update metadata for {filename}: {e}")
+
+def _block_reader(source, block_size: int):
+    """Returns a function reading the next block (b"" at the end) from a file object or bytes-like data."""
+    if hasattr(source, 'read'):
+        def read_block():
+            # read() may return less than asked (e.g. sockets), so fill the block
+            parts, size = [], 0
+            while size < block_size:
+                part = source.read(block_size - size)
+                if not part:
+                    break
+                parts.append(part)
+                size += len(part)
+            return b"".join(parts)
+        return read_block
+
+    view = memoryview(source).cast('B')
+    position = 0
+
+    def read_block():
+        nonlocal position
+        block = bytes(view[position:position + block_size])
+        position += len(block)
+        return block
+    return read_block
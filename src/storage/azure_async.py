@@ -0,0 +1,102 @@
+from src.config import config
+from src.storage.interface import AsyncStorageProvider
+import logging
+import os
+import tempfile
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob.aio import BlobServiceClient
+
+logger = logging.getLogger(__name__)
+
+class AsyncAzureStorage(AsyncStorageProvider):
+    """
+    Read side of AzureStorage on the aio blob SDK. A single BlobServiceClient, and so a
+    single pooled HTTP session, is shared by all calls. It is created on first use inside
+    the running event loop and released by close().
+    """
+    def __init__(self, container_name: str = None):
+        self.connection_string = config.AZURE_STORAGE_CONNECTION_STRING
+        self.container_name = container_name or config.AZURE_CONTAINER_NAME
+        self.blob_service_client = None
+        self.container_client = None
+
+        if not self.connection_string:
+            logger.warning("Azure Storage Connection String not configured.")
+
+    def _get_container_client(self):
+        if self.container_client is None and self.connection_string:
+            self.blob_service_client = BlobServiceClient.from_connection_string(
+                self.connection_string,
+                max_single_get_size=config.STORAGE_CHUNK_SIZE,
+                max_chunk_get_size=config.STORAGE_CHUNK_SIZE
+            )
+            self.container_client = self.blob_service_client.get_container_client(self.container_name)
+            logger.info("Initialized async Azure Storage Provider.")
+        return self.container_client
+
+    async def get_file_stream(self, filename: str):
+        """Same as AzureStorage.get_file_stream: a temporary file spooled to disk past STORAGE_SPOOL_THRESHOLD."""
+        if not self._get_container_client():
+            return None
+
+        spool = tempfile.SpooledTemporaryFile(max_size=config.STORAGE_SPOOL_THRESHOLD)
+        try:
+            if not await self.download_to_file(filename, spool):
+                spool.close()
+                return None
+            spool.seek(0)
+            return spool
+        except Exception as e:
+            spool.close()
+            logger.error(f"Error getting file stream for {filename}: {e}")
+            return None
+
+    async def download_to_file(self, filename: str, destination) -> bool:
+        container_client = self._get_container_client()
+        if not container_client:
+            return False
+
+        if isinstance(destination, (str, os.PathLike)):
+            with open(destination, 'wb') as f:
+                found = await self.download_to_file(filename, f)
+            if not found:
+                os.remove(destination)
+            return found
+
+        try:
+            blob_client = container_client.get_blob_client(filename)
+            downloader = await blob_client.download_blob(max_concurrency=config.STORAGE_MAX_CONCURRENCY)
+            await downloader.readinto(destination)
+            return True
+        except ResourceNotFoundError:
+            logger.error(f"File not found in Azure: {filename}")
+            return False
+
+    async def get_etag(self, filename: str):
+        container_client = self._get_container_client()
+        if not container_client:
+            return None
+        try:
+            properties = await container_client.get_blob_client(filename).get_blob_properties()
+            return properties.etag
+        except Exception as e:
+            logger.error(f"Failed to get ETag for {filename}: {e}")
+            return None
+
+    async def get_content_md5(self, filename: str):
+        container_client = self._get_container_client()
+        if not container_client:
+            return None
+        try:
+            properties = await container_client.get_blob_client(filename).get_blob_properties()
+            content_md5 = properties.content_settings.content_md5
+            return bytes(content_md5).hex() if content_md5 else None
+        except Exception as e:
+            logger.error(f"Failed to get content MD5 for {filename}: {e}")
+            return None
+
+    async def close(self) -> None:
+        if self.blob_service_client is not None:
+            await self.blob_service_client.close()
+            self.blob_service_client = None
+            self.container_client = None
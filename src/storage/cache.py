@@ -0,0 +1,351 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+from src.config import config
+from src.storage.interface import StorageProvider, AsyncStorageProvider, FileSource, DEFAULT_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+class StorageCacheIndex:
+    """
+    Entries of the on-disk storage cache: per (namespace, filename) the cached copy's
+    validator (ETag or content MD5), size, last access and last validation time.
+    Shared through WAL mode by the bot processes that mount the same data dir.
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, filename TEXT NOT NULL, validator TEXT NOT NULL, path TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL, validated_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, filename))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_by_access ON entries (last_access)")
+        self._conn.commit()
+
+    def get(self, namespace: str, filename: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT validator, path, size, validated_at FROM entries WHERE namespace = ? AND filename = ?",
+                (namespace, filename)
+            ).fetchone()
+        if not row:
+            return None
+        return {"validator": row[0], "path": row[1], "size": row[2], "validated_at": row[3]}
+
+    def touch(self, namespace: str, filename: str, validated: bool = False) -> None:
+        now = time.time()
+        with self._lock:
+            if validated:
+                self._conn.execute(
+                    "UPDATE entries SET last_access = ?, validated_at = ? WHERE namespace = ? AND filename = ?",
+                    (now, now, namespace, filename)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE entries SET last_access = ? WHERE namespace = ? AND filename = ?",
+                    (now, namespace, filename)
+                )
+            self._conn.commit()
+
+    def put(self, namespace: str, filename: str, validator: str, path: str, size: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, filename, validator, path, size, last_access, validated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (namespace, filename, validator, path, size, now, now)
+            )
+            self._conn.commit()
+
+    def remove(self, namespace: str, filename: str) -> Optional[str]:
+        """Drops the entry and returns the path of its cached copy, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM entries WHERE namespace = ? AND filename = ?", (namespace, filename)
+            ).fetchone()
+            self._conn.execute("DELETE FROM entries WHERE namespace = ? AND filename = ?", (namespace, filename))
+            self._conn.commit()
+        return row[0] if row else None
+
+    def evict(self, max_bytes: int) -> list[str]:
+        """Drops least recently used entries until the total size fits max_bytes. Returns their paths."""
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= max_bytes:
+                return []
+            evicted = []
+            for namespace, filename, path, size in self._conn.execute(
+                    "SELECT namespace, filename, path, size FROM entries ORDER BY last_access").fetchall():
+                if total <= max_bytes:
+                    break
+                self._conn.execute("DELETE FROM entries WHERE namespace = ? AND filename = ?", (namespace, filename))
+                evicted.append(path)
+                total -= size
+            self._conn.commit()
+        return evicted
+
+    def total_size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+class DiskCache:
+    """
+    Files cached on local disk for one storage namespace (e.g. an Azure container), LRU
+    bounded by max_bytes, each stored with the validator (ETag or content MD5) it was
+    downloaded at. The backend calls are left to the sync and async wrappers below.
+    """
+    def __init__(self, namespace: str, cache_dir: str = None, max_bytes: int = None, validate_interval: float = None):
+        self.namespace = namespace
+        self.cache_dir = cache_dir or os.path.join(config.CACHE_DIR, "storage")
+        self.max_bytes = max_bytes if max_bytes is not None else config.STORAGE_CACHE_MAX_BYTES
+        self.validate_interval = (
+            validate_interval if validate_interval is not None else config.STORAGE_CACHE_VALIDATE_INTERVAL
+        )
+        self._index = None
+        self._index_lock = threading.Lock()
+
+    def _get_index(self) -> StorageCacheIndex:
+        # Opened on first use, so constructing a provider touches no files
+        with self._index_lock:
+            if self._index is None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._index = StorageCacheIndex(os.path.join(self.cache_dir, "index.sqlite"))
+            return self._index
+
+    def lookup(self, filename: str) -> Optional[dict]:
+        """
+        The cached entry of the file, or None. When entry["fresh"] is False the caller
+        checks entry["validator"] against the backend and calls confirm() or invalidate().
+        """
+        index = self._get_index()
+        entry = index.get(self.namespace, filename)
+        if entry is None or not os.path.exists(entry["path"]):
+            return None
+        entry["fresh"] = time.time() - entry["validated_at"] < self.validate_interval
+        if entry["fresh"]:
+            index.touch(self.namespace, filename)
+        return entry
+
+    def confirm(self, filename: str) -> None:
+        self._get_index().touch(self.namespace, filename, validated=True)
+
+    def temp_path(self, filename: str) -> str:
+        """A unique path to download the file to before store()."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return f"{self._path(filename)}.{uuid.uuid4().hex}.part"
+
+    def store(self, filename: str, validator: str, temp_path: str) -> Optional[str]:
+        """Moves a downloaded file into the cache (evicting as needed) and returns its path, or None if too large."""
+        size = os.path.getsize(temp_path)
+        if size > self.max_bytes:
+            os.remove(temp_path)
+            return None
+        path = self._path(filename)
+        os.replace(temp_path, path)
+        index = self._get_index()
+        index.put(self.namespace, filename, validator, path, size)
+        for evicted in index.evict(self.max_bytes):
+            _remove_quietly(evicted)
+        return path
+
+    def invalidate(self, filename: str) -> None:
+        path = self._get_index().remove(self.namespace, filename)
+        if path:
+            _remove_quietly(path)
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(f"{self.namespace}/{filename}".encode("utf-8")).hexdigest())
+
+def _namespace(inner) -> str:
+    return getattr(inner, "container_name", None) or type(inner).__name__
+
+class CachingStorage(StorageProvider):
+    """
+    StorageProvider wrapper that keeps recently read files on local disk (LRU, bounded
+    by STORAGE_CACHE_MAX_BYTES), so repeat reads of hot source PDFs don't hit the backend.
+    A cached copy is revalidated against the backend's ETag (or content MD5) at most every
+    STORAGE_CACHE_VALIDATE_INTERVAL seconds, and dropped when the file is written,
+    its metadata changes or it is deleted through this wrapper. Files the backend can't
+    validate are not cached. The cache survives restarts.
+    """
+    def __init__(self, inner: StorageProvider, cache_dir: str = None, max_bytes: int = None,
+                 validate_interval: float = None):
+        self.inner = inner
+        self.cache = DiskCache(_namespace(inner), cache_dir, max_bytes, validate_interval)
+
+    def _validator(self, filename: str) -> Optional[str]:
+        return self.inner.get_etag(filename) or self.inner.get_content_md5(filename)
+
+    def _cached_path(self, filename: str) -> Optional[str]:
+        """Path of a valid cached copy of the file, or None."""
+        entry = self.cache.lookup(filename)
+        if entry is None:
+            return None
+        if entry["fresh"]:
+            return entry["path"]
+        if self._validator(filename) == entry["validator"]:
+            self.cache.confirm(filename)
+            return entry["path"]
+        logger.info(f"Cached copy of {filename} is stale")
+        self.cache.invalidate(filename)
+        return None
+
+    def _fetch(self, filename: str) -> Optional[str]:
+        """Downloads the file into the cache and returns the path, or None if it can't be cached."""
+        validator = self._validator(filename)
+        if not validator:
+            return None
+        temp_path = self.cache.temp_path(filename)
+        try:
+            if not self.inner.download_to_file(filename, temp_path):
+                return None
+            return self.cache.store(filename, validator, temp_path)
+        finally:
+            _remove_quietly(temp_path)
+
+    def _local_path(self, filename: str) -> Optional[str]:
+        try:
+            return self._cached_path(filename) or self._fetch(filename)
+        except Exception as e:
+            logger.error(f"Storage cache failed for {filename}, reading from the backend: {e}")
+            return None
+
+    def invalidate(self, filename: str) -> None:
+        self.cache.invalidate(filename)
+
+    def get_file_stream(self, filename: str):
+        path = self._local_path(filename)
+        if path:
+            try:
+                return open(path, 'rb')
+            except FileNotFoundError:
+                # Evicted meanwhile (e.g. by the other bot)
+                pass
+        return self.inner.get_file_stream(filename)
+
+    def download_to_file(self, filename: str, destination) -> bool:
+        path = self._local_path(filename)
+        if path and _copy_cached(path, destination):
+            return True
+        return self.inner.download_to_file(filename, destination)
+
+    def save_file(self, file_data: bytes, filename: str, content_type: str = None) -> str:
+        self.invalidate(filename)
+        return self.inner.save_file(file_data, filename, content_type)
+
+    def upload_from_file(self, filename: str, source: FileSource, content_type: str = None) -> str:
+        self.invalidate(filename)
+        return self.inner.upload_from_file(filename, source, content_type)
+
+    def update_metadata(self, filename: str, metadata: dict) -> None:
+        self.invalidate(filename)
+        self.inner.update_metadata(filename, metadata)
+
+    def delete_file(self, filename: str) -> None:
+        self.invalidate(filename)
+        self.inner.delete_file(filename)
+
+    def list_files(self):
+        return self.inner.list_files()
+
+    def get_metadata(self, filename: str) -> dict:
+        return self.inner.get_metadata(filename)
+
+    def get_content_md5(self, filename: str) -> Optional[str]:
+        return self.inner.get_content_md5(filename)
+
+    def get_etag(self, filename: str) -> Optional[str]:
+        return self.inner.get_etag(filename)
+
+class AsyncCachingStorage(AsyncStorageProvider):
+    """CachingStorage for an AsyncStorageProvider, sharing the same on-disk cache."""
+    def __init__(self, inner: AsyncStorageProvider, cache_dir: str = None, max_bytes: int = None,
+                 validate_interval: float = None):
+        self.inner = inner
+        self.cache = DiskCache(_namespace(inner), cache_dir, max_bytes, validate_interval)
+
+    async def _validator(self, filename: str) -> Optional[str]:
+        return await self.inner.get_etag(filename) or await self.inner.get_content_md5(filename)
+
+    async def _local_path(self, filename: str) -> Optional[str]:
+        # The index (SQLite, shared between containers) and file moves block, so they run
+        # in threads to keep the event loop free
+        try:
+            entry = await asyncio.to_thread(self.cache.lookup, filename)
+            if entry is not None:
+                if entry["fresh"]:
+                    return entry["path"]
+                validator = await self._validator(filename)
+                if validator == entry["validator"]:
+                    await asyncio.to_thread(self.cache.confirm, filename)
+                    return entry["path"]
+                logger.info(f"Cached copy of {filename} is stale")
+                await asyncio.to_thread(self.cache.invalidate, filename)
+            else:
+                validator = await self._validator(filename)
+
+            if not validator:
+                return None
+            temp_path = await asyncio.to_thread(self.cache.temp_path, filename)
+            try:
+                if not await self.inner.download_to_file(filename, temp_path):
+                    return None
+                return await asyncio.to_thread(self.cache.store, filename, validator, temp_path)
+            finally:
+                await asyncio.to_thread(_remove_quietly, temp_path)
+        except Exception as e:
+            logger.error(f"Storage cache failed for {filename}, reading from the backend: {e}")
+            return None
+
+    async def get_file_stream(self, filename: str):
+        path = await self._local_path(filename)
+        if path:
+            try:
+                return await asyncio.to_thread(open, path, 'rb')
+            except FileNotFoundError:
+                pass
+        return await self.inner.get_file_stream(filename)
+
+    async def download_to_file(self, filename: str, destination) -> bool:
+        path = await self._local_path(filename)
+        if path and await asyncio.to_thread(_copy_cached, path, destination):
+            return True
+        return await self.inner.download_to_file(filename, destination)
+
+    async def get_etag(self, filename: str) -> Optional[str]:
+        return await self.inner.get_etag(filename)
+
+    async def get_content_md5(self, filename: str) -> Optional[str]:
+        return await self.inner.get_content_md5(filename)
+
+    async def close(self) -> None:
+        await self.inner.close()
+
+def _copy_cached(path: str, destination) -> bool:
+    """Copies a cached file to a path or file object; False if it was evicted meanwhile."""
+    try:
+        if isinstance(destination, (str, os.PathLike)):
+            shutil.copyfile(path, destination)
+        else:
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, destination, DEFAULT_CHUNK_SIZE)
+        return True
+    except FileNotFoundError:
+        return False
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,15 +1,33 @@
 from src.config import config
 from src.storage.azure import AzureStorage
+from src.storage.azure_async import AsyncAzureStorage
+from src.storage.cache import CachingStorage, AsyncCachingStorage
 import logging
 
 logger = logging.getLogger(__name__)
 
 class StorageFactory:
     @staticmethod
-    def get_storage_provider():
+    def get_storage_provider(cached: bool = None):
         """
         Returns the appropriate storage provider (Azure).
+        Unless cached is False (or STORAGE_CACHE_ENABLED is off), reads are served from
+        the local disk cache; pass cached=False for one-off bulk reads such as a reindex.
         """
         # Hardcoded to Azure as we removed S3 support
         logger.info("Initializing Azure Native Storage Provider")
-        return AzureStorage()
+        provider = AzureStorage()
+        if cached is None:
+            cached = config.STORAGE_CACHE_ENABLED
+        return CachingStorage(provider) if cached else provider
+
+    @staticmethod
+    def get_async_storage_provider(cached: bool = None):
+        """
+        Returns the asyncio read-only provider (Azure), for fetching files from the event
+        loop. Shares the local disk cache with get_storage_provider().
+        """
+        provider = AsyncAzureStorage()
+        if cached is None:
+            cached = config.STORAGE_CACHE_ENABLED
+        return AsyncCachingStorage(provider) if cached else provider
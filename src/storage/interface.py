@@ -1,5 +1,13 @@
+import asyncio
+import os
+import shutil
 from abc import ABC, abstractmethod
-from typing import Optional, List, BinaryIO
+from typing import Optional, List, BinaryIO, Iterator, Union
+
+# A path, a readable binary file object, or bytes-like data
+FileSource = Union[str, os.PathLike, BinaryIO, bytes, bytearray, memoryview]
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
 
 class StorageProvider(ABC):
     @abstractmethod
@@ -26,3 +34,87 @@ class StorageProvider(ABC):
     def update_metadata(self, filename: str, metadata: dict) -> None:
         """Updates the metadata of the file"""
         pass
+
+    @abstractmethod
+    def delete_file(self, filename: str) -> None:
+        """Deletes the file if it exists"""
+        pass
+
+    def get_content_md5(self, filename: str) -> Optional[str]:
+        """Returns the hex MD5 of the file content if the backend can tell without a download, else None"""
+        return None
+
+    def get_etag(self, filename: str) -> Optional[str]:
+        """Returns a version tag that changes whenever the file does, if the backend has one, else None"""
+        return None
+
+    def upload_from_file(self, filename: str, source: FileSource, content_type: str = None) -> str:
+        """
+        Saves a file from a path, a file object or bytes-like data and returns its key.
+        Backends that can stream override this; the default reads the source into memory.
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as f:
+                return self.save_file(f.read(), filename, content_type)
+        if hasattr(source, 'read'):
+            return self.save_file(source.read(), filename, content_type)
+        return self.save_file(source, filename, content_type)
+
+    def download_to_file(self, filename: str, destination) -> bool:
+        """Writes the file content to a path or writable file object. Returns False if the file is missing"""
+        stream = self.get_file_stream(filename)
+        if stream is None:
+            return False
+        try:
+            if isinstance(destination, (str, os.PathLike)):
+                with open(destination, 'wb') as f:
+                    shutil.copyfileobj(stream, f, DEFAULT_CHUNK_SIZE)
+            else:
+                shutil.copyfileobj(stream, destination, DEFAULT_CHUNK_SIZE)
+        finally:
+            stream.close()
+        return True
+
+    def iter_file_chunks(self, filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Optional[Iterator[bytes]]:
+        """Returns an iterator over the file content in chunks, or None if the file is missing"""
+        stream = self.get_file_stream(filename)
+        if stream is None:
+            return None
+
+        def chunks():
+            try:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+            finally:
+                stream.close()
+        return chunks()
+
+class AsyncStorageProvider(ABC):
+    """Read side of a StorageProvider for asyncio code, so downloads don't block the event loop"""
+    @abstractmethod
+    async def get_file_stream(self, filename: str) -> Optional[BinaryIO]:
+        """Returns a stream of the file content, or None if it can't be fetched"""
+        pass
+
+    @abstractmethod
+    async def download_to_file(self, filename: str, destination) -> bool:
+        """Writes the file content to a path or writable file object. Returns False if the file is missing"""
+        pass
+
+    async def get_file_streams(self, filenames: List[str]) -> dict:
+        """Fetches several files concurrently (as long as the slowest one takes); returns {filename: stream or None}"""
+        streams = await asyncio.gather(*[self.get_file_stream(filename) for filename in filenames])
+        return dict(zip(filenames, streams))
+
+    async def get_content_md5(self, filename: str) -> Optional[str]:
+        return None
+
+    async def get_etag(self, filename: str) -> Optional[str]:
+        return None
+
+    async def close(self) -> None:
+        """Releases pooled connections"""
+        pass
@@ -1,6 +1,7 @@
 import os
+import shutil
 from typing import List
-from .interface import StorageProvider
+from .interface import StorageProvider, FileSource, DEFAULT_CHUNK_SIZE
 
 class LocalStorage(StorageProvider):
     def __init__(self, base_dir: str):
@@ -14,8 +15,25 @@ class LocalStorage(StorageProvider):
             f.write(file_data)
         return filepath
 
+    def upload_from_file(self, filename: str, source: FileSource, content_type: str = None) -> str:
+        if not isinstance(source, (str, os.PathLike)) and not hasattr(source, 'read'):
+            return self.save_file(source, filename, content_type)
+        filepath = os.path.join(self.base_dir, filename)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        if isinstance(source, (str, os.PathLike)):
+            shutil.copyfile(source, filepath)
+        else:
+            with open(filepath, 'wb') as f:
+                shutil.copyfileobj(source, f, DEFAULT_CHUNK_SIZE)
+        return filepath
+
     def list_files(self) -> List[str]:
-        return [f for f in os.listdir(self.base_dir) if os.path.isfile(os.path.join(self.base_dir, f))]
+        # Keys of nested files use "/" like blob names
+        files = []
+        for root, _, names in os.walk(self.base_dir):
+            for name in names:
+                files.append(os.path.relpath(os.path.join(root, name), self.base_dir).replace(os.sep, "/"))
+        return files
 
     def get_file_stream(self, filename: str):
         filepath = os.path.join(self.base_dir, filename)
@@ -30,3 +48,8 @@ class LocalStorage(StorageProvider):
     def update_metadata(self, filename: str, metadata: dict) -> None:
         # Local storage doesn't support metadata
         pass
+
+    def delete_file(self, filename: str) -> None:
+        filepath = os.path.join(self.base_dir, filename)
+        if os.path.exists(filepath):
+            os.remove(filepath)
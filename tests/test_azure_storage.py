@@ -0,0 +1,134 @@
+import hashlib
+import os
+import threading
+from io import BytesIO
+import pytest
+from src.config import config
+from src.storage import azure
+from src.storage.azure import AzureStorage
+from src.storage.local import LocalStorage
+
+class FakeDownloader:
+    def __init__(self, data: bytes, chunk_size: int):
+        self.data = data
+        self.chunk_size = chunk_size
+
+    def chunks(self):
+        for start in range(0, len(self.data), self.chunk_size):
+            yield self.data[start:start + self.chunk_size]
+
+    def readinto(self, stream):
+        for chunk in self.chunks():
+            stream.write(chunk)
+        return len(self.data)
+
+class FakeBlobClient:
+    """In-memory stand-in for the block blob API (single-shot and staged uploads, ranged downloads)."""
+    def __init__(self, container, name):
+        self.container = container
+        self.name = name
+
+    def upload_blob(self, data, overwrite=False, content_settings=None):
+        self.container.blobs[self.name] = bytes(data)
+        self.container.single_shot += 1
+
+    def stage_block(self, block_id, data, length=None):
+        with self.container.lock:
+            self.container.in_flight += len(data)
+            self.container.peak_in_flight = max(self.container.peak_in_flight, self.container.in_flight)
+        self.container.staged[(self.name, block_id)] = bytes(data)
+        with self.container.lock:
+            self.container.in_flight -= len(data)
+
+    def commit_block_list(self, block_ids, content_settings=None):
+        self.container.blobs[self.name] = b"".join(self.container.staged.pop((self.name, b)) for b in block_ids)
+        self.container.committed[self.name] = (block_ids, content_settings)
+
+    def download_blob(self, max_concurrency=1):
+        return FakeDownloader(self.container.blobs[self.name], config.STORAGE_CHUNK_SIZE)
+
+class FakeContainerClient:
+    def __init__(self):
+        self.blobs = {}
+        self.staged = {}
+        self.committed = {}
+        self.single_shot = 0
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def get_blob_client(self, name):
+        return FakeBlobClient(self, name)
+
+@pytest.fixture
+def storage(monkeypatch):
+    monkeypatch.setattr(config, "STORAGE_CHUNK_SIZE", 1024)
+    monkeypatch.setattr(config, "STORAGE_MAX_CONCURRENCY", 3)
+    monkeypatch.setattr(config, "STORAGE_SPOOL_THRESHOLD", 4096)
+    monkeypatch.setattr(azure, "ContentSettings", lambda **kwargs: kwargs)
+    monkeypatch.setattr(config, "AZURE_STORAGE_CONNECTION_STRING", None)
+    storage = AzureStorage()
+    storage.container_client = FakeContainerClient()
+    return storage
+
+def test_small_files_upload_in_one_request(storage):
+    storage.save_file(bytearray(b"small"), "a.pdf", content_type="application/pdf")
+    assert storage.container_client.blobs["a.pdf"] == b"small"
+    assert storage.container_client.single_shot == 1
+
+def test_large_files_are_staged_as_blocks_with_bounded_memory(storage, tmp_path):
+    data = os.urandom(10 * 1024 + 100)
+    path = tmp_path / "backup.tar.gz"
+    path.write_bytes(data)
+
+    storage.upload_from_file("backups/backup.tar.gz", str(path), content_type="application/gzip")
+
+    container = storage.container_client
+    assert container.blobs["backups/backup.tar.gz"] == data
+    block_ids, content_settings = container.committed["backups/backup.tar.gz"]
+    assert len(block_ids) == 11
+    assert bytes(content_settings["content_md5"]) == hashlib.md5(data).digest()
+    assert container.peak_in_flight <= config.STORAGE_CHUNK_SIZE * config.STORAGE_MAX_CONCURRENCY
+
+def test_bytes_and_short_reads_are_uploaded_intact(storage):
+    class Trickle(BytesIO):
+        def read(self, size=-1):
+            return super().read(min(size, 100) if size and size > 0 else size)
+
+    data = os.urandom(5000)
+    storage.save_file(data, "a.pdf")
+    storage.upload_from_file("b.pdf", Trickle(data))
+    assert storage.container_client.blobs["a.pdf"] == data
+    assert storage.container_client.blobs["b.pdf"] == data
+
+def test_downloads_spill_to_disk_past_the_threshold(storage):
+    small, large = os.urandom(1000), os.urandom(10000)
+    storage.container_client.blobs.update({"small.pdf": small, "large.pdf": large})
+
+    with storage.get_file_stream("small.pdf") as stream:
+        assert not stream._rolled
+        assert stream.read() == small
+    with storage.get_file_stream("large.pdf") as stream:
+        assert stream._rolled
+        assert stream.read() == large
+
+def test_download_to_file_and_chunks(storage, tmp_path):
+    data = os.urandom(3000)
+    storage.container_client.blobs["a.pdf"] = data
+    assert storage.download_to_file("a.pdf", str(tmp_path / "a.pdf"))
+    assert (tmp_path / "a.pdf").read_bytes() == data
+    chunks = list(storage.iter_file_chunks("a.pdf"))
+    assert b"".join(chunks) == data and max(len(c) for c in chunks) <= config.STORAGE_CHUNK_SIZE
+
+def test_local_storage_streams_files(tmp_path):
+    storage = LocalStorage(str(tmp_path / "files"))
+    source = tmp_path / "source.bin"
+    source.write_bytes(b"x" * 5000)
+    storage.upload_from_file("nested/copy.bin", str(source))
+    storage.upload_from_file("stream.bin", BytesIO(b"abc"))
+
+    out = BytesIO()
+    assert storage.download_to_file("nested/copy.bin", out)
+    assert out.getvalue() == b"x" * 5000
+    assert b"".join(storage.iter_file_chunks("stream.bin", chunk_size=2)) == b"abc"
+    assert storage.iter_file_chunks("missing.bin") is None
@@ -0,0 +1,95 @@
+import itertools
+import os
+import tarfile
+from datetime import datetime, timedelta
+import pytest
+from src.config import config
+from src.db import backup
+from src.db.backup import backup_chroma, decompressing_reader, list_manifests
+from src.storage.local import LocalStorage
+
+def archive_members(storage, manifest):
+    path = os.path.join(storage.base_dir, manifest["archive"])
+    with open(path, "rb") as raw, tarfile.open(fileobj=decompressing_reader(raw, manifest["compression"]), mode="r|") as tar:
+        return {member.name: tar.extractfile(member).read() for member in tar}
+
+def write(path, data: bytes, mtime_ns: int = None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+class SteppingClock:
+    """datetime stand-in that advances a second per call, so backups taken in a row get distinct names."""
+    ticks = itertools.count()
+
+    @classmethod
+    def now(cls):
+        return datetime(2026, 1, 1) + timedelta(seconds=next(cls.ticks))
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "BACKUP_FULL_EVERY", 7)
+    monkeypatch.setattr(backup, "datetime", SteppingClock)
+    data_dir = tmp_path / "chroma_db"
+    write(str(data_dir / "chroma.sqlite3"), b"db v1", 1_000_000_000)
+    write(str(data_dir / "segment" / "data_level0.bin"), b"vectors", 1_000_000_000)
+    write(str(data_dir / "segment" / "header.bin"), b"header", 1_000_000_000)
+    return LocalStorage(str(tmp_path / "backups")), str(data_dir)
+
+def test_full_backup_streams_every_file(setup):
+    storage, data_dir = setup
+    manifest = backup_chroma(storage, data_dir, compression="gzip")
+    assert manifest["type"] == "full" and manifest["base"] is None
+    assert archive_members(storage, manifest) == {
+        "chroma.sqlite3": b"db v1", "segment/data_level0.bin": b"vectors", "segment/header.bin": b"header"
+    }
+    assert list_manifests(storage) == [manifest["name"]]
+    assert all(entry.get("sha256") for entry in manifest["files"].values())
+
+def test_incremental_backup_ships_only_changes(setup):
+    storage, data_dir = setup
+    full = backup_chroma(storage, data_dir, compression="gzip")
+    assert backup_chroma(storage, data_dir, compression="gzip") is None  # nothing changed
+
+    write(os.path.join(data_dir, "chroma.sqlite3"), b"db v2", 2_000_000_000)
+    write(os.path.join(data_dir, "segment2", "data_level0.bin"), b"new vectors")
+    os.remove(os.path.join(data_dir, "segment", "header.bin"))
+
+    incremental = backup_chroma(storage, data_dir, compression="gzip")
+    assert incremental["type"] == "incremental" and incremental["base"] == full["name"]
+    assert incremental["chain_length"] == 1
+    assert archive_members(storage, incremental) == {
+        "chroma.sqlite3": b"db v2", "segment2/data_level0.bin": b"new vectors"
+    }
+    assert incremental["deleted"] == ["segment/header.bin"]
+    assert sorted(incremental["files"]) == ["chroma.sqlite3", "segment/data_level0.bin", "segment2/data_level0.bin"]
+    assert incremental["files"]["segment/data_level0.bin"] == full["files"]["segment/data_level0.bin"]
+
+def test_every_nth_backup_is_full(setup, monkeypatch):
+    storage, data_dir = setup
+    monkeypatch.setattr(config, "BACKUP_FULL_EVERY", 2)
+    kinds = []
+    for version in range(3):
+        write(os.path.join(data_dir, "chroma.sqlite3"), f"db v{version}".encode(), (version + 2) * 1_000_000_000)
+        kinds.append(backup_chroma(storage, data_dir, compression="gzip")["type"])
+    assert kinds == ["full", "incremental", "full"]
+
+def test_failed_archive_leaves_no_manifest(setup, monkeypatch):
+    storage, data_dir = setup
+
+    def broken_writer(raw, compression):
+        raise OSError("disk error")
+
+    monkeypatch.setattr(backup, "compressing_writer", broken_writer)
+    with pytest.raises(OSError):
+        backup_chroma(storage, data_dir, compression="gzip")
+    assert list_manifests(storage) == []
+
+def test_zstd_archives_round_trip(setup):
+    pytest.importorskip("zstandard")
+    storage, data_dir = setup
+    manifest = backup_chroma(storage, data_dir, compression="zstd")
+    assert manifest["archive"].endswith(".tar.zst")
+    assert archive_members(storage, manifest)["chroma.sqlite3"] == b"db v1"
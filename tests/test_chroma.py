@@ -0,0 +1,112 @@
+import sys
+import pytest
+from unittest.mock import MagicMock, patch
+
+sys.modules.setdefault("dotenv", MagicMock())
+sys.modules.setdefault("chromadb", MagicMock())
+sys.modules.setdefault("chromadb.config", MagicMock())
+sys.modules.setdefault("chromadb.utils", MagicMock())
+sys.modules.setdefault("chromadb.utils.embedding_functions", MagicMock())
+
+from src.db.chroma import ChromaConnectionManager
+from src.db.versions import CollectionVersionStore
+from src.db.hash_index import FileHashIndex
+
+@patch('src.db.chroma.LLMFactory')
+@patch('src.db.chroma.get_client')
+def test_collection_handle_is_cached(mock_get_client, mock_factory):
+    manager = ChromaConnectionManager()
+
+    first = manager.get_collection()
+    second = manager.get_collection()
+
+    assert first is second
+    mock_get_client.assert_called_once()
+    mock_factory.get_embedding_function.assert_called_once()
+    mock_get_client.return_value.heartbeat.assert_not_called()
+
+@patch('src.db.chroma.LLMFactory')
+@patch('src.db.chroma.get_client')
+def test_run_reconnects_after_failure(mock_get_client, mock_factory):
+    broken = MagicMock()
+    broken.get_or_create_collection.return_value.count.side_effect = ConnectionError("gone")
+    healthy = MagicMock()
+    healthy.get_or_create_collection.return_value.count.return_value = 7
+    mock_get_client.side_effect = [broken, healthy]
+
+    manager = ChromaConnectionManager()
+    result = manager.run(lambda collection: collection.count())
+
+    assert result == 7
+    assert mock_get_client.call_count == 2
+    assert manager.health()["healthy"] is True
+
+@patch('src.db.chroma.LLMFactory')
+@patch('src.db.chroma.get_client')
+def test_run_does_not_retry_rejected_requests(mock_get_client, mock_factory):
+    collection = mock_get_client.return_value.get_or_create_collection.return_value
+    collection.query.side_effect = ValueError("invalid where filter")
+
+    manager = ChromaConnectionManager()
+    with pytest.raises(ValueError):
+        manager.run(lambda collection: collection.query(where={"$bad": 1}))
+
+    assert collection.query.call_count == 1
+    mock_get_client.assert_called_once()
+
+@patch('src.db.chroma.LLMFactory')
+@patch('src.db.chroma.get_client')
+def test_check_health_records_failure(mock_get_client, mock_factory):
+    mock_get_client.return_value.heartbeat.side_effect = ConnectionError("down")
+
+    manager = ChromaConnectionManager()
+
+    assert manager.check_health() is False
+    assert "down" in manager.health()["last_error"]
+
+def test_collection_version_store_bumps_per_collection(tmp_path):
+    store = CollectionVersionStore(str(tmp_path / "versions.sqlite"))
+
+    assert store.get("moshavkb", "protocols") == 0
+    assert store.bump("moshavkb", "protocols") == 1
+    assert store.bump("moshavkb", "protocols") == 2
+    assert store.get("kehilatitkb", "protocols") == 0
+    assert CollectionVersionStore(str(tmp_path / "versions.sqlite")).get("moshavkb", "protocols") == 2
+
+def test_file_hash_index(tmp_path):
+    index = FileHashIndex(str(tmp_path / "hashes.sqlite"))
+
+    assert index.is_built("moshavkb", "protocols") is False
+    index.rebuild("moshavkb", "protocols", {"h1": "a.pdf", "h2": "b.pdf"})
+    assert index.is_built("moshavkb", "protocols") is True
+    assert index.get("moshavkb", "protocols", "h1") == "a.pdf"
+    assert index.get("kehilatitkb", "protocols", "h1") is None
+
+    index.put_many("moshavkb", "protocols", {"h3": "c.pdf"})
+    index.remove_filename("moshavkb", "protocols", "a.pdf")
+    assert index.get("moshavkb", "protocols", "h1") is None
+    assert index.get("moshavkb", "protocols", "h3") == "c.pdf"
+
+    index.invalidate("moshavkb", "protocols")
+    assert index.is_built("moshavkb", "protocols") is False
+
+def test_duplicate_check_uses_built_hash_index(tmp_path, monkeypatch):
+    from src.db import chroma
+    monkeypatch.setattr(chroma, "_hash_index", FileHashIndex(str(tmp_path / "hashes.sqlite")))
+    monkeypatch.setattr(chroma, "manager", MagicMock())
+    chroma.manager.run.return_value = {'metadatas': [{'file_hash': 'h1', 'filename': 'a.pdf'}, {'filename': 'no_hash.pdf'}]}
+
+    chroma.ensure_hash_index()
+    chroma.manager.run.reset_mock()
+
+    assert chroma.check_file_exists_by_hash('h1') == 'a.pdf'
+    assert chroma.check_file_exists_by_hash('h2') is None
+    chroma.manager.run.assert_not_called()
+
+def test_unreadable_collection_version_is_unknown(monkeypatch):
+    from src.db import chroma
+    broken = MagicMock()
+    broken.get.side_effect = OSError("database is locked")
+    monkeypatch.setattr(chroma, "_version_store", broken)
+
+    assert chroma.get_collection_version() is None
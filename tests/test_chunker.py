@@ -1,5 +1,6 @@
 import pytest
-from src.ingest.chunker import chunk_text
+import re
+from src.ingest.chunker import chunk_text, chunk_text_by_tokens
 
 def test_chunk_text_basic_fit():
     """Text shorter than chunk_size should be one chunk."""
@@ -170,3 +171,56 @@ def test_hebrew_text():
     # "שלום כיתה א"
     # "שלום כיתה ב."
     assert "שלום כיתה א" in chunks[0]
+
+def test_chunk_text_char_split_with_overlap():
+    """Character-level windows advance by chunk_size - overlap."""
+    chunks = chunk_text("abcdefghij", chunk_size=4, overlap=1)
+    assert chunks == ["abcd", "defg", "ghij"]
+
+def test_chunk_text_newline_runs():
+    """Runs of newlines split like str.split("\\n\\n") (left to right, non-overlapping)."""
+    chunks = chunk_text("aa\n\n\nbb\n\n\n\ncc", chunk_size=5, overlap=0)
+    assert chunks == ["aa", "\nbb\n\n", "cc"]
+
+def test_chunk_text_mixed_separators_with_overlap():
+    text = "one two. three four\nfive six seven"
+    chunks = chunk_text(text, chunk_size=12, overlap=5)
+    assert chunks == ["one two", "three four", "five six", "six seven"]
+
+def test_chunk_text_large_input_without_separators():
+    """Long text with no separators is windowed without per-character work."""
+    text = "א" * 1_000_000
+    chunks = chunk_text(text, chunk_size=1000, overlap=200)
+    assert len(chunks) == 1250
+    assert all(len(c) == 1000 for c in chunks[:-1])
+    assert chunks[-1] == text[999_200:]
+
+
+def word_offsets(text):
+    """Stand-in tokenizer: one token per word, including its trailing whitespace."""
+    return [m.start() for m in re.finditer(r"\S+\s*", text)]
+
+def test_chunk_text_by_tokens_window_sizes():
+    text = " ".join(f"w{i}" for i in range(100))
+    chunks = chunk_text_by_tokens(text, word_offsets, chunk_tokens=30, overlap_tokens=10)
+    assert all(len(word_offsets(c)) <= 30 for c in chunks)
+    assert chunks[0].split()[-10:] == chunks[1].split()[:10]
+    assert chunks[-1].split()[-1] == "w99"
+    # Every word is covered
+    assert set(" ".join(chunks).split()) == set(text.split())
+
+def test_chunk_text_by_tokens_prefers_line_breaks():
+    lines = [" ".join(f"l{j}w{i}" for i in range(9)) for j in range(10)]
+    text = "\n".join(lines)
+    chunks = chunk_text_by_tokens(text, word_offsets, chunk_tokens=20, overlap_tokens=2)
+    # Windows end after a full line instead of mid-line
+    assert chunks[0] == lines[0] + "\n" + lines[1] + "\n"
+
+def test_chunk_text_by_tokens_is_lossless_slicing():
+    text = "שלום עולם. " * 50
+    chunks = chunk_text_by_tokens(text, word_offsets, chunk_tokens=16, overlap_tokens=0)
+    assert "".join(chunks) == text
+
+def test_chunk_text_by_tokens_rejects_large_overlap():
+    with pytest.raises(ValueError):
+        chunk_text_by_tokens("a b c", word_offsets, chunk_tokens=5, overlap_tokens=5)
@@ -0,0 +1,59 @@
+from src.rag.context_builder import TokenCounter, join_with_overlap, dedupe_lines, pack_context
+
+class WordCounter(TokenCounter):
+    """One token per whitespace-separated word, for deterministic budgets."""
+    def __init__(self):
+        self.encoding = None
+
+    def count(self, text):
+        return len(text.split())
+
+    def truncate(self, text, max_tokens):
+        return " ".join(text.split()[:max_tokens])
+
+def _block(chunk, text):
+    return f"{chunk['metadata']['filename']} {text}"
+
+def test_join_with_overlap_removes_repeated_window():
+    first = "הוחלט לאשר את התקציב. הישיבה ננעלה בשעה 21:00"
+    second = "הישיבה ננעלה בשעה 21:00\nסעיף הבא"
+
+    assert join_with_overlap(first, second) == first + "\nסעיף הבא"
+    assert join_with_overlap("abc", "xyz") == "abc\nxyz"
+
+def test_dedupe_lines_skips_long_lines_seen_before():
+    seen = set()
+    dedupe_lines("שורה ארוכה מספיק כדי להיחשב כפולה\nקצר", seen)
+
+    assert dedupe_lines("שורה ארוכה מספיק כדי להיחשב כפולה\nקצר\nחדש", seen) == "קצר\nחדש"
+
+def test_pack_context_truncates_then_drops_tail():
+    chunks = [
+        {"metadata": {"filename": "a.pdf"}, "text": "one two three"},
+        {"metadata": {"filename": "b.pdf"}, "text": " ".join(["word"] * 500)},
+        {"metadata": {"filename": "c.pdf"}, "text": "never included"},
+    ]
+
+    packed = pack_context(chunks, token_budget=200, counter=WordCounter(), format_block=_block)
+
+    assert [chunk['metadata']['filename'] for chunk, _ in packed] == ["a.pdf", "b.pdf"]
+    assert len(packed[1][1].split()) == 200 - 4 - 1
+
+def test_token_counter_fallback_is_conservative():
+    counter = TokenCounter.__new__(TokenCounter)
+    counter.encoding = None
+
+    assert counter.count("שלום עולם") == 5
+    assert counter.truncate("abcdef", 2) == "abcd"
+
+def test_token_counter_estimates_when_the_encoding_cannot_load(monkeypatch):
+    from unittest.mock import MagicMock
+    from src.llm import tokens
+
+    offline = MagicMock()
+    offline.get_encoding.side_effect = OSError("could not download o200k_base")
+    monkeypatch.setattr(tokens, "tiktoken", offline)
+
+    counter = tokens.TokenCounter()
+    assert counter.encoding is None
+    assert counter.count("abcd") == 2
@@ -0,0 +1,28 @@
+from unittest.mock import MagicMock
+from src.llm.embedding_cache import EmbeddingCache, embed_with_cache, text_hash
+
+def test_cache_roundtrip(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    cache.put_many("model-a", {text_hash("שלום"): [0.5, -1.0, 2.0]})
+
+    assert cache.get_many("model-a", [text_hash("שלום")]) == {text_hash("שלום"): [0.5, -1.0, 2.0]}
+    assert cache.get_many("model-b", [text_hash("שלום")]) == {}
+
+def test_embed_with_cache_only_embeds_missing_texts(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    embedding_function = MagicMock(side_effect=lambda texts: [[float(len(t))] for t in texts])
+
+    first = embed_with_cache(["aa", "bbb", "aa"], embedding_function, "m", cache)
+    second = embed_with_cache(["aa", "bbb"], embedding_function, "m", cache)
+
+    assert first == [[2.0], [3.0], [2.0]]
+    assert second == [[2.0], [3.0]]
+    embedding_function.assert_called_once_with(["aa", "bbb"])
+
+def test_cache_survives_reopen(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    cache = EmbeddingCache(path)
+    cache.put_many("m", {"h": [1.0]})
+    cache.close()
+
+    assert EmbeddingCache(path).get_many("m", ["h"]) == {"h": [1.0]}
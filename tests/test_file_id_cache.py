@@ -0,0 +1,19 @@
+from src.query_bot.file_id_cache import TelegramFileIdCache
+
+def test_file_ids_are_scoped_by_bot_and_content_hash(tmp_path):
+    cache = TelegramFileIdCache(str(tmp_path / "file_ids.sqlite"))
+    cache.put(1, "protocol.pdf", "abc", "FILE_1")
+
+    assert cache.get(1, "protocol.pdf", "abc") == "FILE_1"
+    assert cache.get(2, "protocol.pdf", "abc") is None
+    assert cache.get(1, "protocol.pdf", "def") is None
+
+    cache.invalidate(1, "protocol.pdf", "abc")
+    assert cache.get(1, "protocol.pdf", "abc") is None
+
+def test_files_without_content_hash_are_not_cached(tmp_path):
+    cache = TelegramFileIdCache(str(tmp_path / "file_ids.sqlite"))
+    cache.put(1, "protocol.pdf", None, "OLD_VERSION")
+
+    assert cache.get(1, "protocol.pdf") is None
+    assert cache.get(1, "protocol.pdf", "") is None
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+import pytest
+from src.ingest.job_queue import IngestJobStore, IngestQueue, QueueFullError, StageLimits
+
+@pytest.fixture
+def store(tmp_path):
+    return IngestJobStore(str(tmp_path / "jobs.sqlite"), str(tmp_path / "spool"))
+
+def make_queue(store, process, events=None, **kwargs):
+    def notify(job, event, status, message):
+        if events is not None:
+            events.append((job["file_name"], event, status))
+    return IngestQueue(store, process, notify=notify, workers=1, limits=StageLimits({}),
+                       retry_base_delay=kwargs.pop("retry_base_delay", 0), **kwargs)
+
+def test_job_runs_and_spool_file_is_removed(store):
+    seen = []
+    events = []
+    queue = make_queue(store, lambda name, content, limits: seen.append((name, content)) or ("SUCCESS", None), events)
+    job_id = queue.submit("a.pdf", bytearray(b"pdf bytes"), chat_id=1, message_id=2)
+    payload_path = store.get(job_id)["payload_path"]
+    assert os.path.exists(payload_path)
+
+    queue.run_job(store.claim_next())
+
+    assert seen == [("a.pdf", b"pdf bytes")]
+    assert store.get(job_id)["status"] == "done"
+    assert store.get(job_id)["result_status"] == "SUCCESS"
+    assert not os.path.exists(payload_path)
+    assert [event for _, event, _ in events] == ["queued", "started", "finished"]
+    assert store.claim_next() is None
+
+def test_errors_are_retried_with_backoff_then_fail(store):
+    calls = []
+    def process(name, content, limits):
+        calls.append(name)
+        return "ERROR", "chroma down"
+
+    queue = make_queue(store, process, retry_base_delay=60, max_attempts=2)
+    job_id = queue.submit("a.pdf", b"x")
+
+    queue.run_job(store.claim_next())
+    assert store.get(job_id)["status"] == "queued"
+    # Backing off: not due yet
+    assert store.claim_next() is None
+
+    store._conn.execute("UPDATE jobs SET next_attempt_at = 0")
+    queue.run_job(store.claim_next())
+    job = store.get(job_id)
+    assert job["status"] == "failed" and job["attempts"] == 2
+    assert calls == ["a.pdf", "a.pdf"]
+
+def test_exceptions_are_retried(store):
+    results = [RuntimeError("boom"), ("SUCCESS", None)]
+    def process(name, content, limits):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    queue = make_queue(store, process)
+    job_id = queue.submit("a.pdf", b"x")
+    queue.run_job(store.claim_next())
+    queue.run_job(store.claim_next())
+    assert store.get(job_id)["result_status"] == "SUCCESS"
+
+def test_retry_clears_what_the_failed_attempt_left(store):
+    indexed = set()
+    cleared = []
+
+    def process(name, content, limits):
+        if name in indexed:
+            return "DUPLICATE_SAME_NAME", name
+        indexed.add(name)
+        if not cleared:
+            return "ERROR", "second batch failed"  # first batch stays indexed
+        return "SUCCESS", None
+
+    def on_retry(name, content):
+        cleared.append((name, content))
+        indexed.discard(name)
+
+    queue = make_queue(store, process, on_retry=on_retry)
+    job_id = queue.submit("a.pdf", b"x")
+    queue.run_job(store.claim_next())
+    assert cleared == []
+    queue.run_job(store.claim_next())
+
+    assert cleared == [("a.pdf", b"x")]
+    assert store.get(job_id)["result_status"] == "SUCCESS"
+
+def test_interrupted_jobs_resume_after_restart(tmp_path, store):
+    job_id = store.enqueue("a.pdf", b"x")
+    assert store.claim_next()["id"] == job_id
+    # Process dies here; a new store over the same database picks the job up again
+    reopened = IngestJobStore(str(tmp_path / "jobs.sqlite"), str(tmp_path / "spool"))
+    assert reopened.requeue_running() == 1
+    job = reopened.claim_next()
+    assert job["id"] == job_id and job["attempts"] == 2
+
+def test_tenants_sharing_the_database_only_see_their_own_jobs(tmp_path):
+    moshav = IngestJobStore(str(tmp_path / "jobs.sqlite"), tenant="moshavkb", collection="protocols")
+    kehilati = IngestJobStore(str(tmp_path / "jobs.sqlite"), tenant="kehilatitkb", collection="protocols")
+    job_id = moshav.enqueue("a.pdf", b"x")
+
+    assert kehilati.claim_next() is None
+    assert kehilati.pending_count() == 0
+    assert moshav.claim_next()["id"] == job_id
+    assert kehilati.requeue_running() == 0
+    assert moshav.requeue_running() == 1
+    assert moshav.spool_dir != kehilati.spool_dir
+
+def test_submit_refuses_beyond_max_pending(store):
+    queue = make_queue(store, lambda *args: ("SUCCESS", None), max_pending=2)
+    queue.submit("a.pdf", b"x")
+    queue.submit("b.pdf", b"x")
+    with pytest.raises(QueueFullError):
+        queue.submit("c.pdf", b"x")
+
+def test_stage_limits_bound_concurrency():
+    limits = StageLimits({"ocr": 1})
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def work():
+        nonlocal active, peak
+        with limits.stage("ocr"):
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.02)
+            with lock:
+                active -= 1
+        # Unlimited stage
+        with limits.stage("parse"):
+            pass
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak == 1
+
+def test_workers_drain_the_queue(store):
+    done = threading.Event()
+    processed = []
+    def process(name, content, limits):
+        processed.append(name)
+        if len(processed) == 3:
+            done.set()
+        return "SUCCESS", None
+
+    queue = IngestQueue(store, process, workers=2, limits=StageLimits({}))
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        queue.submit(name, b"x")
+    queue.start()
+    try:
+        assert done.wait(5)
+    finally:
+        queue.stop(timeout=5)
+    assert sorted(processed) == ["a.pdf", "b.pdf", "c.pdf"]
+    assert store.pending_count() == 0
@@ -0,0 +1,34 @@
+import json
+from src.rag.json_stream import AnswerStreamParser
+
+def _feed_all(parser, payload, step):
+    partials = []
+    for i in range(0, len(payload), step):
+        partials.append(parser.feed(payload[i:i + step]))
+    return partials
+
+def test_streams_answer_prefixes_and_final_result():
+    payload = json.dumps({"answer": "שלום \"חברים\"\nהוחלט 😀", "sources": ["a.pdf"]})
+    parser = AnswerStreamParser()
+
+    partials = _feed_all(parser, payload, 3)
+
+    assert parser.complete
+    assert partials[-1] == "שלום \"חברים\"\nהוחלט 😀"
+    for earlier, later in zip(partials, partials[1:]):
+        assert later.startswith(earlier)
+    assert parser.result() == {"answer": "שלום \"חברים\"\nהוחלט 😀", "sources": ["a.pdf"]}
+
+def test_holds_back_split_escapes():
+    parser = AnswerStreamParser()
+
+    assert parser.feed('{"answer": "ab\\') == "ab"
+    assert parser.feed('u05') == "ab"
+    assert parser.feed('e9 c') == "abש c"
+
+def test_sources_before_answer_and_invalid_json_fallback():
+    parser = AnswerStreamParser()
+    parser.feed('{"sources": ["x.pdf"], "answer": "תשובה')
+
+    assert parser.answer == "תשובה"
+    assert parser.result() == {"answer": "תשובה", "sources": []}
@@ -0,0 +1,104 @@
+import sys
+import threading
+import time
+from unittest.mock import MagicMock
+
+sys.modules.setdefault("dotenv", MagicMock())
+
+from src.config import config
+from src.rag import lexical
+from src.rag.lexical import BM25Index, normalize_hebrew, strip_prefixes, tokenize, reciprocal_rank_fusion
+
+def test_normalize_hebrew_strips_niqqud_and_final_letters():
+    assert normalize_hebrew("שָׁלוֹם") == "שלומ"
+    assert normalize_hebrew("Plot ABC") == "plot abc"
+
+def test_strip_prefixes_keeps_short_words():
+    assert strip_prefixes("וההחלטה") == "החלטה"
+    assert strip_prefixes("משה") == "משה"
+
+def test_tokenize_emits_surface_and_stem():
+    assert tokenize("בישיבה") == ["בישיבה", "ישיבה"]
+
+def test_bm25_matches_prefixed_forms_and_exact_numbers():
+    index = BM25Index()
+    index.add("a", "הוחלט על הקצאת מגרש 112 למשפחת כהן")
+    index.add("b", "דיון בתקציב הוועד ובמיסים")
+    index.add("c", "החלטה לגבי המגרש של משפחת לוי")
+
+    assert index.search("מגרש 112")[0][0] == "a"
+    assert index.search("התקציב")[0][0] == "b"
+
+def test_bm25_remove_drops_document():
+    index = BM25Index()
+    index.add("a", "פרוטוקול ישיבה")
+    index.remove("a")
+
+    assert len(index) == 0
+    assert index.search("פרוטוקול") == []
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["x", "y", "z"], ["y", "w"]])
+
+    assert fused[0] == "y"
+    assert set(fused) == {"x", "y", "z", "w"}
+
+class SlowCollection:
+    """Collection whose chunk fetches block until released."""
+    def __init__(self, docs):
+        self.docs = docs
+        self.fetching = threading.Event()
+        self.release = threading.Event()
+
+    def count(self):
+        return len(self.docs)
+
+    def get(self, ids=None, include=None):
+        if ids is None:
+            return {"ids": list(self.docs)}
+        self.fetching.set()
+        self.release.wait(5)
+        return {"ids": ids, "documents": [self.docs[i] for i in ids], "metadatas": [{} for _ in ids]}
+
+def test_concurrent_sync_waits_for_the_running_build(monkeypatch):
+    monkeypatch.setattr(config, "TENANT_NAME", "sync-test")
+    monkeypatch.setattr(config, "LEXICAL_SYNC_INTERVAL", 60)
+    collection = SlowCollection({"a": "פרוטוקול ישיבה", "b": "דיון בתקציב"})
+    results = {}
+
+    first = threading.Thread(target=lambda: results.setdefault("first", lexical.sync_index(collection)))
+    first.start()
+    assert collection.fetching.wait(5)
+    second = threading.Thread(target=lambda: results.setdefault("second", lexical.sync_index(collection)))
+    second.start()
+    time.sleep(0.1)
+    assert "second" not in results  # not served a half-built index
+    collection.release.set()
+    first.join(5)
+    second.join(5)
+
+    assert len(results["second"]) == 2
+    assert results["second"] is lexical.get_index()
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def get(self, ids=None, include=None):
+        if ids is None:
+            return {"ids": list(self.docs)}
+        return {"ids": ids, "documents": [self.docs[i] for i in ids], "metadatas": [{} for _ in ids]}
+
+def test_text_reupserted_under_the_same_id_is_picked_up(monkeypatch):
+    monkeypatch.setattr(config, "TENANT_NAME", "reupsert-test")
+    monkeypatch.setattr(config, "LEXICAL_SYNC_INTERVAL", 0)
+    collection = FakeCollection({"a.pdf_part_0": "פרוטוקול ישיבה", "b.pdf_part_0": "דיון בתקציב"})
+    assert lexical.sync_index(collection, version=1).search("פרוטוקול")[0][0] == "a.pdf_part_0"
+
+    # Re-indexed by another process: same IDs and count, new text
+    collection.docs["a.pdf_part_0"] = "הקצאת מגרש 112"
+    assert lexical.sync_index(collection, version=1).get("a.pdf_part_0")["text"] == "פרוטוקול ישיבה"
+    index = lexical.sync_index(collection, version=2)
+    assert index.search("מגרש")[0][0] == "a.pdf_part_0"
+    assert index.search("פרוטוקול") == []
+    assert index.get("a.pdf_part_0")["text"] == "הקצאת מגרש 112"
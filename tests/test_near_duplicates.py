@@ -0,0 +1,53 @@
+import random
+import pytest
+from src.config import config
+from src.ingest import near_duplicates
+from src.ingest.near_duplicates import NearDuplicateIndex, document_signature, estimate_similarity, shingles
+
+WORDS = ["ועד", "המושב", "החליט", "לאשר", "תקציב", "כביש", "גישה", "חברי", "אגודה", "ישיבה", "פרוטוקול",
+         "מים", "חקלאות", "בריכה", "גן", "ילדים", "הצבעה", "רוב", "נגד", "בעד", "דיון", "הנהלה"]
+
+def make_text(seed, words=600):
+    rnd = random.Random(seed)
+    return " ".join(rnd.choice(WORDS) + str(rnd.randrange(50)) for _ in range(words))
+
+@pytest.fixture(autouse=True)
+def local_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "NEAR_DUPLICATE_THRESHOLD", 0.85)
+    monkeypatch.setattr(near_duplicates, "_index", None)
+
+def test_shingles_ignore_niqqud_and_final_letters():
+    assert shingles("שָׁלוֹם לכם חברים יקרים מאד") == shingles("שלום לכמ חברים יקרים מאד")
+
+def test_reexported_document_is_similar_and_other_documents_are_not():
+    original = make_text(1)
+    # A re-scan: a few OCR differences and a changed header
+    words = original.split()
+    for i in range(0, len(words), 100):
+        words[i] = "שגיאה"
+    rescanned = "כותרת חדשה " + " ".join(words)
+
+    signature = document_signature([original])
+    assert estimate_similarity(signature, document_signature([rescanned])) > 0.85
+    assert estimate_similarity(signature, document_signature([make_text(2)])) < 0.2
+
+def test_index_finds_near_duplicates_and_drops_stale_entries():
+    original = make_text(3)
+    near_duplicates.record("protocol.pdf", "h1", document_signature([original]))
+    near_duplicates.record("other.pdf", "h2", document_signature([make_text(4)]))
+
+    pages = [original[:len(original) // 2], original[len(original) // 2:]]
+    filename, similarity = near_duplicates.find_near_duplicate(document_signature(pages))
+    assert filename == "protocol.pdf" and similarity > 0.85
+
+    assert near_duplicates.find_near_duplicate(document_signature([original]), exists=lambda f, h: False) is None
+    # The stale entry was removed
+    assert near_duplicates.find_near_duplicate(document_signature([original])) is None
+
+def test_index_persists(tmp_path):
+    signature = document_signature([make_text(5)])
+    NearDuplicateIndex(str(tmp_path / "nd.sqlite")).add("t", "c", "a.pdf", "h", signature)
+    matches = NearDuplicateIndex(str(tmp_path / "nd.sqlite")).query("t", "c", signature, 0.9)
+    assert matches == [("a.pdf", "h", 1.0)]
+    assert NearDuplicateIndex(str(tmp_path / "nd.sqlite")).query("t", "other", signature, 0.9) == []
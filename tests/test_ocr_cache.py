@@ -0,0 +1,53 @@
+from io import BytesIO
+import pytest
+from src.config import config
+from src.ocr import cache as ocr_cache
+from src.ocr.cache import OcrResultCache, load_ocr_result, ocr_page_texts
+
+class FakeStorage:
+    def __init__(self, files=None, metadata=None):
+        self.files = files or {}
+        self.metadata = metadata or {}
+        self.reads = []
+
+    def get_metadata(self, filename):
+        return self.metadata.get(filename, {})
+
+    def get_file_stream(self, filename):
+        self.reads.append(filename)
+        return BytesIO(self.files[filename]) if filename in self.files else None
+
+@pytest.fixture(autouse=True)
+def local_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "OCR_CACHE_ENABLED", True)
+    monkeypatch.setattr(ocr_cache, "_ocr_cache", None)
+
+def test_cache_round_trip(tmp_path):
+    cache = OcrResultCache(str(tmp_path / "ocr.sqlite"))
+    assert cache.get("abc") is None
+    cache.put("abc", "טקסט", "2,3")
+    assert cache.get("abc") == {"text": "טקסט", "ocr_pages": "2,3"}
+
+def test_sidecar_is_loaded_once_then_served_from_cache():
+    storage = FakeStorage(
+        files={"scan.pdf.txt": "עמוד שני\fעמוד חמישי".encode("utf-8")},
+        metadata={"scan.pdf": {"ocr": "true", "ocr_pages": "2,5"}}
+    )
+    result = load_ocr_result(storage, "scan.pdf", "hash1")
+    assert ocr_page_texts(result) == {2: "עמוד שני", 5: "עמוד חמישי"}
+
+    storage.files.clear()
+    assert load_ocr_result(storage, "scan.pdf", "hash1") == result
+    assert storage.reads == ["scan.pdf.txt"]
+
+def test_whole_file_sidecar_has_no_pages():
+    storage = FakeStorage(files={"old.pdf.txt": b"full text"}, metadata={"old.pdf": {"ocr": "true"}})
+    result = load_ocr_result(storage, "old.pdf", "hash2")
+    assert result["text"] == "full text"
+    assert ocr_page_texts(result) is None
+
+def test_files_without_ocr_are_not_read():
+    storage = FakeStorage(files={"typed.pdf.txt": b"stale"})
+    assert load_ocr_result(storage, "typed.pdf", "hash3") is None
+    assert storage.reads == []
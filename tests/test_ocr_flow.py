@@ -30,16 +30,21 @@ sys.modules["botocore"] = MagicMock()
 sys.modules["botocore.exceptions"] = MagicMock()
 sys.modules["botocore.config"] = MagicMock()
 
-from src.ingest_bot.handlers import process_document
+from src.ingest_bot.handlers import process_document, _clear_failed_attempt
+from src.ocr.document_intelligence import OCRError
+from src.config import config
 
 class TestOCRFlow(unittest.TestCase):
+    @patch('src.ingest_bot.handlers.near_duplicates')
+    @patch('src.ingest_bot.handlers.remember_ocr_result')
+    @patch('src.ingest_bot.handlers.cached_ocr_result', return_value=None)
     @patch('src.ingest_bot.handlers.create_documents_from_chunks')
-    @patch('src.ingest_bot.handlers.chunk_text')
+    @patch('src.ingest_bot.handlers.split_text')
     @patch('src.ingest_bot.handlers.storage')
     @patch('src.ingest_bot.handlers.doc_intel_client')
     @patch('src.ingest_bot.handlers.chroma')
-    @patch('src.ingest_bot.handlers.parse_pdf')
-    def test_ocr_fallback(self, mock_parse_pdf, mock_chroma, mock_doc_intel, mock_storage, mock_chunk_text, mock_create_docs):
+    @patch('src.ingest_bot.handlers.iter_pdf_documents')
+    def test_ocr_fallback(self, mock_parse_pdf, mock_chroma, mock_doc_intel, mock_storage, mock_chunk_text, mock_create_docs, mock_load_ocr, mock_remember_ocr, mock_near_duplicates):
         # Setup
         file_name = "scanned.pdf"
         file_content = b"fake_pdf_content"
@@ -47,8 +52,8 @@ class TestOCRFlow(unittest.TestCase):
         # Mock Check Existence (New file)
         mock_chroma.check_file_exists_by_hash.return_value = None
         
-        # Mock Parse PDF (Returns empty - triggering OCR)
-        mock_parse_pdf.return_value = []
+        # Mock Parse PDF (Yields nothing - triggering OCR)
+        mock_parse_pdf.return_value = iter([])
         
         # Mock Metadata Check (No OCR yet)
         mock_storage.get_metadata.return_value = {}
@@ -56,6 +61,9 @@ class TestOCRFlow(unittest.TestCase):
         # Mock Document Intelligence (Returns text)
         mock_doc_intel.extract_text.return_value = "Extracted Hebrew Text"
 
+        # Mock Near-duplicate check (nothing similar indexed)
+        mock_near_duplicates.find_near_duplicate.return_value = None
+
         # Mock Chunker
         mock_chunk_text.return_value = ["Extracted Hebrew Text"]
         
@@ -80,6 +88,9 @@ class TestOCRFlow(unittest.TestCase):
         
         # Verify Metadata Updated
         mock_storage.update_metadata.assert_called_with("scanned.pdf", {'ocr': 'true'})
+
+        # Verify OCR result cached by content hash
+        mock_remember_ocr.assert_called_once_with(ANY, "Extracted Hebrew Text", "")
         
         # Verify Chroma Indexing
         mock_chroma.add_document.assert_called_once()
@@ -87,6 +98,117 @@ class TestOCRFlow(unittest.TestCase):
         self.assertEqual(args[0]['text'], "Extracted Hebrew Text")
         self.assertEqual(args[0]['metadata']['ocr'], "true")
 
+    @patch('src.ingest_bot.handlers.near_duplicates')
+    @patch('src.ingest_bot.handlers.cached_ocr_result', return_value=None)
+    @patch('src.ingest_bot.handlers.storage')
+    @patch('src.ingest_bot.handlers.doc_intel_client')
+    @patch('src.ingest_bot.handlers.chroma')
+    @patch('src.ingest_bot.handlers.iter_pdf_documents')
+    def test_index_failure_does_not_fall_back_to_ocr(self, mock_parse_pdf, mock_chroma, mock_doc_intel, mock_storage, mock_load_ocr, mock_near_duplicates):
+        mock_chroma.check_file_exists_by_hash.return_value = None
+        mock_parse_pdf.return_value = iter([{'text': "Text layer", 'metadata': {}, 'id': 't.pdf_part_0'}])
+        mock_near_duplicates.find_near_duplicate.return_value = None
+        mock_chroma.add_document.side_effect = ConnectionError("embedding service unavailable")
+
+        status, msg = process_document("t.pdf", b"fake_pdf_content")
+
+        # Reported as an error (retried by the ingest queue), not OCR'd and indexed as a scan
+        self.assertEqual(status, "ERROR")
+        self.assertIn("embedding service unavailable", msg)
+        mock_doc_intel.extract_text.assert_not_called()
+        self.assertNotIn("t.pdf.txt", [c.args[1] for c in mock_storage.save_file.call_args_list])
+
+    @patch('src.ingest_bot.handlers.near_duplicates')
+    @patch('src.ingest_bot.handlers.cached_ocr_result', return_value=None)
+    @patch('src.ingest_bot.handlers.storage')
+    @patch('src.ingest_bot.handlers.doc_intel_client')
+    @patch('src.ingest_bot.handlers.chroma')
+    @patch('src.ingest_bot.handlers.iter_pdf_documents')
+    def test_replaced_document_is_removed_only_after_indexing(self, mock_parse_pdf, mock_chroma, mock_doc_intel, mock_storage, mock_load_ocr, mock_near_duplicates):
+        mock_chroma.check_file_exists_by_hash.return_value = None
+        mock_near_duplicates.find_near_duplicate.return_value = ("old.pdf", 0.95)
+
+        mock_parse_pdf.return_value = iter([{'text': "Text layer", 'metadata': {}, 'id': 'new.pdf_part_0'}])
+        mock_chroma.add_document.side_effect = ConnectionError("embedding service unavailable")
+        status, _ = process_document("new.pdf", b"fake_pdf_content", near_duplicate_policy="replace")
+        self.assertEqual(status, "ERROR")
+        mock_chroma.delete_documents_by_filename.assert_not_called()
+        mock_storage.delete_file.assert_not_called()
+
+        mock_parse_pdf.return_value = iter([{'text': "Text layer", 'metadata': {}, 'id': 'new.pdf_part_0'}])
+        mock_chroma.add_document.side_effect = None
+        status, replaced = process_document("new.pdf", b"fake_pdf_content", near_duplicate_policy="replace")
+        self.assertEqual((status, replaced), ("REPLACED", "old.pdf"))
+        mock_chroma.delete_documents_by_filename.assert_called_once_with("old.pdf")
+        mock_storage.delete_file.assert_any_call("old.pdf")
+
+    @patch('src.ingest_bot.handlers.near_duplicates')
+    @patch('src.ingest_bot.handlers.remember_ocr_result')
+    @patch('src.ingest_bot.handlers.ocr_low_text_pages', side_effect=OCRError("pages 11-20 failed"))
+    @patch('src.ingest_bot.handlers.cached_ocr_result', return_value=None)
+    @patch('src.ingest_bot.handlers.storage')
+    @patch('src.ingest_bot.handlers.chroma')
+    @patch('src.ingest_bot.handlers.iter_pdf_documents')
+    def test_failed_partial_ocr_fails_the_job(self, mock_parse_pdf, mock_chroma, mock_storage, mock_load_ocr, mock_ocr_pages, mock_remember_ocr, mock_near_duplicates):
+        mock_chroma.check_file_exists_by_hash.return_value = None
+
+        status, msg = process_document("scanned.pdf", b"fake_pdf_content")
+
+        self.assertEqual(status, "ERROR")
+        mock_remember_ocr.assert_not_called()
+        mock_storage.save_file.assert_not_called()
+        mock_chroma.add_document.assert_not_called()
+
+    @patch.object(config, 'INGEST_BATCH_SIZE', 1)
+    @patch.object(config, 'NEAR_DUPLICATE_POLICY', "off")
+    @patch('src.ingest_bot.handlers.near_duplicates')
+    @patch('src.ingest_bot.handlers.remember_ocr_result')
+    @patch('src.ingest_bot.handlers.cached_ocr_result', return_value=None)
+    @patch('src.ingest_bot.handlers.create_documents_from_chunks')
+    @patch('src.ingest_bot.handlers.split_text')
+    @patch('src.ingest_bot.handlers.storage')
+    @patch('src.ingest_bot.handlers.doc_intel_client')
+    @patch('src.ingest_bot.handlers.chroma')
+    @patch('src.ingest_bot.handlers.iter_pdf_documents')
+    def test_failed_ocr_batch_is_discarded_and_retry_indexes(self, mock_parse_pdf, mock_chroma, mock_doc_intel, mock_storage, mock_chunk_text, mock_create_docs, mock_load_ocr, mock_remember_ocr, mock_near_duplicates):
+        mock_chroma.check_file_exists_by_hash.return_value = None
+        mock_parse_pdf.side_effect = lambda *args, **kwargs: iter([])
+        mock_doc_intel.extract_text.return_value = "Extracted Hebrew Text"
+        mock_chunk_text.return_value = ["part 1", "part 2"]
+        mock_create_docs.return_value = [
+            {'text': "part 1", 'metadata': {'ocr': 'true'}, 'id': 'scanned.pdf_part_0'},
+            {'text': "part 2", 'metadata': {'ocr': 'true'}, 'id': 'scanned.pdf_part_1'},
+        ]
+
+        # The second batch fails: the first one is removed and the hash is not recorded
+        mock_chroma.add_document.side_effect = [None, ConnectionError("upsert failed")]
+        status, _ = process_document("scanned.pdf", b"fake_pdf_content")
+        self.assertEqual(status, "ERROR")
+        mock_chroma.delete_documents_by_filename.assert_called_once_with("scanned.pdf")
+        mock_chroma.record_file_hash.assert_not_called()
+        self.assertTrue(all(not c.kwargs.get('index_hashes', True) for c in mock_chroma.add_document.call_args_list))
+
+        # The retry indexes the whole file
+        mock_chroma.add_document.side_effect = None
+        mock_chroma.add_document.reset_mock()
+        status, _ = process_document("scanned.pdf", b"fake_pdf_content")
+        self.assertEqual(status, "SUCCESS")
+        self.assertEqual(mock_chroma.add_document.call_count, 2)
+        mock_chroma.record_file_hash.assert_called_once_with(ANY, "scanned.pdf")
+
+    @patch('src.ingest_bot.handlers.chroma')
+    def test_retry_removes_leftovers_of_the_same_content_only(self, mock_chroma):
+        mock_chroma.check_file_exists_by_hash.return_value = "a.pdf"
+        _clear_failed_attempt("a.pdf", b"content")
+        mock_chroma.delete_documents_by_filename.assert_called_once_with("a.pdf")
+
+        # An older version under the same name, or the content under another name, stays
+        mock_chroma.reset_mock()
+        mock_chroma.check_file_exists_by_hash.return_value = None
+        _clear_failed_attempt("a.pdf", b"content")
+        mock_chroma.check_file_exists_by_hash.return_value = "b.pdf"
+        _clear_failed_attempt("a.pdf", b"content")
+        mock_chroma.delete_documents_by_filename.assert_not_called()
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,91 @@
+import threading
+import time
+from types import SimpleNamespace
+from io import BytesIO
+import pytest
+from src.config import config
+from src.ocr import document_intelligence
+from src.ocr.document_intelligence import DocumentIntelligenceWrapper, OCRError
+from src.ocr.parallel import page_ranges, call_with_retries, map_in_parallel
+
+class Throttled(Exception):
+    status_code = 429
+
+class FakeAnalysisClient:
+    """Local stand-in for DocumentAnalysisClient. Documents are b"first-last" page ranges."""
+    def __init__(self, throttle_first=0, delay=0.02):
+        self.throttle_first = throttle_first
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def begin_analyze_document(self, model_id, document):
+        with self.lock:
+            self.calls += 1
+            if self.calls <= self.throttle_first:
+                raise Throttled("Too Many Requests")
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        first, last = map(int, document.read().decode().split("-"))
+        content = "".join(f"page {n}\n" for n in range(first, last + 1))
+        pages = []
+        offset = 0
+        for index, n in enumerate(range(first, last + 1), start=1):
+            length = len(f"page {n}\n")
+            pages.append(SimpleNamespace(page_number=index, spans=[SimpleNamespace(offset=offset, length=length)], lines=[]))
+            offset += length
+        return SimpleNamespace(result=lambda: SimpleNamespace(content=content, pages=list(reversed(pages))))
+
+@pytest.fixture
+def ocr_config(monkeypatch):
+    monkeypatch.setattr(config, "OCR_PAGE_RANGE_SIZE", 10)
+    monkeypatch.setattr(config, "OCR_CONCURRENCY", 3)
+    monkeypatch.setattr(config, "OCR_MAX_RETRIES", 3)
+    monkeypatch.setattr(config, "OCR_RETRY_BASE_DELAY", 0.0)
+    # The stand-in "PDF" is the page range itself
+    monkeypatch.setattr(document_intelligence, "count_pdf_pages", lambda data: int(data.decode().split("-")[1]))
+    monkeypatch.setattr(document_intelligence, "split_pdf", lambda data, ranges: [f"{a}-{b}".encode() for a, b in ranges])
+
+def test_page_ranges():
+    assert page_ranges(25, 10) == [(1, 10), (11, 20), (21, 25)]
+    assert page_ranges(0, 10) == []
+
+def test_extract_pages_in_parallel_keeps_page_order(ocr_config):
+    client = FakeAnalysisClient()
+    pages = DocumentIntelligenceWrapper(client=client).extract_pages(BytesIO(b"1-95"))
+    assert pages == [f"page {n}\n" for n in range(1, 96)]
+    assert client.calls == 10
+    assert 1 < client.max_in_flight <= 3
+
+def test_extract_pages_retries_throttled_ranges(ocr_config):
+    client = FakeAnalysisClient(throttle_first=2)
+    pages = DocumentIntelligenceWrapper(client=client).extract_pages(BytesIO(b"1-30"))
+    assert pages == [f"page {n}\n" for n in range(1, 31)]
+
+def test_failed_range_fails_the_extraction(ocr_config, monkeypatch):
+    monkeypatch.setattr(config, "OCR_MAX_RETRIES", 0)
+    client = FakeAnalysisClient(throttle_first=1)
+    with pytest.raises(OCRError):
+        DocumentIntelligenceWrapper(client=client).extract_pages(BytesIO(b"1-15"))
+
+def test_small_document_is_one_request(ocr_config):
+    client = FakeAnalysisClient()
+    assert DocumentIntelligenceWrapper(client=client).extract_pages(BytesIO(b"1-4")) == [f"page {n}\n" for n in range(1, 5)]
+    assert client.calls == 1
+
+def test_call_with_retries_gives_up_on_other_errors():
+    calls = []
+    def operation():
+        calls.append(1)
+        raise ValueError("bad document")
+    with pytest.raises(ValueError):
+        call_with_retries(operation, max_retries=3, base_delay=0, sleep=lambda s: None)
+    assert len(calls) == 1
+
+def test_map_in_parallel_preserves_order():
+    assert map_in_parallel(lambda x: x * x, list(range(20)), concurrency=4) == [x * x for x in range(20)]
@@ -0,0 +1,53 @@
+import re
+from src.ingest.parser import iter_page_chunks, iter_pdf_pages, iter_batches, split_text
+
+def make_pages(count, paragraphs=3):
+    return [
+        (n, "\n\n".join(f"עמוד {n} פסקה {p} " + "מילה " * 40 for p in range(paragraphs)))
+        for n in range(1, count + 1)
+    ]
+
+def assert_pages_within(chunk, page_start, page_end):
+    for page in re.findall(r"עמוד (\d+) ", chunk):
+        assert page_start <= int(page) <= page_end
+
+def test_small_document_matches_whole_text_chunking():
+    pages = make_pages(3)
+    whole = "".join(text + "\n" for _, text in pages)
+    chunks = [chunk for chunk, _, _ in iter_page_chunks(iter(pages), "chars")]
+    assert chunks == split_text(whole, "chars")
+
+def test_page_ranges_follow_chunk_positions():
+    pages = make_pages(5)
+    results = list(iter_page_chunks(iter(pages), "chars"))
+    for chunk, page_start, page_end in results:
+        assert 1 <= page_start <= page_end <= 5
+        assert_pages_within(chunk, page_start, page_end)
+    assert results[0][1] == 1
+    assert results[-1][2] == 5
+    # Page ranges never go backwards
+    starts = [page_start for _, page_start, _ in results]
+    assert starts == sorted(starts)
+
+def test_bounded_buffer_covers_every_page():
+    pages = make_pages(40)
+    results = list(iter_page_chunks(iter(pages), "chars", buffer_chars=3000))
+    text = " ".join(chunk for chunk, _, _ in results)
+    for n, _ in pages:
+        for p in range(3):
+            assert f"עמוד {n} פסקה {p} " in text
+    for chunk, page_start, page_end in results:
+        assert_pages_within(chunk, page_start, page_end)
+
+def test_iter_batches():
+    assert list(iter_batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(iter_batches([], 3)) == []
+
+def test_iter_pdf_pages_uses_ocr_text_for_scanned_pages():
+    class Page:
+        def __init__(self, text):
+            self.text = text
+        def get_text(self):
+            return self.text
+    doc = [Page("typed"), Page(""), Page("typed too")]
+    assert list(iter_pdf_pages(doc, {2: "scanned"})) == [(1, "typed"), (2, "scanned"), (3, "typed too")]
@@ -0,0 +1,55 @@
+from unittest.mock import MagicMock
+import pytest
+from src.ocr import partial
+from src.ocr.document_intelligence import OCRError
+from src.ocr.partial import find_low_text_pages, ocr_low_text_pages, format_ocr_pages, parse_ocr_pages
+
+class FakePage:
+    def __init__(self, text):
+        self.text = text
+
+    def get_text(self):
+        return self.text
+
+class FakeDoc(list):
+    def close(self):
+        pass
+
+def make_doc():
+    return FakeDoc([FakePage("פרוטוקול ישיבת ועד " * 5), FakePage(" \n "), FakePage("חתימות"), FakePage("סיכום " * 10)])
+
+def test_find_low_text_pages():
+    assert find_low_text_pages(make_doc(), min_chars=10) == [2, 3]
+    assert find_low_text_pages(make_doc(), min_chars=1) == [2]
+
+def test_ocr_low_text_pages_sends_only_scanned_pages(monkeypatch):
+    monkeypatch.setattr(partial.fitz, "open", lambda *args, **kwargs: make_doc(), raising=False)
+    built = {}
+    def fake_build(doc, page_numbers):
+        built["pages"] = page_numbers
+        return b"sub-pdf"
+    monkeypatch.setattr(partial, "build_sub_pdf", fake_build)
+
+    client = MagicMock()
+    client.extract_pages.return_value = ["נספח סרוק", "חתימות הוועד"]
+
+    assert ocr_low_text_pages(b"pdf", client, min_chars=10) == {2: "נספח סרוק", 3: "חתימות הוועד"}
+    assert built["pages"] == [2, 3]
+    assert client.extract_pages.call_args[0][0].getvalue() == b"sub-pdf"
+
+def test_ocr_low_text_pages_fails_on_mismatched_result(monkeypatch):
+    monkeypatch.setattr(partial.fitz, "open", lambda *args, **kwargs: make_doc(), raising=False)
+    monkeypatch.setattr(partial, "build_sub_pdf", lambda doc, page_numbers: b"sub-pdf")
+    client = MagicMock()
+    client.extract_pages.return_value = ["only one page"]
+    with pytest.raises(OCRError):
+        ocr_low_text_pages(b"pdf", client, min_chars=10)
+
+    # No OCR client configured
+    client.extract_pages.return_value = []
+    assert ocr_low_text_pages(b"pdf", client, min_chars=10) == {}
+
+def test_ocr_pages_sidecar_round_trip():
+    text, ocr_pages = format_ocr_pages({7: "שבע", 2: "שתיים\fעם מפריד"})
+    assert ocr_pages == "2,7"
+    assert parse_ocr_pages(text, ocr_pages) == {2: "שתיים\nעם מפריד", 7: "שבע"}
@@ -0,0 +1,56 @@
+import sys
+from unittest.mock import MagicMock
+
+sys.modules.setdefault("dotenv", MagicMock())
+
+from src.rag.query_cache import QueryEmbeddingCache, AnswerCache, normalize_query
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_normalize_query_ignores_spacing_and_question_mark():
+    assert normalize_query("  מה הוחלט   לגבי המים? ") == normalize_query("מה הוחלט לגבי המים")
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = QueryEmbeddingCache(ttl=10, clock=clock)
+    cache.put("שאלה", [1.0, 2.0])
+
+    assert cache.get("שאלה") == [1.0, 2.0]
+    clock.now = 11
+    assert cache.get("שאלה") is None
+
+def test_evicts_least_recently_used_by_count_and_bytes():
+    cache = QueryEmbeddingCache(max_entries=2, max_bytes=1024)
+    cache.put("a", [0.0])
+    cache.put("b", [0.0])
+    cache.get("a")
+    cache.put("c", [0.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+    small = QueryEmbeddingCache(max_entries=10, max_bytes=16)
+    small.put("x", [0.0, 0.0])
+    small.put("y", [0.0, 0.0])
+    assert len(small) == 1
+
+def test_answer_cache_requires_same_chunks_and_similar_query():
+    cache = AnswerCache(threshold=0.9)
+    response = {"answer": "תשובה", "sources": ["a.pdf"]}
+    cache.put([1.0, 0.0], ["a_part_1", "a_part_2"], 3, response)
+
+    assert cache.get([0.99, 0.05], ["a_part_2", "a_part_1"], 3) == response
+    assert cache.get([0.0, 1.0], ["a_part_1", "a_part_2"], 3) is None
+    assert cache.get([1.0, 0.0], ["a_part_1"], 3) is None
+
+def test_answer_cache_cleared_on_version_change():
+    cache = AnswerCache()
+    cache.put([1.0], ["x"], 1, {"answer": "a", "sources": []})
+
+    assert cache.get([1.0], ["x"], 2) is None
+    assert len(cache) == 0
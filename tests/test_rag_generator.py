@@ -39,3 +39,43 @@ def test_construct_system_prompt():
     # Check placeholder replacement
     assert "{file_list}" not in prompt
     assert "{context}" not in prompt
+
+def test_construct_system_prompt_respects_token_budget():
+    long_text = " ".join(["החלטת הוועד בנושא המים"] * 400)
+    context_chunks = [
+        {'metadata': {'filename': 'first.pdf'}, 'text': long_text},
+        {'metadata': {'filename': 'second.pdf'}, 'text': 'content from second'},
+    ]
+
+    prompt = construct_system_prompt(context_chunks, token_budget=500)
+
+    assert "- first.pdf" in prompt
+    assert "second.pdf" not in prompt
+    assert len(prompt) < len(long_text)
+
+def test_stream_answer_yields_partials_then_result(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    from unittest.mock import MagicMock
+    from src.rag import generator
+
+    pieces = ['{"answer": "של', 'ום", "sources": ', '["file1.pdf"]}']
+
+    async def completion_stream():
+        yield SimpleNamespace(choices=[])
+        for piece in pieces:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+    async def create(**kwargs):
+        return completion_stream()
+
+    client = MagicMock()
+    client.chat.completions.create = create
+    monkeypatch.setattr(generator, "get_async_client", lambda: client)
+
+    async def collect():
+        return [event async for event in generator.stream_answer("q", [{'metadata': {'filename': 'file1.pdf'}, 'text': 't'}])]
+
+    events = asyncio.run(collect())
+    assert ("partial", "שלום") in events
+    assert events[-1] == ("done", {"answer": "שלום", "sources": ["file1.pdf"]})
@@ -0,0 +1,98 @@
+import hashlib
+from io import BytesIO
+from unittest.mock import MagicMock
+import pytest
+from src.config import config
+from src.ingest import reindex
+from src.ingest.reindex import ReindexManifest, Reindexer
+
+class FakeStorage:
+    def __init__(self, files, store_md5=False):
+        self.files = files
+        self.store_md5 = store_md5
+        self.downloads = []
+
+    def list_files(self):
+        return list(self.files) + [f"{name}.txt" for name in self.files]
+
+    def get_content_md5(self, filename):
+        return hashlib.md5(self.files[filename]).hexdigest() if self.store_md5 else None
+
+    def get_file_stream(self, filename):
+        self.downloads.append(filename)
+        return BytesIO(self.files[filename])
+
+def fake_parse(filename, file_content, file_hash, page_texts=None, ocr_text=None):
+    count = len(file_content.split())
+    return [{"id": f"{filename}_part_{i}", "text": f"chunk {i}", "metadata": {"filename": filename}} for i in range(count)]
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    monkeypatch.setattr(reindex, "chroma", MagicMock())
+    monkeypatch.setattr(reindex, "parse_file", fake_parse)
+    monkeypatch.setattr(reindex, "load_ocr_result", lambda storage, filename, file_hash: None)
+    monkeypatch.setattr(config, "INGEST_BATCH_SIZE", 2)
+    manifest = ReindexManifest(str(tmp_path / "manifest.sqlite"))
+
+    def indexed_filename(file_hash):
+        # The collection holds what the manifest recorded
+        tenant, collection = config.TENANT_NAME, config.COLLECTION_NAME
+        return next((f for f in manifest.filenames(tenant, collection)
+                     if manifest.get(tenant, collection, f)["file_hash"] == file_hash), None)
+
+    reindex.chroma.check_file_exists_by_hash.side_effect = indexed_filename
+    return manifest
+
+def test_second_run_skips_unchanged_files(setup):
+    storage = FakeStorage({"a.pdf": b"one two three", "b.pdf": b"four"})
+    stats = Reindexer(storage, setup, workers=1).run()
+    assert stats["indexed"] == 2 and stats["chunks"] == 4
+    assert reindex.chroma.add_document.call_count == 3  # batches of 2
+
+    storage.files["b.pdf"] = b"four five"
+    stats = Reindexer(storage, setup, workers=1).run()
+    assert stats["skipped"] == 1 and stats["indexed"] == 1
+    reindex.chroma.delete_stale_documents.assert_called_with("b.pdf", {"b.pdf_part_0", "b.pdf_part_1"})
+
+def test_content_md5_avoids_downloads(setup):
+    storage = FakeStorage({"a.pdf": b"one two"}, store_md5=True)
+    Reindexer(storage, setup, workers=1).run()
+    storage.downloads.clear()
+    stats = Reindexer(storage, setup, workers=1).run()
+    assert stats["skipped"] == 1
+    assert storage.downloads == []
+
+def test_chunker_change_reindexes_everything(setup, monkeypatch):
+    storage = FakeStorage({"a.pdf": b"one two"})
+    Reindexer(storage, setup, workers=1).run()
+    monkeypatch.setattr(config, "CHUNK_SIZE", config.CHUNK_SIZE + 1)
+    assert Reindexer(storage, setup, workers=1).run()["indexed"] == 1
+
+def test_failed_file_is_retried_next_run(setup):
+    storage = FakeStorage({"a.pdf": b"one", "b.pdf": b"two"})
+    reindex.chroma.add_document.side_effect = [RuntimeError("chroma down"), None]
+    stats = Reindexer(storage, setup, workers=1).run()
+    assert stats["failed"] == 1 and stats["indexed"] == 1
+
+    reindex.chroma.add_document.side_effect = None
+    stats = Reindexer(storage, setup, workers=1).run()
+    assert stats["indexed"] == 1 and stats["skipped"] == 1
+
+def test_prune_removes_deleted_files(setup):
+    storage = FakeStorage({"a.pdf": b"one", "b.pdf": b"two"})
+    Reindexer(storage, setup, workers=1).run()
+    del storage.files["b.pdf"]
+    stats = Reindexer(storage, setup, workers=1).run(prune=True)
+    assert stats["pruned"] == 1
+    reindex.chroma.delete_documents_by_filename.assert_called_once_with("b.pdf")
+    assert setup.filenames(config.TENANT_NAME, config.COLLECTION_NAME) == ["a.pdf"]
+
+def test_files_missing_from_the_collection_are_reindexed(setup):
+    storage = FakeStorage({"a.pdf": b"one", "b.pdf": b"two"})
+    Reindexer(storage, setup, workers=1).run()
+
+    # e.g. deleted with scripts/delete_chroma_file.py, or an older backup was restored
+    a_hash = hashlib.md5(b"one").hexdigest()
+    reindex.chroma.check_file_exists_by_hash.side_effect = lambda file_hash: None if file_hash == a_hash else "b.pdf"
+    stats = Reindexer(storage, setup, workers=1).run()
+    assert stats["indexed"] == 1 and stats["skipped"] == 1
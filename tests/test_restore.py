@@ -0,0 +1,99 @@
+import gzip
+import io
+import os
+import tarfile
+import pytest
+from src.db import backup
+from src.db.backup import ChunkReader, backup_chroma, manifest_key, restore_chroma
+from tests.test_backup import setup, write  # noqa: F401 (fixture)
+
+def read_tree(data_dir):
+    return {path: open(os.path.join(data_dir, path), "rb").read() for path in backup.scan_files(data_dir)}
+
+def test_chunk_reader_serves_any_read_size():
+    reader = ChunkReader([b"abc", b"", b"defgh", b"i"])
+    assert reader.read(2) == b"ab"
+    assert reader.read(4) == b"cdef"
+    assert reader.read() == b"ghi"
+    assert reader.read(1) == b""
+
+def test_restores_a_full_backup(setup, tmp_path):
+    storage, data_dir = setup
+    expected = read_tree(data_dir)
+    manifest = backup_chroma(storage, data_dir, compression="gzip")
+
+    target = str(tmp_path / "restored" / "chroma_db")
+    result = restore_chroma(storage, target)
+    assert result == {"backup": manifest["name"], "archives": 1, "files": 3}
+    assert read_tree(target) == expected
+    # mtimes match the manifest, so the next backup does not re-ship everything
+    assert backup.scan_files(target) == {path: {"size": e["size"], "mtime_ns": e["mtime_ns"]} for path, e in manifest["files"].items()}
+
+def test_restores_an_incremental_chain(setup):
+    storage, data_dir = setup
+    full = backup_chroma(storage, data_dir, compression="gzip")
+    write(os.path.join(data_dir, "chroma.sqlite3"), b"db v2", 2_000_000_000)
+    backup_chroma(storage, data_dir, compression="gzip")
+    write(os.path.join(data_dir, "chroma.sqlite3"), b"db v3", 3_000_000_000)
+    write(os.path.join(data_dir, "segment2", "data_level0.bin"), b"new vectors")
+    os.remove(os.path.join(data_dir, "segment", "header.bin"))
+    latest = backup_chroma(storage, data_dir, compression="gzip")
+    expected = read_tree(data_dir)
+
+    # Restores over the live directory; stale files do not survive
+    write(os.path.join(data_dir, "stray.bin"), b"stray")
+    result = restore_chroma(storage, data_dir, "latest")
+    assert result["backup"] == latest["name"]
+    assert result["archives"] == 2  # the middle backup holds nothing final
+    assert read_tree(data_dir) == expected
+
+    # An older point of the chain, by archive file name
+    restore_chroma(storage, data_dir, os.path.basename(full["archive"]))
+    assert read_tree(data_dir)["chroma.sqlite3"] == b"db v1"
+    assert "segment/header.bin" in read_tree(data_dir)
+
+def test_failed_restore_keeps_the_live_data(setup, monkeypatch):
+    storage, data_dir = setup
+    manifest = backup_chroma(storage, data_dir, compression="gzip")
+    manifest["files"]["chroma.sqlite3"]["sha256"] = "0" * 64
+    storage.save_file(backup.json.dumps(manifest).encode(), manifest_key(manifest["name"]))
+    write(os.path.join(data_dir, "chroma.sqlite3"), b"live", 5_000_000_000)
+
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        restore_chroma(storage, data_dir)
+    assert read_tree(data_dir)["chroma.sqlite3"] == b"live"
+    assert [p for p in os.listdir(os.path.dirname(data_dir)) if ".restore-" in p] == []
+
+def test_missing_base_is_reported(setup):
+    storage, data_dir = setup
+    full = backup_chroma(storage, data_dir, compression="gzip")
+    write(os.path.join(data_dir, "chroma.sqlite3"), b"db v2", 2_000_000_000)
+    backup_chroma(storage, data_dir, compression="gzip")
+    storage.delete_file(manifest_key(full["name"]))
+    with pytest.raises(FileNotFoundError):
+        restore_chroma(storage, data_dir)
+
+def make_tar(members: dict) -> bytes:
+    out = io.BytesIO()
+    with gzip.GzipFile(fileobj=out, mode="wb") as gz, tarfile.open(fileobj=gz, mode="w|") as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return out.getvalue()
+
+def test_restores_legacy_archives(setup, tmp_path):
+    storage, _ = setup
+    write(os.path.join(storage.base_dir, "backups/chroma/chroma_backup_20240101.tar.gz"),
+          make_tar({"chroma_db/chroma.sqlite3": b"old db", "chroma_db/seg/a.bin": b"a"}))
+    target = str(tmp_path / "legacy" / "chroma_db")
+    assert restore_chroma(storage, target, "chroma_backup_20240101.tar.gz")["files"] == 2
+    assert read_tree(target) == {"chroma.sqlite3": b"old db", "seg/a.bin": b"a"}
+
+def test_rejects_paths_escaping_the_data_dir(setup, tmp_path):
+    storage, _ = setup
+    write(os.path.join(storage.base_dir, "backups/chroma/evil.tar.gz"), make_tar({"chroma_db/../../evil.txt": b"x"}))
+    target = str(tmp_path / "evil" / "chroma_db")
+    with pytest.raises(ValueError, match="Unsafe path"):
+        restore_chroma(storage, target, "evil.tar.gz")
+    assert not os.path.exists(tmp_path / "evil.txt") and not os.path.exists(tmp_path / "evil" / "evil.txt")
@@ -0,0 +1,53 @@
+import sys
+from unittest.mock import MagicMock, patch
+
+sys.modules.setdefault("dotenv", MagicMock())
+sys.modules.setdefault("chromadb", MagicMock())
+sys.modules.setdefault("chromadb.config", MagicMock())
+sys.modules.setdefault("chromadb.utils", MagicMock())
+sys.modules.setdefault("chromadb.utils.embedding_functions", MagicMock())
+
+from src.rag.search import merge_windows, expand_context
+
+def _hit(filename, index, text=None):
+    return {
+        "id": f"{filename}_part_{index}",
+        "text": text or f"{filename}:{index}",
+        "metadata": {"filename": filename, "chunk_index": index}
+    }
+
+def test_merge_windows_joins_overlapping_hits_of_same_file():
+    hits = [_hit("a.pdf", 5), _hit("b.pdf", 0), _hit("a.pdf", 6), _hit("a.pdf", 20)]
+
+    spans = merge_windows(hits, window_radius=1)
+
+    assert [(s['filename'], s['start'], s['end']) for s in spans] == [
+        ("a.pdf", 4, 7),
+        ("b.pdf", 0, 1),
+        ("a.pdf", 19, 21),
+    ]
+    assert spans[0]['hit_ids'] == ["a.pdf_part_5", "a.pdf_part_6"]
+
+def test_merge_windows_keeps_hits_without_index():
+    hits = [{"id": "x", "text": "t", "metadata": {}}]
+
+    spans = merge_windows(hits, window_radius=1)
+
+    assert spans[0]['start'] is None
+    assert spans[0]['hit_ids'] == ["x"]
+
+@patch('src.rag.search.manager')
+def test_expand_context_fetches_neighbors_once(mock_manager):
+    collection = MagicMock()
+    collection.get.return_value = {
+        "ids": ["a.pdf_part_4", "a.pdf_part_5", "a.pdf_part_6", "a.pdf_part_7"],
+        "documents": ["four", "five", "six", "seven"]
+    }
+    mock_manager.run.side_effect = lambda operation: operation(collection)
+
+    results = expand_context([_hit("a.pdf", 5), _hit("a.pdf", 6)], window_radius=1)
+
+    collection.get.assert_called_once()
+    assert len(results) == 1
+    assert results[0]['text'] == "four\nfive\nsix\nseven"
+    assert results[0]['id'] == "a.pdf_part_5"
@@ -0,0 +1,213 @@
+import asyncio
+import os
+import time
+from io import BytesIO
+import pytest
+from src.storage.cache import CachingStorage, AsyncCachingStorage
+from src.storage.interface import StorageProvider, AsyncStorageProvider
+
+class FakeStorage(StorageProvider):
+    """Backend with ETags that counts downloads."""
+    container_name = "files"
+
+    def __init__(self, etags=True):
+        self.files = {}
+        self.versions = {}
+        self.metadata = {}
+        self.downloads = 0
+        self.etags = etags
+
+    def save_file(self, file_data, filename, content_type=None):
+        self.files[filename] = bytes(file_data)
+        self.versions[filename] = self.versions.get(filename, 0) + 1
+        return filename
+
+    def list_files(self):
+        return list(self.files)
+
+    def get_file_stream(self, filename):
+        if filename not in self.files:
+            return None
+        self.downloads += 1
+        return BytesIO(self.files[filename])
+
+    def get_metadata(self, filename):
+        return self.metadata.get(filename, {})
+
+    def update_metadata(self, filename, metadata):
+        self.metadata[filename] = metadata
+        self.versions[filename] += 1
+
+    def delete_file(self, filename):
+        self.files.pop(filename, None)
+        self.versions.pop(filename, None)
+
+    def get_etag(self, filename):
+        if not self.etags or filename not in self.versions:
+            return None
+        return f'"{self.versions[filename]}"'
+
+def read(storage, filename):
+    stream = storage.get_file_stream(filename)
+    try:
+        return stream.read()
+    finally:
+        stream.close()
+
+@pytest.fixture
+def backend():
+    return FakeStorage()
+
+def make_cache(backend, tmp_path, **kwargs):
+    return CachingStorage(backend, cache_dir=str(tmp_path / "cache"), **{"validate_interval": 0, **kwargs})
+
+def test_repeat_reads_are_served_from_disk(backend, tmp_path):
+    backend.save_file(b"protocol", "a.pdf")
+    storage = make_cache(backend, tmp_path)
+    assert read(storage, "a.pdf") == b"protocol"
+    assert read(storage, "a.pdf") == b"protocol"
+    assert backend.downloads == 1
+
+def test_cache_survives_restarts(backend, tmp_path):
+    backend.save_file(b"protocol", "a.pdf")
+    read(make_cache(backend, tmp_path), "a.pdf")
+    assert read(make_cache(backend, tmp_path), "a.pdf") == b"protocol"
+    assert backend.downloads == 1
+
+def test_changed_etag_refetches(backend, tmp_path):
+    backend.save_file(b"v1", "a.pdf")
+    storage = make_cache(backend, tmp_path)
+    read(storage, "a.pdf")
+    # Written by another process, bypassing this wrapper
+    backend.save_file(b"v2", "a.pdf")
+    assert read(storage, "a.pdf") == b"v2"
+    assert backend.downloads == 2
+
+def test_validation_is_skipped_within_the_interval(backend, tmp_path):
+    backend.save_file(b"v1", "a.pdf")
+    storage = make_cache(backend, tmp_path, validate_interval=3600)
+    read(storage, "a.pdf")
+    backend.save_file(b"v2", "a.pdf")
+    assert read(storage, "a.pdf") == b"v1"
+
+def test_writes_through_the_wrapper_invalidate(backend, tmp_path):
+    backend.save_file(b"v1", "a.pdf")
+    storage = make_cache(backend, tmp_path, validate_interval=3600)
+    read(storage, "a.pdf")
+    storage.save_file(b"v2", "a.pdf")
+    assert read(storage, "a.pdf") == b"v2"
+    storage.update_metadata("a.pdf", {"ocr": "true"})
+    read(storage, "a.pdf")
+    assert backend.downloads == 3
+    storage.delete_file("a.pdf")
+    assert storage.get_file_stream("a.pdf") is None
+
+def test_least_recently_used_files_are_evicted(backend, tmp_path):
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        backend.save_file(b"x" * 100, name)
+    storage = make_cache(backend, tmp_path, max_bytes=250)
+    read(storage, "a.pdf")
+    read(storage, "b.pdf")
+    read(storage, "a.pdf")
+    read(storage, "c.pdf")  # evicts b.pdf, the least recently used
+    assert storage.cache._get_index().total_size() <= 250
+    downloads = backend.downloads
+    read(storage, "a.pdf")
+    assert backend.downloads == downloads
+    read(storage, "b.pdf")
+    assert backend.downloads == downloads + 1
+    assert len([f for f in os.listdir(tmp_path / "cache") if not f.startswith("index.sqlite")]) == 2
+
+def test_files_without_a_validator_are_not_cached(tmp_path):
+    backend = FakeStorage(etags=False)
+    backend.save_file(b"protocol", "a.pdf")
+    storage = make_cache(backend, tmp_path)
+    assert read(storage, "a.pdf") == b"protocol"
+    assert read(storage, "a.pdf") == b"protocol"
+    assert backend.downloads == 2
+
+class FakeAsyncStorage(AsyncStorageProvider):
+    """Async backend whose downloads take `delay` seconds each."""
+    container_name = "files"
+
+    def __init__(self, files, delay=0.0):
+        self.files = files
+        self.delay = delay
+        self.downloads = 0
+
+    async def get_file_stream(self, filename):
+        out = BytesIO()
+        if not await self.download_to_file(filename, out):
+            return None
+        out.seek(0)
+        return out
+
+    async def download_to_file(self, filename, destination):
+        await asyncio.sleep(self.delay)
+        if filename not in self.files:
+            return False
+        self.downloads += 1
+        if isinstance(destination, (str, os.PathLike)):
+            with open(destination, "wb") as f:
+                f.write(self.files[filename])
+        else:
+            destination.write(self.files[filename])
+        return True
+
+    async def get_etag(self, filename):
+        return '"1"' if filename in self.files else None
+
+def test_async_reads_share_the_disk_cache(tmp_path):
+    backend = FakeAsyncStorage({"a.pdf": b"protocol"})
+    storage = AsyncCachingStorage(backend, cache_dir=str(tmp_path / "cache"), validate_interval=0)
+
+    async def run():
+        first = await storage.get_file_stream("a.pdf")
+        second = await storage.get_file_stream("a.pdf")
+        return first.read(), second.read()
+
+    assert asyncio.run(run()) == (b"protocol", b"protocol")
+    assert backend.downloads == 1
+    # The sync wrapper over the same container sees the cached copy
+    sync_backend = FakeStorage()
+    sync_backend.save_file(b"protocol", "a.pdf")
+    assert read(CachingStorage(sync_backend, cache_dir=str(tmp_path / "cache"), validate_interval=0), "a.pdf") == b"protocol"
+    assert sync_backend.downloads == 0
+
+def test_multi_file_fetches_run_concurrently():
+    backend = FakeAsyncStorage({f"{i}.pdf": b"x" for i in range(4)}, delay=0.2)
+    start = time.monotonic()
+    streams = asyncio.run(backend.get_file_streams([f"{i}.pdf" for i in range(4)] + ["missing.pdf"]))
+    assert time.monotonic() - start < 0.5
+    assert streams["missing.pdf"] is None
+    assert all(streams[f"{i}.pdf"].read() == b"x" for i in range(4))
+
+def test_async_cache_work_stays_off_the_event_loop(tmp_path):
+    backend = FakeAsyncStorage({"a.pdf": b"protocol"})
+    storage = AsyncCachingStorage(backend, cache_dir=str(tmp_path / "cache"), validate_interval=0)
+    lookup = storage.cache.lookup
+
+    def locked_lookup(filename):
+        time.sleep(0.3)  # e.g. the shared index database is locked by another container
+        return lookup(filename)
+
+    storage.cache.lookup = locked_lookup
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        stream = await storage.get_file_stream("a.pdf")
+        task.cancel()
+        with stream:
+            return stream.read(), ticks
+
+    data, ticks = asyncio.run(run())
+    assert data == b"protocol"
+    assert ticks > 5